@@ -0,0 +1,121 @@
+# Evidence packing: fewer, shorter evidence blocks for the judge prompt
+#
+# Top-k chunks from the same document are often neighbours (chunk_i, chunk_i+1) that share the
+# 200-char sliding-window overlap from ingest/chunk.py, so the prompt repeats text. Packing:
+# - merges adjacent / overlapping chunks of one doc_id into one block (overlap written once)
+# - drops exact duplicate text
+# - fits the blocks into a token budget (best-ranked blocks first, every block keeps some text)
+# Every original chunk_id stays listed on its block's CITATION line, so all of them remain citable.
+import os
+import re
+
+TOKEN_BUDGET = int(os.environ.get("EVIDENCE_TOKEN_BUDGET", "1500"))  # evidence tokens per prompt
+MIN_BLOCK_TOKENS = 48  # lowest-ranked blocks are cut down to this, never dropped
+CHARS_PER_TOKEN = 4    # rough estimate for English text (llama tokenizers land near 4)
+MAX_OVERLAP = 400      # longest suffix/prefix overlap searched when merging neighbours
+TRUNCATED = " ..."
+
+CHUNK_INDEX_RE = re.compile(r"::chunk_(\d+)$")
+
+def pack_enabled() -> bool:
+    # EVIDENCE_PACK=0 -> one block per chunk, untruncated (the original prompt)
+    return os.environ.get("EVIDENCE_PACK", "1").lower() not in ("0", "false", "off", "no")
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _chunk_index(e):
+    # chunk_index from the chunk store (-1 = unknown), else the "::chunk_N" id suffix
+    if e.get("chunk_index") is not None and e["chunk_index"] >= 0:
+        return int(e["chunk_index"])
+    m = CHUNK_INDEX_RE.search(e["chunk_id"])
+    return int(m.group(1)) if m else None
+
+def _overlap(a: str, b: str) -> int:
+    # longest suffix of a that is a prefix of b
+    for n in range(min(len(a), len(b), MAX_OVERLAP), 0, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+def _truncate(text: str, max_chars: int) -> str:
+    # at most max_chars, " ..." marker included
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max(0, max_chars - len(TRUNCATED))]
+    space = cut.rfind(" ")
+    if space > max_chars // 2:
+        cut = cut[:space]
+    return cut + TRUNCATED
+
+def merge_chunks(evidence):
+    """
+    Evidence list -> blocks [{"chunk_ids", "doc_id", "text", "rank"}], best rank first.
+    rank = best (lowest) rank among the merged chunks.
+    """
+    # identical text under another id is not repeated; the id is cited on the first copy's block
+    first_by_text = {}
+    aliases = {}
+    by_doc = {}
+    seen = set()
+    for e in evidence:
+        # the same chunk returned twice (e.g. batched queries) is packed once
+        if e["chunk_id"] in seen:
+            continue
+        seen.add(e["chunk_id"])
+        first = first_by_text.setdefault(e["text"], e)
+        if first is not e:
+            aliases.setdefault(first["chunk_id"], []).append(e["chunk_id"])
+            continue
+        by_doc.setdefault(e["doc_id"], []).append(e)
+
+    blocks = []
+    for doc_id, chunks in by_doc.items():
+        chunks = sorted(chunks, key=lambda e: (_chunk_index(e) is None, _chunk_index(e) or 0))
+        current = None
+        for e in chunks:
+            idx = _chunk_index(e)
+            adjacent = current is not None and idx is not None and current["last_index"] is not None \
+                and idx == current["last_index"] + 1
+            if adjacent:
+                n = _overlap(current["text"], e["text"])
+                current["text"] += e["text"][n:] if n else "\n" + e["text"]
+                current["chunk_ids"].append(e["chunk_id"])
+                current["rank"] = min(current["rank"], e["rank"])
+                current["last_index"] = idx
+                continue
+            current = {"chunk_ids": [e["chunk_id"]], "doc_id": doc_id, "text": e["text"], "rank": e["rank"],
+                       "last_index": idx}
+            blocks.append(current)
+
+    for b in blocks:
+        del b["last_index"]
+        b["chunk_ids"] += [a for cid in list(b["chunk_ids"]) for a in aliases.get(cid, [])]
+    blocks.sort(key=lambda b: b["rank"])
+    return blocks
+
+def fit_budget(blocks, token_budget: int = TOKEN_BUDGET):
+    # best-ranked blocks keep their full text first; later ones get what is left (>= MIN_BLOCK_TOKENS)
+    reserve = MIN_BLOCK_TOKENS * len(blocks)
+    left = max(token_budget, reserve)
+    for b in blocks:
+        reserve -= MIN_BLOCK_TOKENS
+        allowed = max(MIN_BLOCK_TOKENS, left - reserve)
+        b["text"] = _truncate(b["text"], allowed * CHARS_PER_TOKEN)
+        left -= estimate_tokens(b["text"])
+    return blocks
+
+def pack_evidence(evidence, token_budget: int = TOKEN_BUDGET):
+    """
+    -> (blocks, stats)
+    stats: chunks, blocks, est_tokens_raw, est_tokens_packed (evidence text only)
+    """
+    raw_tokens = sum(estimate_tokens(e["text"]) for e in evidence)
+    blocks = fit_budget(merge_chunks(evidence), token_budget)
+    stats = {
+        "chunks": len(evidence),
+        "blocks": len(blocks),
+        "est_tokens_raw": raw_tokens,
+        "est_tokens_packed": sum(estimate_tokens(b["text"]) for b in blocks),
+    }
+    return blocks, stats
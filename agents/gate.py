@@ -0,0 +1,67 @@
+# Relevance gate between retrieval and the judge
+#
+# If no retrieved chunk clears its score threshold, the corpus has nothing relevant and the
+# prompt would make the model answer "Unknown" anyway -> return that verdict without an LLM call.
+# Thresholds come from eval/calibrate_gate.py (default + optional per-doc_id overrides).
+import json
+import os
+import threading
+from pathlib import Path
+
+from telemetry.spans import maybe_span
+
+ROOT = Path(__file__).resolve().parents[1]
+GATE_FILE = ROOT / "data" / "processed" / "gate_thresholds.json"
+
+# no calibration yet -> gate only fires on empty evidence (cosine is never below -1)
+DEFAULT_THRESHOLDS = {"default": -1.0, "per_doc": {}}
+
+UNKNOWN_VERDICT = {
+    "verdict": "Unknown",
+    "short_reason": "None of the retrieved evidence is relevant enough to evaluate this claim.",
+    "citations": [],
+    "confidence": 0.0,
+}
+
+_thresholds = None
+_stamp = None
+_lock = threading.Lock()
+
+def gate_enabled() -> bool:
+    # GATE=0 sends every claim to the judge
+    return os.environ.get("GATE", "1").lower() not in ("0", "false", "off", "no")
+
+def load_thresholds(path: Path = GATE_FILE) -> dict:
+    """Calibrated thresholds (re-read when the file changes)."""
+    global _thresholds, _stamp
+
+    path = Path(path)
+    stamp = path.stat().st_mtime_ns if path.exists() else None
+    with _lock:
+        if _thresholds is None or stamp != _stamp:
+            thresholds = dict(DEFAULT_THRESHOLDS)
+            if stamp is not None:
+                saved = json.loads(path.read_text(encoding="utf-8"))
+                thresholds.update({k: saved[k] for k in DEFAULT_THRESHOLDS if k in saved})
+            _thresholds, _stamp = thresholds, stamp
+        return _thresholds
+
+def threshold_for(doc_id: str, thresholds: dict) -> float:
+    return thresholds["per_doc"].get(doc_id, thresholds["default"])
+
+def gate_fires(evidence, thresholds: dict) -> bool:
+    # fires when no chunk clears the threshold of its own document (also on empty evidence)
+    return not any(e["score"] >= threshold_for(e["doc_id"], thresholds) for e in evidence)
+
+def gate(evidence, spans=None, thresholds: dict = None):
+    """
+    (judge_obj, flags) for a deterministic Unknown when the evidence is too weak, else None.
+    Records a "gate" span (fired, top_score) when spans is given.
+    """
+    with maybe_span(spans, "gate") as attrs:
+        thresholds = thresholds or load_thresholds()
+        fired = gate_fires(evidence, thresholds)
+        attrs.update(fired=fired, top_score=max((e["score"] for e in evidence), default=None))
+    if not fired:
+        return None
+    return dict(UNKNOWN_VERDICT), []
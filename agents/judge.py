@@ -1,23 +1,105 @@
 # Agent 2: Evidence Judge + Guardrail (Ollama)
+import hashlib
 import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from agents import evidence_pack
+from agents.evidence_pack import pack_enabled, pack_evidence
+from agents.gate import gate, gate_enabled
+from agents.judge_cache import cache_enabled, get_cache, make_key
+from agents.semantic_cache import get_semantic_cache, semantic_cache_enabled
+from telemetry.spans import maybe_span
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
 OLLAMA_MODEL = "llama3.1:8b"
 
-def build_prompt(claim: str, evidence, variant: str = "A") -> str:
+# keep in sync with the server's OLLAMA_NUM_PARALLEL (more in-flight requests just queue there)
+OLLAMA_NUM_PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", "4"))
+REQUEST_TIMEOUT = 180
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 1.0
+
+# Ollama's own timing/token counters, copied onto the "ollama" span
+OLLAMA_STATS = ["total_duration", "prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration"]
+
+# stream the answer and hang up once a full JSON verdict has arrived (JUDGE_STREAM=0 -> one blocking response)
+JUDGE_STREAM = os.environ.get("JUDGE_STREAM", "1") != "0"
+# a verdict is ~60-120 tokens; the cap bounds a rambling generation
+NUM_PREDICT = int(os.environ.get("JUDGE_NUM_PREDICT", "256"))
+
+GENERATION_OPTIONS = {
+    "temperature": 0.2,
+    "num_predict": NUM_PREDICT,
+}
+# one retry, only when the first answer did not parse
+RETRY_OPTIONS = {
+    "temperature": 0.0,
+    "num_predict": NUM_PREDICT,
+}
+RETRY_SUFFIX = "\n\nReturn ONLY the JSON object."
+
+# Ollama structured outputs ("format"): decoding is constrained to this schema
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verdict": {"type": "string", "enum": ["Supported", "Mixed", "NotSupported", "Unknown"]},
+        "short_reason": {"type": "string"},
+        "citations": {"type": "array", "items": {"type": "string"}},
+        "confidence": {"type": "number"},
+    },
+    "required": ["verdict", "short_reason", "citations", "confidence"],
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+def semantic_settings() -> str:
+    """Fingerprint of the prompt/generation settings a semantic-cache verdict depends on."""
+    blob = json.dumps(
+        {
+            "pack": pack_enabled(),
+            "token_budget": evidence_pack.TOKEN_BUDGET,
+            "options": GENERATION_OPTIONS,
+            "schema": VERDICT_SCHEMA,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+def build_prompt(claim: str, evidence, variant: str = "A", stats: dict = None, pack: bool = None) -> str:
     """
     variant = "A" or "B"
     - A: normal strict "use only evidence"
     - B: even stricter: if evidence doesn't mention claim topic -> Unknown
+    - stats: optional dict, filled with the evidence packing stats (agents/evidence_pack.py)
+    - pack: default pack_enabled() (env EVIDENCE_PACK=0 -> one untruncated block per chunk)
     """
     block = ""
-    for e in evidence:
-        block += (
-            "\n---\n"
-            f"CITATION: {e['chunk_id']} ({e['doc_id']})\n"
-            f"TEXT:\n{e['text']}\n"
-        )
+    if pack_enabled() if pack is None else pack:
+        # neighbouring chunks merged, duplicates dropped, fitted to the token budget
+        blocks, pack_stats = pack_evidence(evidence)
+        if stats is not None:
+            stats.update(pack_stats)
+        for b in blocks:
+            block += (
+                "\n---\n"
+                f"CITATION: {', '.join(b['chunk_ids'])} ({b['doc_id']})\n"
+                f"TEXT:\n{b['text']}\n"
+            )
+    else:
+        for e in evidence:
+            block += (
+                "\n---\n"
+                f"CITATION: {e['chunk_id']} ({e['doc_id']})\n"
+                f"TEXT:\n{e['text']}\n"
+            )
 
     # prompt A
     prompt_a = f"""
@@ -95,28 +177,252 @@ def _safe_json_parse(s: str):
 
     raise ValueError("Could not parse JSON from model output.")
 
-def judge(claim: str, evidence, variant: str = "A"):
+def get_session() -> requests.Session:
+    """Shared HTTP session (keep-alive connection pool to Ollama)."""
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(10, OLLAMA_NUM_PARALLEL))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+def _post_generate(payload: dict, retries: int = MAX_RETRIES):
+    """POST /api/generate, retrying timeouts and 5xx with exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            r = get_session().post(OLLAMA_URL, json=payload, timeout=REQUEST_TIMEOUT)
+            if r.status_code < 500 or attempt == retries:
+                r.raise_for_status()
+                return r.json()
+        except requests.Timeout:
+            if attempt == retries:
+                raise
+
+        # 1s, 2s, 4s ... plus jitter so parallel workers don't retry in lockstep
+        time.sleep(BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random() * 0.25))
+
+class _ObjectScanner:
+    """
+    Fed streamed text; reports each top-level {...} as it is closed.
+    Braces inside JSON strings (and escaped quotes) are ignored. Text after a reported object is
+    kept: feed("") continues scanning it (e.g. after an object that didn't parse).
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0  # next unscanned character of text
+        self.start = -1
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, piece: str):
+        # -> the next complete object text, or None
+        self.text += piece
+        while self.pos < len(self.text):
+            ch = self.text[self.pos]
+            self.pos += 1
+            if self.start < 0:
+                if ch == "{":
+                    self.start, self.depth = self.pos - 1, 1
+                continue
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    obj = self.text[self.start:self.pos]
+                    self.start = -1
+                    return obj
+        return None
+
+def _stream_generate(payload: dict, retries: int = MAX_RETRIES):
+    """
+    Streaming POST /api/generate; stops reading once a complete JSON object has parsed.
+    Returns (text, stats): Ollama's counters when the stream finished, else eval_count = chunks read,
+    plus ttft_ms (request -> first token) and early_stop.
+    """
+    for attempt in range(retries + 1):
+        t0 = time.perf_counter()
+        try:
+            with get_session().post(OLLAMA_URL, json=payload, timeout=REQUEST_TIMEOUT, stream=True) as r:
+                if r.status_code < 500 or attempt == retries:
+                    r.raise_for_status()
+                    try:
+                        return _read_stream(r, t0)
+                    except requests.ConnectionError:
+                        # a read timeout mid-stream surfaces as ConnectionError -> retried like a timeout
+                        if attempt == retries:
+                            raise
+        except requests.Timeout:
+            if attempt == retries:
+                raise
+
+        time.sleep(BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random() * 0.25))
+
+def _read_stream(r, t0: float):
+    scanner = _ObjectScanner()
+    stats = {"eval_count": 0, "early_stop": False}
+    for line in r.iter_lines():
+        if not line:
+            continue
+        msg = json.loads(line)
+        piece = msg.get("response", "")
+        if piece:
+            if "ttft_ms" not in stats:
+                stats["ttft_ms"] = (time.perf_counter() - t0) * 1000
+            stats["eval_count"] += 1  # Ollama streams one token per message
+        if msg.get("done"):
+            scanner.feed(piece)
+            stats.update({name: msg[name] for name in OLLAMA_STATS if name in msg})
+            stats["done_reason"] = msg.get("done_reason")
+            break
+        obj = scanner.feed(piece)
+        while obj is not None:
+            try:
+                json.loads(obj)
+            except ValueError:
+                obj = scanner.feed("")  # not valid JSON after all; scan the rest of the piece
+                continue
+            # leaving the with-block closes the connection; Ollama stops generating
+            stats["early_stop"] = True
+            return obj, stats
+    return scanner.text, stats
+
+def _generate(payload: dict, attrs: dict) -> str:
+    # one judge generation (streamed or not); token / timing stats go onto attrs
+    if payload.get("stream"):
+        raw, stats = _stream_generate(payload)
+        attrs.update(stats)
+        return raw
+    resp = _post_generate(payload)
+    attrs.update({name: resp[name] for name in OLLAMA_STATS if name in resp})
+    return resp["response"]
+
+def judge(claim: str, evidence, variant: str = "A", use_cache: bool = True, spans=None, query_vec=None,
+          use_gate: bool = True, model: str = None, corpus: str = None):
     """
     - variant: "A" or "B"
+    - model: Ollama model tag (default OLLAMA_MODEL)
+    - use_cache: False bypasses the verdict caches (also JUDGE_CACHE=0 / SEMANTIC_CACHE=0)
+    - spans: optional SpanRecorder (records "gate", "semantic_cache", "prompt_build", "ollama", "json_parse";
+      a parse retry adds a second "ollama" / "json_parse" pair with retry=True)
+    - query_vec + corpus: the claim's retrieval embedding and the corpus_fingerprint() of the engine that
+      produced it; together they enable the semantic cache (near-duplicate claims with the same evidence
+      set reuse a past verdict)
+    - use_gate: False skips the relevance gate (also GATE=0); weak evidence otherwise gets a
+      deterministic "Unknown" without an LLM call
     - returns (judge_obj, flags)
     """
-    prompt = build_prompt(claim, evidence, variant=variant)
+    model = model or OLLAMA_MODEL
+
+    if use_gate and gate_enabled():
+        gated = gate(evidence, spans=spans)
+        if gated is not None:
+            return gated
+
+    semantic = None
+    if query_vec is not None and corpus is not None and use_cache and semantic_cache_enabled():
+        semantic = get_semantic_cache()
+        evidence_ids = [e["chunk_id"] for e in evidence]
+        settings = semantic_settings()
+        with maybe_span(spans, "semantic_cache", hit=False) as attrs:
+            found = semantic.lookup(query_vec, evidence_ids, model, variant, corpus, settings)
+            if found is not None:
+                attrs.update(hit=True, score=found[2])
+        if found is not None:
+            return found[0], found[1]
+
+    with maybe_span(spans, "prompt_build") as attrs:
+        prompt = build_prompt(claim, evidence, variant=variant, stats=attrs)
 
     payload = {
-        "model": OLLAMA_MODEL,
+        "model": model,
         "prompt": prompt,
-        "stream": False,
-        "options": {
-            "temperature": 0.2
-        }
+        "stream": JUDGE_STREAM,
+        "format": VERDICT_SCHEMA,
+        "options": dict(GENERATION_OPTIONS),
     }
 
-    r = requests.post(OLLAMA_URL, json=payload, timeout=180)
-    r.raise_for_status()
+    cache = get_cache() if use_cache and cache_enabled() else None
+    key = make_key(model, variant, prompt, payload["options"], payload["format"]) if cache else None
 
-    raw = r.json()["response"]
+    with maybe_span(spans, "ollama", cached=False) as attrs:
+        raw = cache.get(key) if cache else None
+        if raw is None:
+            raw = _generate(payload, attrs)
+            fresh = True
+        else:
+            attrs["cached"] = True
+            fresh = False
 
-    judge_obj = _safe_json_parse(raw)
+    try:
+        with maybe_span(spans, "json_parse"):
+            judge_obj = _safe_json_parse(raw)
+    except ValueError:
+        if not fresh:
+            raise
+        # unparseable answer -> one deterministic retry with a firmer instruction
+        retry = dict(payload, prompt=prompt + RETRY_SUFFIX, options=dict(RETRY_OPTIONS))
+        with maybe_span(spans, "ollama", cached=False, retry=True) as attrs:
+            raw = _generate(retry, attrs)
+        with maybe_span(spans, "json_parse", retry=True):
+            judge_obj = _safe_json_parse(raw)
+
+    if cache and fresh:
+        # only cache generations that parsed
+        cache.put(key, raw)
 
     flags = guardrail_flags(json.dumps(judge_obj, ensure_ascii=False))
+    if semantic is not None:
+        semantic.put(query_vec, claim, evidence_ids, model, variant, corpus, judge_obj, flags, settings)
     return judge_obj, flags
+
+class JudgeExecutor:
+    """
+    Runs judge() calls concurrently over the shared session.
+    - max_in_flight caps concurrent Ollama requests (default: OLLAMA_NUM_PARALLEL)
+    - map() returns results in input order
+    """
+
+    def __init__(self, max_in_flight: int = None):
+        self.max_in_flight = max_in_flight or OLLAMA_NUM_PARALLEL
+        self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="judge")
+
+    def submit(self, claim: str, evidence, variant: str = "A", use_cache: bool = True, spans=None, query_vec=None,
+               use_gate: bool = True, model: str = None, corpus: str = None):
+        return self._pool.submit(judge, claim, evidence, variant, use_cache, spans, query_vec, use_gate, model, corpus)
+
+    def map(self, claims, evidences, variant: str = "A", use_cache: bool = True, use_gate: bool = True,
+            model: str = None):
+        futures = [self.submit(c, ev, variant, use_cache, use_gate=use_gate, model=model)
+                   for c, ev in zip(claims, evidences)]
+        return [f.result() for f in futures]
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def judge_many(claims, evidences, variant: str = "A", max_in_flight: int = None, use_cache: bool = True,
+               use_gate: bool = True, model: str = None):
+    """Judge many (claim, evidence) pairs concurrently -> [(judge_obj, flags), ...] in input order."""
+    with JudgeExecutor(max_in_flight=max_in_flight) as ex:
+        return ex.map(claims, evidences, variant=variant, use_cache=use_cache, use_gate=use_gate, model=model)
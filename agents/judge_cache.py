@@ -0,0 +1,133 @@
+# Disk-backed cache for judge generations (SQLite, content-addressed)
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+CACHE_PATH = Path(os.environ.get("CACHE_DIR", ROOT / "data" / "cache")) / "judge_cache.sqlite"
+
+MAX_ENTRIES = 50_000
+MAX_AGE_SECONDS = 30 * 24 * 3600
+EVICT_EVERY = 100  # run eviction every N puts
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS judge_cache (
+  key TEXT PRIMARY KEY,
+  response TEXT NOT NULL,
+  created_at REAL NOT NULL,
+  accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_judge_cache_accessed ON judge_cache(accessed_at);
+"""
+
+def cache_enabled() -> bool:
+    # JUDGE_CACHE=0 bypasses the cache for the whole process
+    return os.environ.get("JUDGE_CACHE", "1").lower() not in ("0", "false", "off", "no")
+
+def make_key(model: str, variant: str, prompt: str, options: dict, schema: dict = None) -> str:
+    """sha256 over everything that changes the generation (options carry num_predict; schema = "format")."""
+    blob = json.dumps(
+        {"model": model, "variant": variant.upper(), "prompt": prompt, "options": options, "format": schema},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class JudgeCache:
+    """
+    key -> raw model response text.
+    - LRU by entry count (max_entries) + age limit (max_age_seconds)
+    - hit/miss counters for this process
+    """
+
+    def __init__(self, path: Path = CACHE_PATH, max_entries: int = MAX_ENTRIES, max_age_seconds: float = MAX_AGE_SECONDS):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM judge_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[1] > self.max_age_seconds:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE judge_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO judge_cache (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        # age first, then least-recently-used beyond max_entries
+        self._conn.execute("DELETE FROM judge_cache WHERE created_at < ?", (now - self.max_age_seconds,))
+        self._conn.execute(
+            """
+            DELETE FROM judge_cache WHERE key IN (
+              SELECT key FROM judge_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def evict(self):
+        with self._lock:
+            self._evict(time.time())
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM judge_cache")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = self._conn.execute("SELECT COUNT(*) FROM judge_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": n,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> JudgeCache:
+    """Process-wide shared cache."""
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = JudgeCache()
+    return _cache
@@ -1,47 +1,258 @@
 # Agent 1: Retrieval (FAISS-based)
+import hashlib
 import json
+import threading
 from pathlib import Path
 
 import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
+
+# faiss and the encoder stack (torch / onnxruntime) are imported on first load, not at import time
+from index.chunk_ids import vec_id
+from index.chunk_store import ChunkStore
+from index.encoder import load_encoder
+from telemetry.spans import maybe_span
 
 ROOT = Path(__file__).resolve().parents[1]
 INDEX_FILE = ROOT / "data" / "processed" / "faiss.index"
 META_FILE = ROOT / "data" / "processed" / "chunk_meta.jsonl"
+# mmap chunk store written by index/embed.py (preferred over parsing chunk_meta.jsonl)
+STORE_FILE = ROOT / "data" / "processed" / "chunk_store.bin"
+# written by index/build_faiss.py: index type + search-time params (nprobe / efSearch)
+PARAMS_FILE = ROOT / "data" / "processed" / "faiss_params.json"
+# exact vectors (float32 or float16) for re-ranking candidates of a quantized index
+EMB_NPY = ROOT / "data" / "processed" / "embeddings.npy"
 EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 
-def _load_meta():
+def _load_meta(meta_file: Path = META_FILE):
     #Load chunk metadata in the same order as embeddings
     metas = []
-    for line in META_FILE.read_text(encoding="utf-8").splitlines():
+    for line in meta_file.read_text(encoding="utf-8").splitlines():
         if line.strip():
             metas.append(json.loads(line))
     return metas
 
-def retrieve(claim: str, k: int = 5):
+class _MetaRows:
+    # chunk_meta.jsonl fallback with the same row()/get() interface as ChunkStore
+    def __init__(self, metas):
+        self._metas = metas
+        self._row_of = {m.get("vec_id", vec_id(m["chunk_id"])): i for i, m in enumerate(metas)}
+
+    def __len__(self):
+        return len(self._metas)
+
+    def row(self, i: int):
+        return self._metas[i]
+
+    def find(self, vid: int) -> int:
+        return self._row_of.get(vid, -1)
+
+    def get(self, vid: int):
+        i = self.find(vid)
+        return self._metas[i] if i >= 0 else None
+
+def _file_stamp(path: Path):
+    # (mtime, size) is enough to notice a rebuilt index / rewritten meta file
+    st = path.stat()
+    return (st.st_mtime_ns, st.st_size)
+
+def _load_params(params_file: Path) -> dict:
+    if not params_file.exists():
+        return {}
+    return json.loads(params_file.read_text(encoding="utf-8"))
+
+class _Corpus:
+    # one loaded (index, chunks, exact vectors) generation; swapped as a whole on reload
+    def __init__(self, index, chunks, positional: bool, rerank: int = 0, vectors=None):
+        self.index = index
+        self.chunks = chunks
+        self.positional = positional  # old bare IndexFlat returns row numbers, not chunk ids
+        self.rerank = rerank
+        self.vectors = vectors
+
+    def rows_of(self, ids):
+        # FAISS result ids -> chunk / embeddings rows (-1 stays -1)
+        if self.positional:
+            return ids
+        return np.array([[self.chunks.find(int(i)) if i >= 0 else -1 for i in r] for r in ids], dtype=np.int64)
+
+class RetrieverEngine:
+    """
+    Keeps the embedder, FAISS index and chunk metadata warm for the whole process.
+    - the model is loaded once (backend: ENCODER_BACKEND=torch|onnx|onnx-int8, see index/encoder.py)
+    - index + chunks are reloaded when the files on disk change
+    - chunks come from the mmap chunk store when present (only k rows are decoded per query)
+    - with "rerank" in faiss_params.json, k*rerank candidates are rescored with exact vectors
+    - safe to share between threads
+    """
+
+    def __init__(self, index_file: Path = INDEX_FILE, meta_file: Path = META_FILE, model_name: str = EMBED_MODEL,
+                 params_file: Path = PARAMS_FILE, store_file: Path = STORE_FILE, emb_file: Path = EMB_NPY,
+                 backend: str = None):
+        self.index_file = Path(index_file)
+        self.meta_file = Path(meta_file)
+        self.params_file = Path(params_file)
+        self.store_file = Path(store_file)
+        self.emb_file = Path(emb_file)
+        self.model_name = model_name
+        self.backend = backend
+
+        self._lock = threading.Lock()         # guards loading / swapping state
+        self._encode_lock = threading.Lock()  # HF tokenizers are not safe to share across threads
+        self._embedder = None
+        self._corpus = None
+        self._stamp = None
+
+    def _chunks_file(self):
+        return self.store_file if self.store_file.exists() else self.meta_file
+
+    def _current_stamp(self):
+        params = _file_stamp(self.params_file) if self.params_file.exists() else None
+        emb = _file_stamp(self.emb_file) if self.emb_file.exists() else None
+        return (_file_stamp(self.index_file), _file_stamp(self._chunks_file()), params, emb)
+
+    def _load_corpus(self):
+        import faiss
+
+        # load into locals first, then swap in one step (readers never see a half-loaded pair)
+        # any index type build_faiss.py wrote (flat / HNSW / IVF / IVF-PQ / SQ8 / PQ) loads the same way
+        index = faiss.read_index(str(self.index_file))
+        params = _load_params(self.params_file)
+        if params.get("search_params"):
+            faiss.ParameterSpace().set_index_parameters(index, params["search_params"])
+        if self.store_file.exists():
+            chunks = ChunkStore(self.store_file)
+        else:
+            chunks = _MetaRows(_load_meta(self.meta_file))
+
+        if index.ntotal != len(chunks):
+            # files are probably mid-rewrite (index written, chunks not yet)
+            raise RuntimeError(
+                f"Index/chunk mismatch: index has {index.ntotal} vectors, chunks have {len(chunks)} rows"
+            )
+
+        rerank = int(params.get("rerank", 0))
+        vectors = None
+        if rerank:
+            # mmap: only the candidate rows are paged in
+            vectors = np.load(self.emb_file, mmap_mode="r")
+            if len(vectors) != len(chunks):
+                raise RuntimeError(
+                    f"Embeddings/chunk mismatch: embeddings have {len(vectors)} rows, chunks have {len(chunks)} rows"
+                )
+
+        # built indexes return stable chunk ids; an old bare IndexFlat returns row numbers
+        positional = isinstance(index, faiss.IndexFlat)
+        return _Corpus(index, chunks, positional, rerank, vectors)
+
+    def _ensure_loaded(self):
+        stamp = self._current_stamp()
+        with self._lock:
+            if self._embedder is None:
+                self._embedder = load_encoder(self.backend, self.model_name)
+
+            if stamp != self._stamp:
+                try:
+                    corpus = self._load_corpus()
+                except RuntimeError:
+                    # keep serving the previous corpus and retry on the next call
+                    if self._corpus is None:
+                        raise
+                else:
+                    # the old store's mmap stays valid for readers still holding it
+                    self._corpus, self._stamp = corpus, stamp
+
+            return self._embedder, self._corpus
+
+    def load(self):
+        """Load everything now (e.g. at startup) instead of on the first query."""
+        self._ensure_loaded()
+        return self
+
+    def corpus_fingerprint(self) -> str:
+        """Changes whenever a different index / chunk set is loaded (keys caches built on search results)."""
+        self._ensure_loaded()
+        return hashlib.sha256(repr(self._stamp).encode("utf-8")).hexdigest()[:16]
+
+    def encode(self, claims, batch_size: int = 64):
+        """Embed claims in one batched encoder pass -> normalized float32 (N, D)."""
+        embedder, _ = self._ensure_loaded()
+
+        with self._encode_lock:
+            vecs = embedder.encode(list(claims), batch_size=batch_size)
+        vecs = np.array(vecs, dtype=np.float32).reshape(len(claims), -1)
+        vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        return vecs
+
+    def search_vectors(self, vecs, k: int = 5):
+        """One index.search over the whole query matrix -> per-row evidence lists."""
+        _, corpus = self._ensure_loaded()
+
+        if corpus.rerank:
+            from index.build_faiss import rerank_exact
+
+            # quantized scores are approximate -> widen the candidate set, rescore exactly
+            _, cand = corpus.index.search(vecs, k * corpus.rerank)
+            scores, rows = rerank_exact(vecs, corpus.rows_of(cand), corpus.vectors, k)
+        else:
+            scores, idxs = corpus.index.search(vecs, k)
+            rows = corpus.rows_of(idxs)
+
+        batch = []
+        for row in range(len(vecs)):
+            results = []
+            for rank in range(k):
+                idx = int(rows[row][rank])
+                if idx < 0:
+                    # fewer than k vectors in the index
+                    break
+                m = corpus.chunks.row(idx)
+                results.append({
+                    "rank": rank + 1,
+                    "score": float(scores[row][rank]),
+                    "chunk_id": m["chunk_id"],
+                    "doc_id": m["doc_id"],
+                    "chunk_index": m["chunk_index"],
+                    "text": m["text"],
+                })
+            batch.append(results)
+        return batch
+
+    def retrieve_batch(self, claims, k: int = 5, batch_size: int = 64, spans=None, return_vectors: bool = False):
+        """
+        Return top-k evidence chunks for every claim (same order as claims).
+        - spans: optional SpanRecorder (records "embed" and "search")
+        - return_vectors: also return the (N, D) query embeddings (e.g. for the semantic cache)
+        """
+        claims = list(claims)
+        if not claims:
+            return ([], np.empty((0, 0), dtype=np.float32)) if return_vectors else []
+        with maybe_span(spans, "embed", n=len(claims)):
+            vecs = self.encode(claims, batch_size=batch_size)
+        with maybe_span(spans, "search", k=k):
+            evidences = self.search_vectors(vecs, k=k)
+        return (evidences, vecs) if return_vectors else evidences
+
+    def retrieve(self, claim: str, k: int = 5, spans=None):
+        """Return top-k evidence chunks for a claim."""
+        return self.retrieve_batch([claim], k=k, spans=spans)[0]
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> RetrieverEngine:
+    """Process-wide shared engine."""
+    global _engine
+
+    with _engine_lock:
+        if _engine is None:
+            _engine = RetrieverEngine()
+    return _engine
+
+def retrieve(claim: str, k: int = 5, spans=None):
     """Return top-k evidence chunks for a claim."""
-    # load models + index
-    embedder = SentenceTransformer(EMBED_MODEL)
-    index = faiss.read_index(str(INDEX_FILE))
-    metas = _load_meta()
-
-    # embed query and normalize
-    vec = embedder.encode([claim])
-    vec = np.array(vec, dtype=np.float32)
-    faiss.normalize_L2(vec)
-
-    scores, idxs = index.search(vec, k)
-
-    results = []
-    for rank in range(k):
-        idx = int(idxs[0][rank])
-        m = metas[idx]
-        results.append({
-            "rank": rank + 1,
-            "score": float(scores[0][rank]),
-            "chunk_id": m["chunk_id"],
-            "doc_id": m["doc_id"],
-            "text": m["text"],
-        })
-    return results
+    return get_engine().retrieve(claim, k=k, spans=spans)
+
+def retrieve_batch(claims, k: int = 5, batch_size: int = 64, spans=None, return_vectors: bool = False):
+    """Return per-claim top-k evidence lists (one encoder pass, one FAISS search)."""
+    return get_engine().retrieve_batch(claims, k=k, batch_size=batch_size, spans=spans,
+                                       return_vectors=return_vectors)
@@ -0,0 +1,208 @@
+# Semantic claim cache: near-duplicate claims with the same evidence reuse a past verdict
+#
+# Lookup key = the claim's query embedding (already computed by the retriever) + its top-k evidence ids.
+# A hit needs cosine >= threshold to a cached claim AND the same evidence chunk set, so a verdict is
+# only reused when the judge would have seen the same evidence. Entries are tied to the corpus
+# fingerprint of the loaded index and dropped when the index is rebuilt; the judge's prompt/generation
+# settings (evidence packing, token budget, num_predict, schema) are part of the key too.
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+CACHE_PATH = Path(os.environ.get("CACHE_DIR", ROOT / "data" / "cache")) / "semantic_cache.sqlite"
+
+THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+NEIGHBORS = 8  # candidates checked for a matching evidence set
+
+MAX_ENTRIES = 20_000
+MAX_AGE_SECONDS = 30 * 24 * 3600
+EVICT_EVERY = 100  # run eviction every N puts
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS semantic_cache (
+  id INTEGER PRIMARY KEY,
+  corpus TEXT NOT NULL,
+  model TEXT NOT NULL,
+  variant TEXT NOT NULL,
+  settings TEXT NOT NULL,
+  claim TEXT NOT NULL,
+  evidence_ids TEXT NOT NULL,
+  judge_json TEXT NOT NULL,
+  flags_json TEXT NOT NULL,
+  vector BLOB NOT NULL,
+  created_at REAL NOT NULL,
+  accessed_at REAL NOT NULL,
+  UNIQUE (corpus, model, variant, settings, evidence_ids, claim)
+);
+CREATE INDEX IF NOT EXISTS idx_semantic_cache_accessed ON semantic_cache(accessed_at);
+"""
+
+def semantic_cache_enabled() -> bool:
+    # SEMANTIC_CACHE=0 turns it off for the whole process
+    return os.environ.get("SEMANTIC_CACHE", "1").lower() not in ("0", "false", "off", "no")
+
+class SemanticCache:
+    """
+    FAISS inner-product index over cached claim vectors (rebuilt from SQLite on load).
+    - lookup() / put() take the current corpus fingerprint; a new fingerprint clears the cache
+    - one row per (corpus, model, variant, settings, evidence set, claim); a repeat put replaces it
+    - LRU by entry count (max_entries) + age limit (max_age_seconds), like agents/judge_cache.py
+    - hits / lookups counters for this process
+    """
+
+    def __init__(self, path: Path = CACHE_PATH, threshold: float = THRESHOLD, max_entries: int = MAX_ENTRIES,
+                 max_age_seconds: float = MAX_AGE_SECONDS):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.lookups = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._puts = 0
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        cols = [r[1] for r in self._conn.execute("PRAGMA table_info(semantic_cache)")]
+        if cols and "settings" not in cols:
+            # pre-settings table: entries can't be keyed correctly, start over
+            self._conn.execute("DROP TABLE semantic_cache")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._corpus = None
+        self._index = None
+        self._entries = {}
+
+    def _sync(self, corpus: str, dim: int):
+        # (re)load entries for this corpus; entries for any other corpus are stale
+        if corpus == self._corpus and self._index is not None:
+            return
+        self._conn.execute("DELETE FROM semantic_cache WHERE corpus != ?", (corpus,))
+        self._evict(time.time())
+        self._conn.commit()
+        self._load(corpus, dim)
+
+    def _load(self, corpus: str, dim: int):
+        import faiss
+
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self._entries = {}
+        rows = self._conn.execute(
+            "SELECT id, model, variant, settings, evidence_ids, judge_json, flags_json, created_at, vector "
+            "FROM semantic_cache"
+        ).fetchall()
+        if rows:
+            vecs = np.stack([np.frombuffer(r[8], dtype=np.float32) for r in rows])
+            self._index.add_with_ids(vecs, np.array([r[0] for r in rows], dtype=np.int64))
+            for r in rows:
+                self._entries[r[0]] = (r[1], r[2], r[3], frozenset(json.loads(r[4])), r[5], r[6], r[7])
+        self._corpus = corpus
+
+    def _evict(self, now: float):
+        # age first, then least-recently-used beyond max_entries
+        self._conn.execute("DELETE FROM semantic_cache WHERE created_at < ?", (now - self.max_age_seconds,))
+        self._conn.execute(
+            """
+            DELETE FROM semantic_cache WHERE id IN (
+              SELECT id FROM semantic_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def _drop(self, ids):
+        if ids:
+            self._index.remove_ids(np.array(ids, dtype=np.int64))
+            for i in ids:
+                self._entries.pop(i, None)
+
+    def lookup(self, vec, evidence_ids, model: str, variant: str, corpus: str, settings: str = ""):
+        """(judge_obj, flags, score) of a matching past claim, or None"""
+        vec = np.ascontiguousarray(vec, dtype=np.float32).reshape(1, -1)
+        wanted = frozenset(evidence_ids)
+        now = time.time()
+        with self._lock:
+            self._sync(corpus, vec.shape[1])
+            self.lookups += 1
+            if not self._index.ntotal:
+                return None
+
+            scores, ids = self._index.search(vec, min(NEIGHBORS, self._index.ntotal))
+            for score, eid in zip(scores[0], ids[0]):
+                if eid < 0 or score < self.threshold:
+                    break  # sorted by score
+                e_model, e_variant, e_settings, e_evidence, judge_json, flags_json, created_at = self._entries[int(eid)]
+                if now - created_at > self.max_age_seconds:
+                    continue
+                if e_model == model and e_variant == variant and e_settings == settings and e_evidence == wanted:
+                    self._conn.execute("UPDATE semantic_cache SET accessed_at = ? WHERE id = ?", (now, int(eid)))
+                    self._conn.commit()
+                    self.hits += 1
+                    return json.loads(judge_json), json.loads(flags_json), float(score)
+        return None
+
+    def put(self, vec, claim: str, evidence_ids, model: str, variant: str, corpus: str, judge_obj: dict, flags,
+            settings: str = ""):
+        vec = np.ascontiguousarray(vec, dtype=np.float32).reshape(1, -1)
+        key = (corpus, model, variant, settings, json.dumps(sorted(evidence_ids)), claim)
+        judge_json = json.dumps(judge_obj, ensure_ascii=False)
+        flags_json = json.dumps(flags)
+        now = time.time()
+        with self._lock:
+            self._sync(corpus, vec.shape[1])
+            # the same claim re-judged replaces its row (new id) instead of adding a duplicate
+            old = [r[0] for r in self._conn.execute(
+                "SELECT id FROM semantic_cache WHERE corpus = ? AND model = ? AND variant = ? AND settings = ? "
+                "AND evidence_ids = ? AND claim = ?", key,
+            )]
+            cur = self._conn.execute(
+                "INSERT OR REPLACE INTO semantic_cache (corpus, model, variant, settings, evidence_ids, claim, "
+                "judge_json, flags_json, vector, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, judge_json, flags_json, vec.tobytes(), now, now),
+            )
+            self._drop(old)
+            self._index.add_with_ids(vec, np.array([cur.lastrowid], dtype=np.int64))
+            self._entries[cur.lastrowid] = (model, variant, settings, frozenset(evidence_ids), judge_json, flags_json, now)
+
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._evict(now)
+                kept = {r[0] for r in self._conn.execute("SELECT id FROM semantic_cache")}
+                self._drop([i for i in self._entries if i not in kept])
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM semantic_cache")
+            self._conn.commit()
+            self._corpus = None
+            self._index = None
+            self._entries = {}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_semantic_cache() -> SemanticCache:
+    """Process-wide shared cache."""
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache()
+    return _cache
@@ -1,29 +1,227 @@
 # Agent 0: Hugging Face OCR (image -> text)
-from PIL import Image
-# Hugging Face Transformers OCR model (TrOCR)
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+# PIL / transformers are imported on first use, so importing this module stays cheap
+#
+# TrOCR reads one text line at a time, so a label is split into line crops (row ink profile)
+# and all crops are decoded in one batched generate. Results are cached by image content hash.
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+CACHE_PATH = Path(os.environ.get("CACHE_DIR", ROOT / "data" / "cache")) / "ocr_cache.sqlite"
+
 MODEL_NAME = "microsoft/trocr-small-printed"
-_processor = None
-_model = None
 
-def _load_model():
-    global _processor, _model
+# env overrides for inference nodes
+OCR_THREADS = int(os.environ.get("OCR_THREADS", "0"))  # torch intra-op threads, 0 = torch default
+OCR_QUANTIZE = os.environ.get("OCR_QUANTIZE", "0") == "1"  # dynamic int8 Linear layers
+OCR_CACHE = os.environ.get("OCR_CACHE", "1") != "0"
+CACHE_MAX_ENTRIES = 20_000
+CACHE_MAX_AGE_SECONDS = 30 * 24 * 3600
+EVICT_EVERY = 100       # run cache eviction every N puts
+OCR_BATCH_SIZE = 16     # line crops per generate call
+MAX_NEW_TOKENS = 48     # one printed line rarely needs more
+
+# line segmentation (pixels / fractions of the grayscale label)
+INK_THRESHOLD = 0.02    # a row is "text" if this fraction of its pixels is dark
+MIN_LINE_HEIGHT = 8
+MERGE_GAP = 3           # blank rows inside one line (e.g. between x-height and descenders)
+LINE_PAD = 4
+
+_models = {}
+_model_lock = threading.Lock()
+_cache = None
+
+def _load_model(quantize: bool = None):
+    quantize = OCR_QUANTIZE if quantize is None else quantize
+
+    with _model_lock:
+        if quantize not in _models:
+            import torch
+            # Hugging Face Transformers OCR model (TrOCR)
+            from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+
+            if OCR_THREADS:
+                torch.set_num_threads(OCR_THREADS)
+
+            processor = TrOCRProcessor.from_pretrained(MODEL_NAME)
+            model = VisionEncoderDecoderModel.from_pretrained(MODEL_NAME).eval()
+            if quantize:
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            _models[quantize] = (processor, model)
+
+    return _models[quantize]
+
+class _OcrCache:
+    """
+    sha256(image bytes + settings) -> text, in SQLite next to the judge cache.
+    - LRU by entry count (max_entries) + age limit (max_age_seconds), checked every EVICT_EVERY puts
+    """
+
+    def __init__(self, path: Path = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES,
+                 max_age_seconds: float = CACHE_MAX_AGE_SECONDS):
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache (key TEXT PRIMARY KEY, text TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        # caches written before eviction existed have no accessed_at: start it at created_at
+        cols = {row[1] for row in self._conn.execute("PRAGMA table_info(ocr_cache)")}
+        if "accessed_at" not in cols:
+            self._conn.execute("ALTER TABLE ocr_cache ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+            self._conn.execute("UPDATE ocr_cache SET accessed_at = created_at")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_accessed ON ocr_cache(accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT text, created_at FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.max_age_seconds:
+                return None
+            self._conn.execute("UPDATE ocr_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return row[0]
+
+    def put(self, key: str, text: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, text, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, text, now, now),
+            )
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._evict(now)
+            self._conn.commit()
 
-    if _processor is None or _model is None:
-        _processor = TrOCRProcessor.from_pretrained(MODEL_NAME)
-        _model = VisionEncoderDecoderModel.from_pretrained(MODEL_NAME)
+    def _evict(self, now: float):
+        # age first, then least-recently-used beyond max_entries
+        self._conn.execute("DELETE FROM ocr_cache WHERE created_at < ?", (now - self.max_age_seconds,))
+        self._conn.execute(
+            "DELETE FROM ocr_cache WHERE key IN (SELECT key FROM ocr_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
 
-    return _processor, _model
+    def evict(self):
+        with self._lock:
+            self._evict(time.time())
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+
+def get_cache() -> _OcrCache:
+    global _cache
+
+    with _model_lock:
+        if _cache is None:
+            _cache = _OcrCache()
+    return _cache
+
+def segment_lines(img):
+    """
+    Horizontal text lines of a label -> list of (left, top, right, bottom) boxes, top to bottom.
+    Dark-on-light is assumed; mostly dark images are inverted first. Empty list if nothing looks like text.
+    """
+    gray = np.asarray(img.convert("L"), dtype=np.float32)
+    if gray.mean() < 128:
+        gray = 255 - gray
+    # ink = clearly darker than the page background
+    ink = gray < min(200.0, float(np.median(gray)) - 40)
+
+    h, w = ink.shape
+    rows = ink.mean(axis=1) > INK_THRESHOLD
+
+    runs = []
+    start = None
+    for y, on in enumerate(rows):
+        if on and start is None:
+            start = y
+        elif not on and start is not None:
+            runs.append([start, y])
+            start = None
+    if start is not None:
+        runs.append([start, h])
+
+    merged = []
+    for run in runs:
+        if merged and run[0] - merged[-1][1] <= MERGE_GAP:
+            merged[-1][1] = run[1]
+        else:
+            merged.append(run)
+
+    boxes = []
+    for top, bottom in merged:
+        if bottom - top < MIN_LINE_HEIGHT:
+            continue
+        cols = np.flatnonzero(ink[top:bottom].any(axis=0))
+        left, right = int(cols[0]), int(cols[-1]) + 1
+        boxes.append((
+            max(0, left - LINE_PAD),
+            max(0, top - LINE_PAD),
+            min(w, right + LINE_PAD),
+            min(h, bottom + LINE_PAD),
+        ))
+    return boxes
+
+def _decode(crops, quantize: bool = None):
+    # all crops through the model in OCR_BATCH_SIZE batches
+    import torch
+
+    processor, model = _load_model(quantize)
+    texts = []
+    with torch.inference_mode():
+        for start in range(0, len(crops), OCR_BATCH_SIZE):
+            pixel_values = processor(images=crops[start:start + OCR_BATCH_SIZE], return_tensors="pt").pixel_values
+            generated_ids = model.generate(pixel_values, max_new_tokens=MAX_NEW_TOKENS)
+            texts.extend(processor.batch_decode(generated_ids, skip_special_tokens=True))
+    return texts
+
+def _cache_key(data: bytes, segment: bool, quantize: bool) -> str:
+    h = hashlib.sha256(data)
+    h.update(f"|{MODEL_NAME}|segment={segment}|int8={quantize}".encode("utf-8"))
+    return h.hexdigest()
 
 # https://huggingface.co/microsoft/trocr-small-printed
-def extract_label_text(image_path: str) -> str:
-    processor, model = _load_model()
+def extract_label_text(image_path: str, segment: bool = True, use_cache: bool = None, quantize: bool = None) -> str:
+    """
+    Label image -> plain text.
+    - segment: OCR each detected text line (batched) instead of the whole image at once
+    - use_cache: default OCR_CACHE (env OCR_CACHE=0 turns it off)
+    - quantize: default OCR_QUANTIZE (env OCR_QUANTIZE=1)
+    """
+    from PIL import Image
+
+    use_cache = OCR_CACHE if use_cache is None else use_cache
+    quantize = OCR_QUANTIZE if quantize is None else quantize
+
+    data = Path(image_path).read_bytes()
+    key = _cache_key(data, segment, quantize)
+    cache = get_cache() if use_cache else None
+    if cache is not None:
+        text = cache.get(key)
+        if text is not None:
+            return text
 
-    img = Image.open(image_path).convert("RGB")
-    pixel_values = processor(images=img, return_tensors="pt").pixel_values
-    generated_ids = model.generate(pixel_values)
-    text = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    boxes = segment_lines(img) if segment else []
+    crops = [img.crop(box) for box in boxes] or [img]  # no lines found -> whole image, as before
 
-    text = " ".join(text.split())
+    text = " ".join(" ".join(_decode(crops, quantize)).split())
 
+    if cache is not None:
+        cache.put(key, text)
     return text
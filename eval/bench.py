@@ -0,0 +1,317 @@
+# Latency / throughput benchmark (retrieval + judge), offline by default via the mock Ollama
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from datetime import datetime, timezone
+
+import agents.judge as judge_mod
+from agents.evidence_pack import estimate_tokens
+from agents.judge import GENERATION_OPTIONS, OLLAMA_MODEL, _post_generate, build_prompt, judge, judge_many
+from agents.retriever import RetrieverEngine
+from eval.mock_ollama import start_mock_server
+from index.encoder import BACKENDS, load_encoder
+from telemetry.spans import summarize_ms
+
+ROOT = Path(__file__).resolve().parents[1]
+TESTSET = ROOT / "tests" / "testset.jsonl"
+FAILURE_SET = ROOT / "eval" / "failure_set.jsonl"
+OUT_DIR = ROOT / "eval" / "results"
+
+BATCH_SIZES = [1, 8, 32, 128]
+CONCURRENCY = [1, 2, 4, 8]
+
+def load_claims():
+    claims = []
+    for path in (TESTSET, FAILURE_SET):
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                claims.append(json.loads(line)["claim"])
+    return claims
+
+def _ms(t0):
+    return (time.perf_counter() - t0) * 1000
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def bench_stages(engine, claims, k: int, repeat: int):
+    # per-claim stage timings, the way pipeline/run.py handles one claim
+    timings = {"embed_ms": [], "search_ms": [], "prompt_build_ms": [], "judge_ms": []}
+
+    for _ in range(repeat):
+        for claim in claims:
+            t0 = time.perf_counter()
+            vec = engine.encode([claim])
+            timings["embed_ms"].append(_ms(t0))
+
+            t0 = time.perf_counter()
+            evidence = engine.search_vectors(vec, k=k)[0]
+            timings["search_ms"].append(_ms(t0))
+
+            t0 = time.perf_counter()
+            build_prompt(claim, evidence)
+            timings["prompt_build_ms"].append(_ms(t0))
+
+            t0 = time.perf_counter()
+            judge(claim, evidence, use_cache=False, use_gate=False)
+            timings["judge_ms"].append(_ms(t0))
+
+    return {name: summarize_ms(v) for name, v in timings.items()}
+
+def bench_retrieval_throughput(engine, claims, k: int, n: int):
+    # claims/sec of retrieve_batch at different batch sizes
+    work = (claims * (n // max(1, len(claims)) + 1))[:n]
+    out = {}
+    for bs in BATCH_SIZES:
+        t0 = time.perf_counter()
+        for start in range(0, len(work), bs):
+            engine.retrieve_batch(work[start:start + bs], k=k, batch_size=bs)
+        elapsed = time.perf_counter() - t0
+        out[str(bs)] = {"claims": len(work), "seconds": elapsed, "claims_per_sec": len(work) / elapsed}
+    return out
+
+def bench_judge_throughput(engine, claims, k: int, n: int):
+    # claims/sec of judge_many at different in-flight limits
+    work = (claims * (n // max(1, len(claims)) + 1))[:n]
+    evidences = engine.retrieve_batch(work, k=k)
+    out = {}
+    for c in CONCURRENCY:
+        t0 = time.perf_counter()
+        judge_many(work, evidences, max_in_flight=c, use_cache=False, use_gate=False)
+        elapsed = time.perf_counter() - t0
+        out[str(c)] = {"claims": len(work), "seconds": elapsed, "claims_per_sec": len(work) / elapsed}
+    return out
+
+# fresh interpreter: import + model load + first encode (what a cold retriever pays)
+_COLD_START = """
+import time
+t0 = time.perf_counter()
+from index.encoder import load_encoder
+t1 = time.perf_counter()
+enc = load_encoder({backend!r})
+t2 = time.perf_counter()
+enc.encode(["warm up"])
+t3 = time.perf_counter()
+print((t1 - t0) * 1000, (t2 - t1) * 1000, (t3 - t2) * 1000)
+"""
+
+def bench_encoders(backends, claims, repeat: int):
+    # per backend: cold start (separate process) + warm single-claim and batched latency
+    out = {}
+    for backend in backends:
+        proc = subprocess.run([sys.executable, "-c", _COLD_START.format(backend=backend)],
+                              cwd=ROOT, capture_output=True, text=True, check=True)
+        import_ms, load_ms, first_ms = map(float, proc.stdout.split()[-3:])
+
+        encoder = load_encoder(backend)
+        single = []
+        for _ in range(repeat):
+            for claim in claims:
+                t0 = time.perf_counter()
+                encoder.encode([claim])
+                single.append(_ms(t0))
+
+        t0 = time.perf_counter()
+        encoder.encode(claims, batch_size=64)
+        batch_ms = _ms(t0)
+
+        out[backend] = {
+            "import_ms": import_ms,
+            "load_ms": load_ms,
+            "first_encode_ms": first_ms,
+            "single_claim_ms": summarize_ms(single),
+            "batch_claims_per_sec": len(claims) / (batch_ms / 1000),
+        }
+    return out
+
+_IMPORT_PIPELINE = """
+import sys, time
+t0 = time.perf_counter()
+import pipeline.run
+ms = (time.perf_counter() - t0) * 1000
+heavy = [m for m in ("faiss", "torch", "sentence_transformers", "onnxruntime", "transformers", "PIL") if m in sys.modules]
+print(ms, ",".join(heavy) or "-")
+"""
+
+_IMPORT_OCR_STACK = """
+import time
+t0 = time.perf_counter()
+import PIL.Image, transformers
+print((time.perf_counter() - t0) * 1000)
+"""
+
+def bench_startup(claim: str, repeat: int, ollama_url: str):
+    """
+    Fresh-process startup of pipeline/run.py for a text claim:
+    - import time of pipeline.run (+ which heavy modules it pulled in)
+    - import time of the OCR stack a text claim no longer pays for
+    - wall time to the first JSON result of `python -m pipeline.run --claim ... --json`
+    """
+    # no verdict caches (every run pays the judge), and telemetry / cache files go to a temp dir
+    tmp = tempfile.TemporaryDirectory()
+    env = dict(os.environ, OLLAMA_URL=ollama_url, JUDGE_CACHE="0", SEMANTIC_CACHE="0",
+               TELEMETRY_DB=str(Path(tmp.name) / "telemetry.db"), CACHE_DIR=tmp.name)
+
+    def run(args):
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True)
+        return _ms(t0), proc
+
+    import_ms, first_result_ms, ocr_ms = [], [], []
+    heavy = None
+    try:
+        for _ in range(repeat):
+            _, proc = run(["-c", _IMPORT_PIPELINE])
+            ms, heavy = proc.stdout.split()[-2:]
+            import_ms.append(float(ms))
+
+            _, proc = run(["-c", _IMPORT_OCR_STACK])
+            if proc.returncode == 0:
+                ocr_ms.append(float(proc.stdout.split()[-1]))
+
+            ms, proc = run(["-m", "pipeline.run", "--claim", claim, "--json"])
+            if proc.returncode != 0:
+                raise RuntimeError(f"pipeline.run failed: {proc.stderr[-2000:]}")
+            first_result_ms.append(ms)
+    finally:
+        tmp.cleanup()
+
+    return {
+        "import_pipeline_ms": summarize_ms(import_ms),
+        "heavy_modules_after_import": [] if heavy == "-" else heavy.split(","),
+        "ocr_stack_import_ms_skipped": summarize_ms(ocr_ms),
+        "first_result_ms": summarize_ms(first_result_ms),
+    }
+
+OCR_CONFIGS = {
+    # name: extract_label_text kwargs (cache off so every call runs the model)
+    "whole_image": {"segment": False, "quantize": False},
+    "lines_batched": {"segment": True, "quantize": False},
+    "lines_batched_int8": {"segment": True, "quantize": True},
+}
+
+def bench_ocr(image_dir: Path, repeat: int):
+    # per-label OCR latency: old whole-image path vs line-batched (+int8), plus a cache hit
+    from agents import vision_extractor
+
+    paths = sorted(p for p in Path(image_dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp"))
+    out = {"n_images": len(paths)}
+    for name, kwargs in OCR_CONFIGS.items():
+        vision_extractor._load_model(kwargs["quantize"])  # model load is not per-label latency
+        times = []
+        for _ in range(repeat):
+            for path in paths:
+                t0 = time.perf_counter()
+                vision_extractor.extract_label_text(str(path), use_cache=False, **kwargs)
+                times.append(_ms(t0))
+        out[name] = summarize_ms(times)
+
+    times = []
+    for path in paths:
+        vision_extractor.extract_label_text(str(path), use_cache=True)  # fill
+        t0 = time.perf_counter()
+        vision_extractor.extract_label_text(str(path), use_cache=True)
+        times.append(_ms(t0))
+    out["cache_hit"] = summarize_ms(times)
+    return out
+
+def bench_evidence_pack(engine, claims, k: int):
+    # judge prompt size with raw vs packed evidence; prompt_eval_* comes from the judge server
+    evidences = engine.retrieve_batch(claims, k=k)
+    out = {}
+    for name, pack in (("raw", False), ("packed", True)):
+        est, counts, prefill_ms = [], [], []
+        for claim, evidence in zip(claims, evidences):
+            prompt = build_prompt(claim, evidence, pack=pack)
+            est.append(estimate_tokens(prompt))
+            resp = _post_generate({"model": OLLAMA_MODEL, "prompt": prompt, "stream": False,
+                                   "options": dict(GENERATION_OPTIONS)})
+            if "prompt_eval_count" in resp:
+                counts.append(resp["prompt_eval_count"])
+            if "prompt_eval_duration" in resp:
+                prefill_ms.append(resp["prompt_eval_duration"] / 1e6)
+        # summarize_ms is unit-agnostic; the token entries are token counts
+        out[name] = {
+            "est_prompt_tokens": summarize_ms(est),
+            "prompt_eval_count": summarize_ms(counts),
+            "prompt_eval_ms": summarize_ms(prefill_ms),
+        }
+    raw, packed = out["raw"]["est_prompt_tokens"], out["packed"]["est_prompt_tokens"]
+    if raw["n"]:
+        out["est_prompt_tokens_saved"] = 1 - packed["mean"] / raw["mean"]
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval + end-to-end latency benchmark")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the claim set for stage timings")
+    parser.add_argument("--n", type=int, default=256, help="claims per throughput run")
+    parser.add_argument("--mock-delay", type=float, default=0.05, help="seconds per mock generation")
+    parser.add_argument("--ollama", action="store_true", help="judge with the real Ollama at OLLAMA_URL instead of the mock")
+    parser.add_argument("--encoders", default="",
+                        help=f"also compare encoder backends, e.g. {','.join(BACKENDS)} (onnx needs index.encoder export)")
+    parser.add_argument("--startup", action="store_true",
+                        help="also time fresh-process import + first result of pipeline/run.py")
+    parser.add_argument("--ocr-images", default="",
+                        help="folder of label images: also time OCR per label (whole image vs batched lines, int8, cache)")
+    parser.add_argument("--evidence-pack", action="store_true",
+                        help="also compare judge prompt size / prefill time with raw vs packed evidence")
+    args = parser.parse_args()
+
+    claims = load_claims()
+    print(f"Loaded claims: {len(claims)}")
+
+    server = None
+    if not args.ollama:
+        server, judge_mod.OLLAMA_URL = start_mock_server(delay=args.mock_delay)
+        print("Mock Ollama:", judge_mod.OLLAMA_URL)
+
+    try:
+        # fresh engine -> model + index + chunk load is the cold start
+        engine = RetrieverEngine()
+        t0 = time.perf_counter()
+        engine.load()
+        cold_start_ms = _ms(t0)
+
+        report = {
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "judge": "ollama" if args.ollama else f"mock(delay={args.mock_delay})",
+            "n_claims": len(claims),
+            "k": args.k,
+            "cold_start_ms": cold_start_ms,
+            "stages": bench_stages(engine, claims, args.k, args.repeat),
+            "retrieval_throughput_by_batch_size": bench_retrieval_throughput(engine, claims, args.k, args.n),
+            "judge_throughput_by_concurrency": bench_judge_throughput(engine, claims, args.k, args.n),
+        }
+        if args.startup:
+            report["startup"] = bench_startup(claims[0], args.repeat, judge_mod.OLLAMA_URL)
+        if args.ocr_images:
+            report["ocr"] = bench_ocr(args.ocr_images, args.repeat)
+        if args.evidence_pack:
+            report["evidence_pack"] = bench_evidence_pack(engine, claims, args.k)
+        if args.encoders:
+            report["encoders"] = bench_encoders(args.encoders.split(","), claims, args.repeat)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now(timezone.utc).isoformat().replace(":", "").replace(".", "")
+    out_path = OUT_DIR / f"bench_{timestamp}.json"
+    out_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print(json.dumps(report, indent=2))
+    print(f"Saved: {out_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# Calibrate the relevance gate (agents/gate.py) from eval results
+#
+#   python -m eval.run_eval_ab          (ungated results -> eval/results/eval_{A,B}_*.json)
+#   python -m eval.calibrate_gate       (-> data/processed/gate_thresholds.json)
+#
+# Picks the thresholds that skip the most LLM calls without turning claims the judge got right into
+# a wrong "Unknown" (at most --max-accuracy-drop of them). Gated claims count as predicting "Unknown".
+# Checking lost claims, not just total accuracy, keeps a small eval set from trading right answers
+# for lucky Unknowns. A share of the claims is held out of the fit and scored separately, and nothing is
+# written below --min-claims (a threshold fit on a dozen claims is noise).
+import argparse
+import json
+import random
+from datetime import datetime, timezone
+from pathlib import Path
+
+from agents.gate import DEFAULT_THRESHOLDS, GATE_FILE, gate_fires
+
+ROOT = Path(__file__).resolve().parents[1]
+RESULTS_DIR = ROOT / "eval" / "results"
+
+MIN_SAMPLES = 5  # claims whose top evidence is from a doc before it gets its own threshold
+MIN_CLAIMS = 40  # distinct training claims before any threshold (the default included) is fit
+HOLDOUT_FRACTION = 0.25  # claims kept out of the fit to report unseen-claim performance
+
+def latest_results(results_dir: Path = RESULTS_DIR):
+    # newest eval file per variant
+    latest = {}
+    for path in sorted(Path(results_dir).glob("eval_*_*.json")):
+        variant = path.name.split("_")[1]
+        latest[variant] = path
+    return list(latest.values())
+
+def load_samples(paths):
+    samples = []
+    for path in paths:
+        payload = json.loads(Path(path).read_text(encoding="utf-8"))
+        if payload["summary"].get("gate"):
+            raise ValueError(f"{path} was produced with the gate on; calibrate from ungated results")
+        for r in payload["results"]:
+            samples.append({"id": r["id"], "expected": r["expected"], "pred": r["pred"], "evidence": r["top_evidence"]})
+    return samples
+
+def n_claims(samples) -> int:
+    # the same claim appears once per variant / model
+    return len({s["id"] for s in samples})
+
+def split_samples(samples, holdout_fraction: float = HOLDOUT_FRACTION, seed: int = 0):
+    """
+    (fit, held_out) split by claim id, so every variant of a claim lands on the same side.
+    """
+    ids = sorted({s["id"] for s in samples})
+    random.Random(seed).shuffle(ids)
+    held = set(ids[:int(len(ids) * holdout_fraction)])
+    return [s for s in samples if s["id"] not in held], [s for s in samples if s["id"] in held]
+
+def score(samples, thresholds):
+    # (accuracy, gated fraction, lost fraction) if the gate had been in front of the judge
+    correct = gated = lost = 0
+    for s in samples:
+        fired = gate_fires(s["evidence"], thresholds)
+        ok = ("Unknown" if fired else s["pred"]) == s["expected"]
+        gated += fired
+        correct += ok
+        lost += fired and not ok and s["pred"] == s["expected"]
+    n = max(1, len(samples))
+    return correct / n, gated / n, lost / n
+
+def _candidates(scores):
+    # every place the decision can change: just above each observed score (plus "off")
+    return [DEFAULT_THRESHOLDS["default"]] + sorted(set(round(x + 1e-6, 6) for x in scores))
+
+def _best(samples, thresholds, key, values, max_lost):
+    # value of thresholds[key] (or per_doc[key]) gating the most claims with lost <= max_lost;
+    # ties go to the lowest (most conservative) threshold
+    best = None
+    for v in values:
+        trial = {"default": thresholds["default"], "per_doc": dict(thresholds["per_doc"])}
+        if key == "default":
+            trial["default"] = v
+        else:
+            trial["per_doc"][key] = v
+        _, gated, lost = score(samples, trial)
+        if lost <= max_lost + 1e-9 and (best is None or gated > best[1]):
+            best = (v, gated)
+    return best[0] if best is not None else None
+
+def evaluate(samples, thresholds):
+    ungated = {"default": DEFAULT_THRESHOLDS["default"], "per_doc": {}}
+    acc, gated, lost = score(samples, thresholds)
+    return {
+        "n_samples": len(samples),
+        "n_claims": n_claims(samples),
+        "ungated_accuracy": score(samples, ungated)[0],
+        "gated_accuracy": acc,
+        "llm_calls_skipped": gated,
+        "correct_verdicts_lost": lost,
+    }
+
+def calibrate(samples, max_accuracy_drop: float = 0.0, min_samples: int = MIN_SAMPLES, per_doc: bool = True,
+              min_claims: int = MIN_CLAIMS):
+    """
+    (thresholds, report) fit on samples.
+    - fewer than min_claims distinct claims -> the gate stays off (default -1.0, no per-doc overrides)
+    """
+    ungated = {"default": DEFAULT_THRESHOLDS["default"], "per_doc": {}}
+    if n_claims(samples) < min_claims:
+        return ungated, evaluate(samples, ungated)
+
+    thresholds = dict(ungated)
+    all_scores = [e["score"] for s in samples for e in s["evidence"]]
+    thresholds["default"] = _best(samples, thresholds, "default", _candidates(all_scores), max_accuracy_drop)
+
+    if per_doc:
+        # docs that are the top hit often enough get their own threshold on top of the default
+        by_doc = {}
+        for s in samples:
+            if s["evidence"]:
+                by_doc.setdefault(s["evidence"][0]["doc_id"], []).extend(
+                    e["score"] for e in s["evidence"] if e["doc_id"] == s["evidence"][0]["doc_id"]
+                )
+        for doc_id, scores in sorted(by_doc.items()):
+            if len(scores) < min_samples:
+                continue
+            v = _best(samples, thresholds, doc_id, _candidates(scores), max_accuracy_drop)
+            if v is None:
+                continue
+            trial = {"default": thresholds["default"], "per_doc": {**thresholds["per_doc"], doc_id: v}}
+            # only keep an override that actually skips more calls than the default does
+            if score(samples, trial)[1] > score(samples, thresholds)[1]:
+                thresholds = trial
+
+    return thresholds, evaluate(samples, thresholds)
+
+def main():
+    parser = argparse.ArgumentParser(description="Set relevance-gate thresholds from eval results")
+    parser.add_argument("--results", nargs="*", help="eval result JSON files (default: newest per variant)")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.0,
+                        help="fraction of correct verdicts the gate may turn into a wrong Unknown")
+    parser.add_argument("--min-samples", type=int, default=MIN_SAMPLES, help="claims per doc for a per-doc threshold")
+    parser.add_argument("--min-claims", type=int, default=MIN_CLAIMS,
+                        help="distinct claims in the fit split before any threshold is fit or saved")
+    parser.add_argument("--holdout", type=float, default=HOLDOUT_FRACTION,
+                        help="fraction of claims held out of the fit and scored separately")
+    parser.add_argument("--no-per-doc", action="store_true", help="only calibrate the default threshold")
+    parser.add_argument("--dry-run", action="store_true", help="print the thresholds without saving")
+    args = parser.parse_args()
+
+    paths = args.results or latest_results()
+    if not paths:
+        print("No eval results found; run: python -m eval.run_eval_ab")
+        return
+    print("Calibrating from:", *[str(p) for p in paths], sep="\n  ")
+
+    samples = load_samples(paths)
+    fit, held_out = split_samples(samples, args.holdout)
+    thresholds, report = calibrate(fit, args.max_accuracy_drop, args.min_samples, per_doc=not args.no_per_doc,
+                                   min_claims=args.min_claims)
+    report = {"fit": report, "held_out": evaluate(held_out, thresholds) if held_out else None}
+    print(json.dumps({**thresholds, "report": report}, indent=2))
+
+    if report["fit"]["n_claims"] < args.min_claims:
+        print(f"Only {report['fit']['n_claims']} claims to fit on (need --min-claims {args.min_claims}); "
+              f"gate thresholds not saved")
+        return
+    if args.dry_run:
+        return
+    payload = {
+        **thresholds,
+        "report": report,
+        "calibrated_from": [str(p) for p in paths],
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    GATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    GATE_FILE.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    print("Saved gate thresholds to:", GATE_FILE)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# Local stand-in for Ollama's /api/generate (offline tests + benchmarks)
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# "CITATION: id1, id2 (doc_id)" -- packed evidence blocks list every merged chunk_id
+CITATION_RE = re.compile(r"^CITATION: ([^(\n]+?) \(", re.MULTILINE)
+TOKEN_RE = re.compile(r"\s*\S+")  # streamed "tokens": words with their leading space
+
+def fake_verdict(prompt: str) -> dict:
+    # deterministic: cite the first two evidence chunks, "Unknown" if there is no evidence
+    cited = [cid.strip() for line in CITATION_RE.findall(prompt) for cid in line.split(",")][:2]
+    return {
+        "verdict": "Supported" if cited else "Unknown",
+        "short_reason": "Mock verdict from the local Ollama stand-in.",
+        "citations": cited,
+        "confidence": 0.5 if cited else 0.0,
+    }
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+    disable_nagle_algorithm = True  # headers + body are separate writes; avoid ~40ms delayed-ACK stalls
+
+    def log_message(self, fmt, *args):
+        # keep test/benchmark output quiet
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # a client that stopped a stream early dropped the connection
+
+    def _send_json(self, status: int, obj: dict):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        server = self.server
+        with server.counter_lock:
+            server.n_requests += 1
+            n = server.n_requests
+        if server.fail_every and n % server.fail_every == 0:
+            self._send_json(503, {"error": "mock overload"})
+            return
+
+        prompt = payload.get("prompt", "")
+        response = json.dumps(fake_verdict(prompt))
+        if n <= server.garble:
+            # no JSON at all -> the judge's parse retry
+            response = "I think the claim is probably supported by the evidence."
+        elif server.ramble:
+            # a chatty model keeps going after the JSON
+            response += " " + " ".join(["Note:"] + ["the evidence is limited."] * server.ramble)
+
+        if payload.get("stream", True):  # Ollama streams unless told otherwise
+            self._stream(payload, prompt, response)
+            return
+
+        t0 = time.perf_counter()
+        time.sleep(server.delay)
+        elapsed_ns = int((time.perf_counter() - t0) * 1e9)
+
+        self._send_json(200, {
+            "model": payload.get("model", ""),
+            "response": response,
+            "done": True,
+            "total_duration": elapsed_ns,
+            "prompt_eval_count": len(prompt.split()),
+            "prompt_eval_duration": elapsed_ns // 2,
+            "eval_count": len(response.split()),
+            "eval_duration": elapsed_ns // 2,
+        })
+
+    def _stream(self, payload: dict, prompt: str, response: str):
+        # NDJSON, one "token" per line; half the delay is prefill, the rest is spread over the tokens
+        server = self.server
+        tokens = TOKEN_RE.findall(response)
+        num_predict = payload.get("options", {}).get("num_predict", -1)
+        done_reason = "stop"
+        if 0 <= num_predict < len(tokens):
+            tokens, done_reason = tokens[:num_predict], "length"
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(obj):
+            line = json.dumps(obj).encode("utf-8") + b"\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+
+        t0 = time.perf_counter()
+        time.sleep(server.delay / 2)
+        prefill_ns = int((time.perf_counter() - t0) * 1e9)
+        per_token = server.delay / 2 / max(1, len(tokens))
+        try:
+            for tok in tokens:
+                send({"model": payload.get("model", ""), "response": tok, "done": False})
+                time.sleep(per_token)
+                with server.counter_lock:
+                    server.tokens_sent += 1
+            elapsed_ns = int((time.perf_counter() - t0) * 1e9)
+            send({
+                "model": payload.get("model", ""),
+                "response": "",
+                "done": True,
+                "done_reason": done_reason,
+                "total_duration": elapsed_ns,
+                "prompt_eval_count": len(prompt.split()),
+                "prompt_eval_duration": prefill_ns,
+                "eval_count": len(tokens),
+                "eval_duration": elapsed_ns - prefill_ns,
+            })
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # client hung up early (stream early termination), like Ollama cancelling the request
+            self.close_connection = True
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, delay: float = 0.0, fail_every: int = 0,
+                      ramble: int = 0, garble: int = 0):
+    """
+    Start the stand-in in a daemon thread.
+    - port=0 picks a free port
+    - delay: seconds per generation
+    - fail_every: answer every Nth request with 503 (exercises retries)
+    - ramble: sentences of prose after the JSON (exercises streaming early stop / num_predict)
+    - garble: answer the first N requests with prose instead of JSON (exercises the parse retry)
+    Returns (server, generate_url); call server.shutdown() when done.
+    """
+    server = ThreadingHTTPServer((host, port), MockOllamaHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.fail_every = fail_every
+    server.ramble = ramble
+    server.garble = garble
+    server.n_requests = 0
+    server.tokens_sent = 0
+    server.counter_lock = threading.Lock()
+
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+
+    url = f"http://{host}:{server.server_address[1]}/api/generate"
+    return server, url
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Ollama /api/generate server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--fail-every", type=int, default=0)
+    parser.add_argument("--ramble", type=int, default=0)
+    args = parser.parse_args()
+
+    server, url = start_mock_server(args.host, args.port, args.delay, args.fail_every, args.ramble)
+    print("Mock Ollama listening on:", url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
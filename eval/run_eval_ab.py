@@ -1,14 +1,33 @@
 # Evaluation Runner (A/B prompts + failure set + metrics)
+#
+#   python -m eval.run_eval_ab                                  (variants A,B with the default model)
+#   python -m eval.run_eval_ab --variants A,B --models llama3.1:8b,qwen2.5:7b
+#   python -m eval.run_eval_ab --run-id <id>                    (resume an interrupted run)
+#
+# Retrieval runs once per test and its evidence is shared by every (model, variant) cell.
+# The whole model x variant x test grid is judged concurrently; each finished cell is appended to
+# eval/results/checkpoints/eval_<run_id>.jsonl, so rerunning with the same --run-id only judges what is left.
+# Each cell records its session and seconds since that session started, so a resumed run's wall clock is
+# the sum over sessions.
+import argparse
 import json
+import time
+from concurrent.futures import as_completed
 from pathlib import Path
 from datetime import datetime, timezone
 
-from agents.retriever import retrieve
-from agents.judge import judge
+from agents.retriever import retrieve_batch
+from agents.judge import JudgeExecutor, OLLAMA_MODEL, judge_many
+from agents.judge_cache import cache_enabled, get_cache
+from pipeline.checkpoint import read_complete_lines
+from telemetry.spans import SpanRecorder
 
 ROOT = Path(__file__).resolve().parents[1]
 FAILURE_SET = ROOT / "eval" / "failure_set.jsonl"
 OUT_DIR = ROOT / "eval" / "results"
+CHECKPOINT_DIR = OUT_DIR / "checkpoints"
+
+K = 5
 
 def load_failure_set(path: Path):
     items = []
@@ -28,85 +47,205 @@ def citation_hit_rate(judge_obj, evidence):
     hits = sum([1 for c in cited if c in got])
     return hits / max(1, len(cited))
 
-def eval_variant(variant: str, tests):
-    results = []
-    correct = 0
-    total = 0
-    hit_rates = []
-    flag_count = 0
-
-    for t in tests:
-        claim = t["claim"]
-        expected = t["expected"]
-
-        # retrieval first
-        evidence = retrieve(claim, k=5)
-
-        # judge with prompt variant
-        judge_obj, flags = judge(claim, evidence, variant=variant)
-
-        pred = judge_obj.get("verdict", "Unknown")
-
-        is_correct = (pred == expected)
-        correct += 1 if is_correct else 0
-        total += 1
-
-        hr = citation_hit_rate(judge_obj, evidence)
-        hit_rates.append(hr)
-
-        if flags:
-            flag_count += 1
-
-        results.append({
-            "id": t["id"],
-            "claim": claim,
-            "expected": expected,
-            "pred": pred,
-            "is_correct": is_correct,
-            "citation_hit_rate": hr,
-            "flags": flags,
-            "judge_obj": judge_obj,
-            "top_evidence": [
-                {"chunk_id": e["chunk_id"], "doc_id": e["doc_id"], "score": e["score"]}
-                for e in evidence
-            ]
-        })
-
-    accuracy = correct / max(1, total)
-    avg_hit_rate = sum(hit_rates) / max(1, len(hit_rates))
-    flag_rate = flag_count / max(1, total)
+def score_test(t, evidence, judge_obj, flags):
+    # one per-test result entry
+    pred = judge_obj.get("verdict", "Unknown")
+    return {
+        "id": t["id"],
+        "claim": t["claim"],
+        "expected": t["expected"],
+        "pred": pred,
+        "is_correct": pred == t["expected"],
+        "citation_hit_rate": citation_hit_rate(judge_obj, evidence),
+        "flags": flags,
+        "judge_obj": judge_obj,
+        "top_evidence": [
+            {"chunk_id": e["chunk_id"], "doc_id": e["doc_id"], "score": e["score"]}
+            for e in evidence
+        ]
+    }
 
+def summarize(variant: str, results, use_gate: bool, model: str = None):
+    total = len(results)
     summary = {
         "variant": variant,
+        "model": model or OLLAMA_MODEL,
         "n_tests": total,
-        "accuracy": accuracy,
-        "avg_citation_hit_rate": avg_hit_rate,
-        "flag_rate": flag_rate,
+        "accuracy": sum(1 for r in results if r["is_correct"]) / max(1, total),
+        "avg_citation_hit_rate": sum(r["citation_hit_rate"] for r in results) / max(1, total),
+        "flag_rate": sum(1 for r in results if r["flags"]) / max(1, total),
+        "gate": use_gate,
     }
-
-    return summary, results
+    return summary
+
+def eval_variant(variant: str, tests, evidences=None, use_gate: bool = False, model: str = None):
+    """
+    One variant over the whole set (no checkpointing; see run_grid for the resumable grid).
+    - evidences: optional precomputed retrieve_batch() output (same order as tests)
+    - use_gate: apply the relevance gate (off by default: raw judge results feed eval/calibrate_gate.py)
+    """
+    if evidences is None:
+        # retrieval first (one batched encode + search for the whole set)
+        evidences = retrieve_batch([t["claim"] for t in tests], k=K)
+
+    # judge the whole set concurrently (results come back in input order)
+    judged = judge_many([t["claim"] for t in tests], evidences, variant=variant, use_gate=use_gate, model=model)
+
+    results = [score_test(t, ev, judge_obj, flags) for t, ev, (judge_obj, flags) in zip(tests, evidences, judged)]
+    return summarize(variant, results, use_gate, model), results
+
+def load_checkpoint(path: Path, header: dict):
+    """
+    (model, variant, id) -> {"result", "llm_seconds"} for cells already judged in this run.
+    A partial last line (killed mid-write) is cut off so appends start on a clean line.
+    """
+    done = {}
+    lines = read_complete_lines(path)
+    saved = json.loads(lines[0])["run"] if lines else header
+    if saved != header:
+        raise SystemExit(f"{path} was written with different settings ({saved}); use a new --run-id")
+    for line in lines[1:]:
+        rec = json.loads(line)
+        done[(rec["model"], rec["variant"], rec["id"])] = rec
+    return done
+
+def _llm_seconds(spans: SpanRecorder) -> float:
+    return sum(s["duration_ms"] for s in spans.spans if s["stage"] == "ollama") / 1000
+
+def run_grid(tests, variants, models, checkpoint: Path, use_gate: bool = False, max_in_flight: int = None):
+    """
+    Judge every (model, variant, test) cell, skipping cells already in the checkpoint.
+    Returns ({(model, variant): [result per test]}, {(model, variant): timing}, failed cell count).
+    timing:
+    - wall_clock_seconds: per session, grid start -> last cell of this pair; summed over sessions
+      (None if a cell comes from a checkpoint without session timings)
+    - llm_seconds: all cells
+    - resumed: some cells were judged in an earlier session
+    """
+    header = {"gate": use_gate, "k": K}
+    done = load_checkpoint(checkpoint, header)
+    pairs = [(m, v) for m in models for v in variants]
+    todo = [t for t in tests if any((m, v, t["id"]) not in done for m, v in pairs)]
+    print(f"Grid: {len(tests)} tests x {len(pairs)} (model, variant) pairs, "
+          f"{sum(1 for m, v in pairs for t in tests if (m, v, t['id']) in done)} cells from checkpoint")
+
+    session = datetime.now(timezone.utc).isoformat()
+    failed = 0
+    if todo:
+        # retrieval doesn't depend on the prompt variant or model -> once per test
+        evidences = retrieve_batch([t["claim"] for t in todo], k=K)
+
+        checkpoint.parent.mkdir(parents=True, exist_ok=True)
+        t0 = time.perf_counter()
+        with checkpoint.open("a", encoding="utf-8") as out, JudgeExecutor(max_in_flight=max_in_flight) as ex:
+            if not done and out.tell() == 0:
+                out.write(json.dumps({"run": header}) + "\n")
+
+            # test-major order keeps every pair progressing together
+            futures = {}
+            for t, evidence in zip(todo, evidences):
+                for m, v in pairs:
+                    if (m, v, t["id"]) in done:
+                        continue
+                    spans = SpanRecorder()
+                    f = ex.submit(t["claim"], evidence, variant=v, use_gate=use_gate, model=m, spans=spans)
+                    futures[f] = (m, v, t, evidence, spans)
+
+            for f in as_completed(futures):
+                m, v, t, evidence, spans = futures[f]
+                try:
+                    judge_obj, flags = f.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"  failed: model={m} variant={v} id={t['id']}: {type(e).__name__}: {e}")
+                    continue
+                rec = {
+                    "model": m,
+                    "variant": v,
+                    "id": t["id"],
+                    "session": session,
+                    "wall_seconds": time.perf_counter() - t0,
+                    "llm_seconds": _llm_seconds(spans),
+                    "result": score_test(t, evidence, judge_obj, flags),
+                }
+                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                out.flush()
+                done[(m, v, t["id"])] = rec
+
+    cells = {}
+    timing = {}
+    for p in pairs:
+        recs = [done[(*p, t["id"])] for t in tests if (*p, t["id"]) in done]
+        cells[p] = [r["result"] for r in recs]
+        timing[p] = {
+            "wall_clock_seconds": _wall_seconds(recs),
+            "llm_seconds": sum(r["llm_seconds"] for r in recs),
+            "resumed": any(r.get("session") != session for r in recs),
+        }
+    return cells, timing, failed
+
+def _wall_seconds(recs):
+    # sessions ran one after another -> sum of each session's last-cell time
+    last = {}
+    for r in recs:
+        if "wall_seconds" not in r:
+            return None
+        last[r["session"]] = max(last.get(r["session"], 0.0), r["wall_seconds"])
+    return sum(last.values())
+
+def _label(variant: str, model: str, models) -> str:
+    # file label: just the variant for a single-model run (what eval/calibrate_gate.py expects)
+    if len(models) == 1:
+        return variant
+    return f"{variant}-{model.replace(':', '-').replace('/', '-').replace('_', '-')}"
 
 def main():
+    parser = argparse.ArgumentParser(description="A/B judge prompt evaluation on the failure set")
+    parser.add_argument("--gate", action="store_true", help="evaluate with the calibrated relevance gate applied")
+    parser.add_argument("--variants", default="A,B", help="comma-separated prompt variants")
+    parser.add_argument("--models", default=OLLAMA_MODEL, help="comma-separated Ollama models")
+    parser.add_argument("--run-id", default=None, help="resume this run from its checkpoint (default: new run)")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="concurrent judge calls (default: OLLAMA_NUM_PARALLEL)")
+    args = parser.parse_args()
+
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
     tests = load_failure_set(FAILURE_SET)
     print(f"Loaded failure set: {len(tests)} tests")
 
-    timestamp = datetime.now(timezone.utc).isoformat().replace(":", "").replace(".", "")
-    # run A and B
-    for variant in ["A", "B"]:
-        summary, results = eval_variant(variant, tests)
-
-        out_path = OUT_DIR / f"eval_{variant}_{timestamp}.json"
-        payload = {
-            "summary": summary,
-            "results": results,
-        }
-        out_path.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
-
-        print(f"\nVariant {variant}")
-        print(json.dumps(summary, indent=2))
-        print(f"Saved: {out_path}")
+    run_id = args.run_id or datetime.now(timezone.utc).isoformat().replace(":", "").replace(".", "")
+    checkpoint = CHECKPOINT_DIR / f"eval_{run_id}.jsonl"
+    print(f"Checkpoint: {checkpoint} (resume with --run-id {run_id})")
+
+    variants = [v.strip() for v in args.variants.split(",") if v.strip()]
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+
+    t0 = time.perf_counter()
+    cells, timing, failed = run_grid(tests, variants, models, checkpoint, use_gate=args.gate,
+                                     max_in_flight=args.max_in_flight)
+    print(f"Grid done in {time.perf_counter() - t0:.1f}s")
+    if failed:
+        print(f"\n{failed} cells failed; rerun with --run-id {run_id} to judge only those")
+        return
+
+    for model in models:
+        for variant in variants:
+            results = cells[(model, variant)]
+            summary = {**summarize(variant, results, args.gate, model), **timing[(model, variant)]}
+
+            out_path = OUT_DIR / f"eval_{_label(variant, model, models)}_{run_id}.json"
+            payload = {
+                "summary": summary,
+                "results": results,
+            }
+            out_path.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+
+            print(f"\nVariant {variant} ({model})")
+            print(json.dumps(summary, indent=2))
+            print(f"Saved: {out_path}")
+
+    if cache_enabled():
+        print("\nJudge cache:", json.dumps(get_cache().stats()))
 
 if __name__ == "__main__":
     main()
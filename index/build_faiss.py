@@ -1,31 +1,400 @@
+import argparse
+import json
+import math
+import os
+import time
 from pathlib import Path
 import numpy as np
 import faiss
 
+from index.chunk_ids import vec_id
+
 ROOT = Path(__file__).resolve().parents[1]
 EMB_NPY = ROOT / "data" / "processed" / "embeddings.npy"
+META_JSONL = ROOT / "data" / "processed" / "chunk_meta.jsonl"
 INDEX_FILE = ROOT / "data" / "processed" / "faiss.index"
+# index type + search-time knobs (nprobe / efSearch) + build report, read by the retriever
+PARAMS_FILE = ROOT / "data" / "processed" / "faiss_params.json"
+# --compare output: memory / latency / recall of each index type vs flat float32
+COMPARE_FILE = ROOT / "data" / "processed" / "faiss_compare.json"
+
+INDEX_TYPES = ["flat", "hnsw", "ivf", "ivfpq", "sq8", "pq"]
+COMPARE_TYPES = ["flat", "sq8", "pq", "ivfpq"]
+
+DEFAULT_CONFIG = {
+    "type": "flat",
+    "nlist": 0,        # IVF cells, 0 = ~4*sqrt(n)
+    "hnsw_m": 32,      # HNSW graph degree
+    "pq_m": 48,        # PQ sub-quantizers (must divide the dimension)
+    "nprobe": 16,      # IVF cells visited per query
+    "ef_search": 64,   # HNSW candidate list size per query
+    "train_size": 50_000,
+    "rerank": 0,       # >0: fetch k*rerank candidates and rescore with exact vectors from embeddings.npy
+}
+
+HOLDOUT_FRACTION = 0.1  # at most this share of rows is held out of training as report queries
+MIN_PQ_BITS = 4         # PQ needs 2**bits training vectors per sub-quantizer; fewer than 16 can't train
+POINTS_PER_CELL = 39    # FAISS k-means wants ~39 training vectors per IVF centroid
+
+def load_vec_ids():
+    # FAISS ids in the same order as embeddings.npy rows
+    ids = []
+    for line in META_JSONL.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            m = json.loads(line)
+            ids.append(m.get("vec_id", vec_id(m["chunk_id"])))
+    return np.array(ids, dtype=np.int64)
+
+def load_config():
+    """Config of the last build (defaults if there is none)."""
+    config = dict(DEFAULT_CONFIG)
+    if PARAMS_FILE.exists():
+        saved = json.loads(PARAMS_FILE.read_text(encoding="utf-8"))
+        config.update({k: v for k, v in saved.items() if k in DEFAULT_CONFIG})
+    return config
+
+def search_params(config) -> str:
+    """faiss.ParameterSpace string for the index type, e.g. "nprobe=16"."""
+    if config["type"] in ("ivf", "ivfpq"):
+        return f"nprobe={config['nprobe']}"
+    if config["type"] == "hnsw":
+        return f"efSearch={config['ef_search']}"
+    return ""
+
+def apply_search_params(index, config):
+    params = search_params(config)
+    if params:
+        faiss.ParameterSpace().set_index_parameters(index, params)
+
+def write_index(index, path: Path = None):
+    # write next to the target then rename, so readers never see a partial file
+    path = path or INDEX_FILE
+    tmp = path.with_name(path.name + ".tmp")
+    faiss.write_index(index, str(tmp))
+    os.replace(tmp, path)
+
+def write_params(config, report=None):
+    payload = dict(config)
+    payload["search_params"] = search_params(config)
+    if report is not None:
+        payload["report"] = report
+    tmp = PARAMS_FILE.with_name(PARAMS_FILE.name + ".tmp")
+    tmp.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    os.replace(tmp, PARAMS_FILE)
+
+def _pq_bits(kind: str, d: int, n_train: int, config) -> int:
+    # 8-bit codes when there is enough training data, fewer on small corpora (2**bits <= n_train)
+    if d % config["pq_m"]:
+        raise ValueError(f"{kind}: --pq-m {config['pq_m']} must divide the embedding dimension {d}")
+    bits = min(8, int(math.log2(max(1, n_train))))
+    if bits < MIN_PQ_BITS:
+        raise ValueError(f"{kind} needs at least {2 ** MIN_PQ_BITS} training vectors, got {n_train}; "
+                         "use --type flat or sq8")
+    return bits
+
+def _empty_index(d: int, n: int, config, n_train: int = None):
+    kind = config["type"]
+    n_train = n if n_train is None else n_train
+
+    if kind == "flat":
+        # exact search, wrapped so ids are chunk ids instead of row positions
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(d))
 
-def main():
-    vectors = np.load(EMB_NPY)
-    if vectors.dtype != np.float32:
-        vectors = vectors.astype(np.float32)
+    if kind == "hnsw":
+        # graph index has no native ids (and no removal) -> id map on top
+        return faiss.IndexIDMap2(faiss.IndexHNSWFlat(d, config["hnsw_m"], faiss.METRIC_INNER_PRODUCT))
 
+    # quantized codes, still a full scan: SQ8 = 1 byte/dim (4x smaller), PQ = pq_m bytes/vector
+    # ("np": skip polysemous training -- minutes of annealing for codes plain search never uses)
+    if kind == "sq8":
+        return faiss.IndexIDMap2(faiss.index_factory(d, "SQ8", faiss.METRIC_INNER_PRODUCT))
+    if kind == "pq":
+        bits = _pq_bits(kind, d, n_train, config)
+        return faiss.IndexIDMap2(faiss.index_factory(d, f"PQ{config['pq_m']}x{bits}np", faiss.METRIC_INNER_PRODUCT))
+
+    if kind in ("ivf", "ivfpq"):
+        # auto nlist: ~4*sqrt(n), but no more cells than the training sample can fill
+        nlist = config["nlist"] or max(1, min(int(4 * math.sqrt(n)), n_train // POINTS_PER_CELL))
+        nlist = max(1, min(nlist, n_train))
+    if kind == "ivf":
+        return faiss.index_factory(d, f"IVF{nlist},Flat", faiss.METRIC_INNER_PRODUCT)
+    if kind == "ivfpq":
+        bits = _pq_bits(kind, d, n_train, config)
+        return faiss.index_factory(d, f"IVF{nlist},PQ{config['pq_m']}x{bits}np", faiss.METRIC_INNER_PRODUCT)
+
+    raise ValueError(f"Unknown index type: {kind} (choose from {INDEX_TYPES})")
+
+def build_index(vectors, ids, config=None, train_rows=None):
+    """
+    Cosine index keyed on stable chunk ids.
+    - config: see DEFAULT_CONFIG (default: exact flat index)
+    - train_rows: rows to train IVF/PQ on (default: random sample of train_size)
+    Raises ValueError when the corpus is too small to train the requested type.
+    """
+    config = config or dict(DEFAULT_CONFIG)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
     n, d = vectors.shape
-    print("Vectors shape:", vectors.shape)
 
     # cosine(a,b) == dot(norm(a), norm(b))
     faiss.normalize_L2(vectors)
 
-    # simplest index
-    index = faiss.IndexFlatIP(d)
+    if train_rows is None:
+        rng = np.random.default_rng(0)
+        train_rows = rng.choice(n, size=min(n, config["train_size"]), replace=False)
+
+    index = _empty_index(d, n, config, n_train=len(train_rows))
+
+    if not index.is_trained:
+        index.train(vectors[np.sort(train_rows)])
 
     # add vectors into index
-    index.add(vectors)
+    index.add_with_ids(vectors, ids)
+    apply_search_params(index, config)
+    return index
+
+def rerank_exact(queries, cand_rows, vectors, k: int):
+    """
+    Rescore candidates with exact vectors (e.g. embeddings.npy opened with mmap_mode="r").
+    - queries: normalized float32 (Q, D)
+    - cand_rows: (Q, K) embeddings rows of the candidates, -1 = no candidate
+    Returns (scores, rows) of the top k per query, rows padded with -1.
+    """
+    scores = np.zeros((len(queries), k), dtype=np.float32)
+    out = np.full((len(queries), k), -1, dtype=np.int64)
+    for qi in range(len(queries)):
+        rows = cand_rows[qi][cand_rows[qi] >= 0]
+        if not len(rows):
+            continue
+        # only the candidate rows are read from disk (float16 storage is upcast here)
+        v = np.asarray(vectors[rows], dtype=np.float32)
+        v /= np.maximum(np.linalg.norm(v, axis=1, keepdims=True), 1e-12)
+        s = v @ queries[qi]
+        top = np.argsort(-s, kind="stable")[:k]
+        scores[qi, :len(top)] = s[top]
+        out[qi, :len(top)] = rows[top]
+    return scores, out
+
+def _latency_ms(search, queries):
+    # one query at a time, like the retriever does per claim
+    times = []
+    for q in queries:
+        t0 = time.perf_counter()
+        search(q.reshape(1, -1))
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    return {
+        "p50": times[len(times) // 2],
+        "p95": times[min(len(times) - 1, int(len(times) * 0.95))],
+    }
+
+def index_bytes(index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+def evaluate(index, vectors, ids, query_rows, k: int = 5, rerank: int = 0, exact_vectors=None):
+    """
+    recall@k vs exact flat search + per-query latency + memory on held-out rows.
+    - rerank / exact_vectors: rescore k*rerank candidates with exact_vectors (default: vectors)
+    """
+    exact_vectors = vectors if exact_vectors is None else exact_vectors
+    # own copy: normalize_L2 works in place (and segfaults on a read-only mmap)
+    vectors = np.array(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    queries = vectors[query_rows]
+
+    flat = faiss.IndexFlatIP(vectors.shape[1])
+    flat.add(vectors)
+    _, exact_rows = flat.search(queries, k)
+
+    row_of = {int(vid): row for row, vid in enumerate(ids)}
+
+    def search(q):
+        # index returns chunk ids -> answer in row space so it compares with flat
+        if not rerank:
+            _, found = index.search(q, k)
+            return np.vectorize(lambda vid: row_of.get(int(vid), -1), otypes=[np.int64])(found)
+        _, cand = index.search(q, k * rerank)
+        cand_rows = np.vectorize(lambda vid: row_of.get(int(vid), -1), otypes=[np.int64])(cand)
+        return rerank_exact(q, cand_rows, exact_vectors, k)[1]
+
+    approx_rows = search(queries)
+    hits = 0
+    for q in range(len(queries)):
+        hits += len(set(exact_rows[q].tolist()).intersection(approx_rows[q].tolist()))
+
+    return {
+        "k": k,
+        "n_queries": len(queries),
+        "rerank": rerank,
+        "recall_at_k": hits / max(1, len(queries) * k),
+        "latency_ms": _latency_ms(search, queries),
+        "flat_latency_ms": _latency_ms(lambda q: flat.search(q, k), queries),
+        "index_bytes": index_bytes(index),
+        "flat_index_bytes": index_bytes(flat),
+    }
+
+def compare(vectors, ids, query_rows, train_rows, base_config, k: int = 5, rerank: int = 4, exact_vectors=None):
+    "Memory / latency / recall of COMPARE_TYPES (with and without rerank) against flat float32"
+    rows = []
+    skipped = []
+    for kind in COMPARE_TYPES:
+        config = dict(base_config, type=kind)
+        try:
+            index = build_index(vectors.copy(), ids, config, train_rows=train_rows)
+        except ValueError as e:
+            # e.g. too few vectors to train PQ -> the rest of the comparison still runs
+            skipped.append({"type": kind, "reason": str(e)})
+            continue
+        for rr in ([0] if kind == "flat" else [0, rerank]):
+            report = evaluate(index, vectors, ids, query_rows, k=k, rerank=rr, exact_vectors=exact_vectors)
+            rows.append({
+                "type": kind,
+                "rerank": rr,
+                "index_bytes": report["index_bytes"],
+                "memory_vs_flat": report["index_bytes"] / report["flat_index_bytes"],
+                "latency_p50_ms": report["latency_ms"]["p50"],
+                "latency_p95_ms": report["latency_ms"]["p95"],
+                "recall_at_k": report["recall_at_k"],
+            })
+
+    n, d = vectors.shape
+    return {
+        "k": k,
+        "n_vectors": n,
+        "dim": d,
+        "embeddings_bytes": {"float32": n * d * 4, "float16": n * d * 2},
+        "indexes": rows,
+        "skipped": skipped,
+    }
+
+def apply_delta(remove_ids, add_ids, add_vectors):
+    """
+    Update the saved index in place:
+    - remove_ids: ids of deleted or changed chunks
+    - add_ids / add_vectors: new or changed chunks (raw, unnormalized); any copy already in the index
+      is removed first, so applying the same delta twice leaves one vector per id
+    Returns False without touching the index when it needs a full rebuild instead (no index yet,
+    or the index type can't remove ids); the caller rebuilds once the new embeddings are saved.
+    """
+    config = load_config()
+
+    if not INDEX_FILE.exists():
+        return False
+
+    index = faiss.read_index(str(INDEX_FILE))
+    if isinstance(index, faiss.IndexFlat):
+        # old positional index: ids can't be removed by chunk -> rebuild once
+        print("Index is not id-mapped -> full rebuild")
+        return False
+
+    add_ids = np.asarray(add_ids, dtype=np.int64)
+    if len(add_ids):
+        if hasattr(index, "id_map"):
+            # id-mapped (flat/hnsw/sq8/pq): only remove ids that are there (hnsw can't remove at all)
+            present = add_ids[np.isin(add_ids, faiss.vector_to_array(index.id_map))]
+        else:
+            # native-id ivf/ivfpq: no id list to check, removing an absent id is a no-op
+            present = add_ids
+        remove_ids = np.concatenate([np.asarray(remove_ids, dtype=np.int64), present])
+
+    if len(remove_ids):
+        try:
+            removed = index.remove_ids(np.asarray(remove_ids, dtype=np.int64))
+        except RuntimeError:
+            # e.g. HNSW graphs don't support removal
+            print(f"{config['type']} index can't remove ids -> full rebuild")
+            return False
+        print("Removed vectors:", removed)
+
+    if len(add_ids):
+        vectors = np.ascontiguousarray(add_vectors, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        index.add_with_ids(vectors, add_ids)
+        print("Added vectors:", len(add_ids))
+
     print("Index size:", index.ntotal)
+    write_index(index)
+    return True
+
+def main(argv=None):
+    # defaults come from the last build, so a plain rerun rebuilds the same index type
+    config = load_config()
+
+    parser = argparse.ArgumentParser(description="Build the FAISS index from embeddings.npy")
+    parser.add_argument("--type", choices=INDEX_TYPES, default=config["type"])
+    parser.add_argument("--nlist", type=int, default=config["nlist"])
+    parser.add_argument("--hnsw-m", type=int, default=config["hnsw_m"])
+    parser.add_argument("--pq-m", type=int, default=config["pq_m"])
+    parser.add_argument("--nprobe", type=int, default=config["nprobe"])
+    parser.add_argument("--ef-search", type=int, default=config["ef_search"])
+    parser.add_argument("--train-size", type=int, default=config["train_size"])
+    parser.add_argument("--rerank", type=int, default=config["rerank"],
+                        help="rescore k*RERANK candidates with exact vectors from embeddings.npy (0 = off)")
+    parser.add_argument("--compare", action="store_true",
+                        help="only report memory/latency/recall of flat vs SQ8/PQ/IVF-PQ (+rerank); index is not written")
+    parser.add_argument("--n-queries", type=int, default=200, help="held-out queries for the recall/latency report")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    config = {
+        "type": args.type,
+        "nlist": args.nlist,
+        "hnsw_m": args.hnsw_m,
+        "pq_m": args.pq_m,
+        "nprobe": args.nprobe,
+        "ef_search": args.ef_search,
+        "train_size": args.train_size,
+        "rerank": args.rerank,
+    }
+
+    # float16 storage is upcast for training / adding; np.array always copies, so float32 data
+    # doesn't stay a read-only mmap (stored is kept for exact re-ranking reads)
+    stored = np.load(EMB_NPY, mmap_mode="r")
+    print("Stored dtype:", stored.dtype)
+    vectors = np.array(stored, dtype=np.float32)
+
+    n, d = vectors.shape
+    print("Vectors shape:", vectors.shape)
+
+    ids = load_vec_ids()
+    if len(ids) != n:
+        raise ValueError(f"chunk_meta.jsonl has {len(ids)} rows but embeddings.npy has {n}")
+
+    # held-out query rows are kept out of the training sample (a small share, so small corpora can still train)
+    rng = np.random.default_rng(0)
+    perm = rng.permutation(n)
+    query_rows = np.sort(perm[:max(1, min(args.n_queries, int(n * HOLDOUT_FRACTION)))])
+    train_rows = perm[len(query_rows):][:config["train_size"]]
+
+    if args.compare:
+        result = compare(vectors, ids, query_rows, train_rows, config, k=args.k,
+                         rerank=args.rerank or 4, exact_vectors=stored)
+        print(f"{'type':<8}{'rerank':>7}{'bytes':>12}{'vs flat':>9}{'p50 ms':>9}{'recall':>8}")
+        for r in result["indexes"]:
+            print(f"{r['type']:<8}{r['rerank']:>7}{r['index_bytes']:>12}{r['memory_vs_flat']:>9.2f}"
+                  f"{r['latency_p50_ms']:>9.3f}{r['recall_at_k']:>8.3f}")
+        for r in result["skipped"]:
+            print(f"{r['type']:<8}skipped: {r['reason']}")
+        print("Embeddings bytes:", result["embeddings_bytes"])
+        COMPARE_FILE.write_text(json.dumps(result, indent=2), encoding="utf-8")
+        print("Saved comparison to:", COMPARE_FILE)
+        return
+
+    print("Index type:", config["type"])
+    t0 = time.perf_counter()
+    try:
+        index = build_index(vectors.copy(), ids, config, train_rows=train_rows)
+    except ValueError as e:
+        raise SystemExit(f"Can't build the {config['type']} index: {e}")
+    print(f"Build time: {time.perf_counter() - t0:.2f}s")
+    print("Index size:", index.ntotal)
+
+    report = evaluate(index, vectors, ids, query_rows, k=args.k, rerank=config["rerank"], exact_vectors=stored)
+    print("Report:", json.dumps(report, indent=2))
 
-    faiss.write_index(index, str(INDEX_FILE))
+    write_index(index)
+    write_params(config, report)
     print("Saved FAISS index to:", INDEX_FILE)
+    print("Saved index params to:", PARAMS_FILE)
 
 if __name__ == "__main__":
     main()
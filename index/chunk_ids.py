@@ -0,0 +1,12 @@
+# Stable ids for chunks (FAISS ids + change detection)
+import hashlib
+
+def vec_id(chunk_id: str) -> int:
+    """Stable int64 FAISS id derived from the chunk_id string."""
+    digest = hashlib.blake2b(chunk_id.encode("utf-8"), digest_size=8).digest()
+    # FAISS ids are signed int64 and -1 means "no result" -> keep it positive
+    return int.from_bytes(digest, "little") & 0x7FFF_FFFF_FFFF_FFFF
+
+def text_hash(text: str) -> str:
+    """Content hash used to decide whether a chunk needs re-embedding."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -0,0 +1,153 @@
+# Memory-mapped chunk store: FAISS id -> chunk_id / doc_id / text without loading the corpus
+#
+# File layout (little-endian):
+#   header  : magic, version, n_rows, n_slots, blob_offset
+#   rows    : n_rows fixed-width records (vec_id, chunk_index, offset/length of each string)
+#   slots   : open-addressing hash table vec_id -> row (-1 = empty), n_slots is a power of two
+#   blob    : packed UTF-8 strings
+import json
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+
+from index.chunk_ids import vec_id as make_vec_id
+
+ROOT = Path(__file__).resolve().parents[1]
+STORE_FILE = ROOT / "data" / "processed" / "chunk_store.bin"
+META_JSONL = ROOT / "data" / "processed" / "chunk_meta.jsonl"
+
+MAGIC = b"CHUNKSTR"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ")   # magic, version, reserved, n_rows, n_slots, blob_offset
+ROW = struct.Struct("<qiQIQIQIQI")   # vec_id, chunk_index, (offset, length) x chunk_id/doc_id/title/text
+SLOT = struct.Struct("<q")
+STRING_FIELDS = ("chunk_id", "doc_id", "title", "text")
+
+def _n_slots(n_rows: int) -> int:
+    # load factor <= 0.5 keeps probe chains short
+    n = 1
+    while n < 2 * n_rows:
+        n *= 2
+    return n
+
+def write_chunk_store(records, path: Path = None):
+    """
+    Write records (dicts like chunk_meta.jsonl rows, in embeddings order) to a store file.
+    Streams strings to a temp blob, so only the fixed-width rows are kept in memory.
+    """
+    path = Path(path or STORE_FILE)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    rows = bytearray()
+    ids = []
+    blob_len = 0
+
+    with tempfile.TemporaryFile(dir=path.parent) as blob:
+        for m in records:
+            vid = m.get("vec_id", make_vec_id(m["chunk_id"]))
+            fields = []
+            for name in STRING_FIELDS:
+                data = (m.get(name) or "").encode("utf-8")
+                blob.write(data)
+                fields += [blob_len, len(data)]
+                blob_len += len(data)
+            rows += ROW.pack(vid, int(m.get("chunk_index", -1)), *fields)
+            ids.append(vid)
+
+        n_rows = len(ids)
+        n_slots = _n_slots(n_rows)
+        slots = [-1] * n_slots
+        mask = n_slots - 1
+        for row, vid in enumerate(ids):
+            h = vid & mask
+            while slots[h] != -1:
+                h = (h + 1) & mask
+            slots[h] = row
+
+        blob_offset = HEADER.size + len(rows) + SLOT.size * n_slots
+
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, n_rows, n_slots, blob_offset))
+            f.write(rows)
+            f.write(struct.pack(f"<{n_slots}q", *slots))
+            blob.seek(0)
+            while True:
+                buf = blob.read(1 << 20)
+                if not buf:
+                    break
+                f.write(buf)
+        os.replace(tmp, path)
+
+    return n_rows
+
+class ChunkStore:
+    """
+    Read-only view over a store file.
+    - row(i): record by embeddings/row position
+    - get(vec_id): record by FAISS id, O(1) expected
+    """
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path or STORE_FILE)
+        with self.path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, self.n_rows, self.n_slots, self._blob = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a chunk store (v{VERSION}): {self.path}")
+        self._rows = HEADER.size
+        self._slots = self._rows + ROW.size * self.n_rows
+
+    def __len__(self):
+        return self.n_rows
+
+    def _str(self, offset: int, length: int) -> str:
+        start = self._blob + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def row(self, i: int) -> dict:
+        if not 0 <= i < self.n_rows:
+            raise IndexError(i)
+        vid, chunk_index, *fields = ROW.unpack_from(self._mm, self._rows + ROW.size * i)
+        record = {"vec_id": vid, "chunk_index": chunk_index}
+        for j, name in enumerate(STRING_FIELDS):
+            record[name] = self._str(fields[2 * j], fields[2 * j + 1])
+        return record
+
+    def find(self, vec_id: int) -> int:
+        """Row for a FAISS id, -1 if missing."""
+        mask = self.n_slots - 1
+        h = vec_id & mask
+        while True:
+            (row,) = SLOT.unpack_from(self._mm, self._slots + SLOT.size * h)
+            if row == -1:
+                return -1
+            (vid,) = SLOT.unpack_from(self._mm, self._rows + ROW.size * row)
+            if vid == vec_id:
+                return row
+            h = (h + 1) & mask
+
+    def get(self, vec_id: int):
+        row = self.find(vec_id)
+        return self.row(row) if row >= 0 else None
+
+    def close(self):
+        self._mm.close()
+
+def iter_meta(path: Path = META_JSONL):
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def main():
+    # (re)build the store from chunk_meta.jsonl, e.g. for an index built before the store existed
+    n = write_chunk_store(iter_meta())
+    print("Rows:", n)
+    print("Saved chunk store to:", STORE_FILE)
+
+if __name__ == "__main__":
+    main()
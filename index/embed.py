@@ -1,20 +1,32 @@
+import argparse
 import json
+import os
+import time
 from pathlib import Path
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from index import build_faiss
+from index.chunk_ids import text_hash, vec_id
+from index.chunk_store import STORE_FILE, write_chunk_store
+from index.encoder import BACKENDS, ENCODER_BACKEND, load_encoder
 
 ROOT = Path(__file__).resolve().parents[1]
 CHUNKS_FILE = ROOT / "data" / "processed" / "chunks.jsonl"
 EMB_NPY = ROOT / "data" / "processed" / "embeddings.npy"
 META_JSONL = ROOT / "data" / "processed" / "chunk_meta.jsonl"
 
-def main():
-    # small, fast embedding model -> sentence-transformers
-    model_name = "sentence-transformers/all-MiniLM-L6-v2"
-    model = SentenceTransformer(model_name)
+# small, fast embedding model -> sentence-transformers
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# bulk mode: MiniLM on CPU saturates around 64-128 sequences per batch
+BULK_BATCH_SIZE = 128
+BULK_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# on-disk dtype of embeddings.npy; float16 halves the file (build_faiss / re-ranking upcast on read)
+STORAGE_DTYPES = ["float32", "float16"]
 
-    # read all chunks into a list
-    chunk_texts = []
+def read_chunks():
+    # read all chunks into a list of meta dicts (text included)
     chunk_meta = []
 
     for line in CHUNKS_FILE.read_text(encoding="utf-8").splitlines():
@@ -22,36 +34,188 @@ def main():
             continue
         obj = json.loads(line)
 
-        # chunk text is embeded
-        chunk_texts.append(obj["text"])
-
         chunk_meta.append({
             "chunk_id": obj["chunk_id"],
             "doc_id": obj["doc_id"],
             "title": obj.get("title", ""),
             "chunk_index": obj.get("chunk_index", -1),
+            "vec_id": vec_id(obj["chunk_id"]),
+            "text_hash": text_hash(obj["text"]),
             "text": obj["text"],
         })
+    return chunk_meta
+
+def read_meta():
+    metas = []
+    for line in META_JSONL.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            metas.append(json.loads(line))
+    return metas
+
+def save_outputs(vectors, chunk_meta, dtype: str = "float32"):
+    # save embeddings + metadata (tmp + rename so a crash never leaves a half-written pair)
+    # vectors=None: embeddings.npy was already written in place (bulk mode)
+    EMB_NPY.parent.mkdir(parents=True, exist_ok=True)
 
-    print("chunks number", len(chunk_texts))
-    print("Embedding model:", model_name)
+    if vectors is not None:
+        tmp_npy = EMB_NPY.with_name("embeddings.tmp.npy")
+        np.save(tmp_npy, np.asarray(vectors, dtype=dtype))
+        os.replace(tmp_npy, EMB_NPY)
+
+    tmp_meta = META_JSONL.with_name(META_JSONL.name + ".tmp")
+    with tmp_meta.open("w", encoding="utf-8") as f:
+        for m in chunk_meta:
+            f.write(json.dumps(m, ensure_ascii=False) + "\n")
+    os.replace(tmp_meta, META_JSONL)
+
+    # compact mmap store the retriever reads instead of chunk_meta.jsonl
+    write_chunk_store(chunk_meta, STORE_FILE)
+
+def embed_all(model, chunk_meta):
+    chunk_texts = [m["text"] for m in chunk_meta]
 
     # encode -> numpy array (N, D)
     vectors = model.encode(chunk_texts, show_progress_bar=True)
+    return np.array(vectors, dtype=np.float32)
+
+def embed_bulk(model, chunk_meta, workers: int = BULK_WORKERS, batch_size: int = BULK_BATCH_SIZE,
+               dtype: str = "float32"):
+    """
+    Throughput mode for full re-indexing:
+    - chunks sorted by length so each batch pads to similar lengths
+    - encoding spread over `workers` CPU processes
+    - vectors written straight into a preallocated memory-mapped embeddings.npy
+    Returns the memmap (already on disk at EMB_NPY).
+    """
+    texts = [m["text"] for m in chunk_meta]
+    n = len(texts)
+    d = model.get_sentence_embedding_dimension()
 
-    vectors = np.array(vectors, dtype=np.float32)
+    order = np.argsort([len(t) for t in texts], kind="stable")
+    # blocks of whole batches per worker; results go back to their original rows
+    block = batch_size * workers * 8
 
-    # save embeddings
     EMB_NPY.parent.mkdir(parents=True, exist_ok=True)
-    np.save(EMB_NPY, vectors)
+    tmp_npy = EMB_NPY.with_name("embeddings.tmp.npy")
+    out = np.lib.format.open_memmap(tmp_npy, mode="w+", dtype=dtype, shape=(n, d))
 
-    with META_JSONL.open("w", encoding="utf-8") as f:
-        for m in chunk_meta:
-            f.write(json.dumps(m, ensure_ascii=False) + "\n")
+    # the multi-process pool is a SentenceTransformer feature; ONNX Runtime threads internally instead
+    multi = workers > 1 and hasattr(model, "start_multi_process_pool")
+    pool = model.start_multi_process_pool(["cpu"] * workers) if multi else None
+    t0 = time.perf_counter()
+    try:
+        for start in range(0, n, block):
+            rows = order[start:start + block]
+            batch_texts = [texts[i] for i in rows]
+            if pool is not None:
+                vecs = model.encode_multi_process(batch_texts, pool, batch_size=batch_size)
+            else:
+                vecs = model.encode(batch_texts, batch_size=batch_size)
+            out[rows] = np.asarray(vecs, dtype=dtype)
+
+            done = min(n, start + block)
+            print(f"Embedded {done}/{n} chunks ({done / (time.perf_counter() - t0):.1f} chunks/sec)")
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+
+    elapsed = time.perf_counter() - t0
+    print(f"Bulk embedding: {n} chunks in {elapsed:.1f}s -> {n / max(elapsed, 1e-9):.1f} chunks/sec "
+          f"(workers={workers}, batch_size={batch_size})")
+
+    out.flush()
+    del out
+    os.replace(tmp_npy, EMB_NPY)
+    return np.load(EMB_NPY, mmap_mode="r")
+
+def embed_incremental(model, chunk_meta):
+    """
+    Reuse stored vectors for chunks whose text hash is unchanged.
+    Returns (vectors, remove_ids, add_ids, add_rows) for updating the index.
+    """
+    old_vectors = np.load(EMB_NPY, mmap_mode="r")
+    old_meta = read_meta()
+    old_rows = {m["chunk_id"]: (m.get("text_hash"), row) for row, m in enumerate(old_meta)}
+
+    vectors = np.empty((len(chunk_meta), old_vectors.shape[1]), dtype=np.float32)
+    reuse_new, reuse_old = [], []
+    changed_rows = []
+
+    for row, m in enumerate(chunk_meta):
+        prev = old_rows.get(m["chunk_id"])
+        if prev is not None and prev[0] == m["text_hash"]:
+            reuse_new.append(row)
+            reuse_old.append(prev[1])
+        else:
+            changed_rows.append(row)
+
+    if reuse_new:
+        vectors[reuse_new] = old_vectors[reuse_old]
+
+    if changed_rows:
+        texts = [chunk_meta[row]["text"] for row in changed_rows]
+        vectors[changed_rows] = np.array(model.encode(texts, show_progress_bar=True), dtype=np.float32)
+
+    # deleted chunks + changed chunks leave the index; changed + new chunks come back in
+    new_ids = {m["chunk_id"] for m in chunk_meta}
+    deleted = [m for m in old_meta if m["chunk_id"] not in new_ids]
+    remove_ids = [m.get("vec_id", vec_id(m["chunk_id"])) for m in deleted]
+    remove_ids += [chunk_meta[row]["vec_id"] for row in changed_rows if chunk_meta[row]["chunk_id"] in old_rows]
+    add_ids = [chunk_meta[row]["vec_id"] for row in changed_rows]
+
+    print("Reused vectors:", len(reuse_new))
+    print("Embedded (new/changed):", len(changed_rows))
+    print("Deleted chunks:", len(deleted))
+    return vectors, remove_ids, add_ids, changed_rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed chunks.jsonl")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only embed new/changed chunks and update faiss.index in place")
+    parser.add_argument("--bulk", action="store_true",
+                        help="full re-embed tuned for throughput (length-sorted, multi-process, mmap output)")
+    parser.add_argument("--workers", type=int, default=BULK_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument("--backend", choices=BACKENDS, default=ENCODER_BACKEND,
+                        help="encoder backend (onnx backends need: python -m index.encoder export)")
+    parser.add_argument("--dtype", choices=STORAGE_DTYPES, default=None,
+                        help="storage dtype of embeddings.npy (float16 = half the size; "
+                             "default float32, --incremental keeps the existing one)")
+    args = parser.parse_args()
+
+    model = load_encoder(args.backend, MODEL_NAME)
+
+    chunk_meta = read_chunks()
+    print("chunks number", len(chunk_meta))
+    print("Embedding model:", MODEL_NAME, f"({args.backend})")
+
+    dtype = args.dtype or "float32"
+    if args.bulk:
+        vectors = embed_bulk(model, chunk_meta, workers=args.workers, batch_size=args.batch_size, dtype=dtype)
+        save_outputs(None, chunk_meta)
+    elif args.incremental and EMB_NPY.exists() and META_JSONL.exists():
+        dtype = args.dtype or np.load(EMB_NPY, mmap_mode="r").dtype.name
+        vectors, remove_ids, add_ids, add_rows = embed_incremental(model, chunk_meta)
+        # index first: until embeddings/meta are replaced the next run recomputes the same delta,
+        # so a crash in between only means the delta is applied again
+        if build_faiss.apply_delta(remove_ids, add_ids, vectors[add_rows]):
+            save_outputs(vectors, chunk_meta, dtype)
+        else:
+            # the rebuild reads the saved embeddings; without an index the next run rebuilds too
+            build_faiss.INDEX_FILE.unlink(missing_ok=True)
+            save_outputs(vectors, chunk_meta, dtype)
+            build_faiss.main([])
+    else:
+        vectors = embed_all(model, chunk_meta)
+        save_outputs(vectors, chunk_meta, dtype)
+        if args.incremental:
+            print("No previous embeddings found -> full build")
+            build_faiss.main([])
 
     print("Saved embeddings to:", EMB_NPY)
     print("Saved metadata to:", META_JSONL)
-    print("Embeddings shape:", vectors.shape)
+    print("Saved chunk store to:", STORE_FILE)
+    print("Embeddings shape:", vectors.shape, dtype)
 
 if __name__ == "__main__":
     main()
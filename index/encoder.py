@@ -0,0 +1,205 @@
+# Sentence encoder backends: PyTorch SentenceTransformer (default) or an ONNX Runtime export
+#
+# ONNX export (once):   python -m index.encoder export [--int8]
+# Tolerance check:      python -m index.encoder check --backend onnx-int8
+# Pick the backend with ENCODER_BACKEND=torch|onnx|onnx-int8 (retriever, embed, stream build).
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+ONNX_DIR = ROOT / "data" / "models" / "minilm-onnx"
+EMB_NPY = ROOT / "data" / "processed" / "embeddings.npy"
+META_JSONL = ROOT / "data" / "processed" / "chunk_meta.jsonl"
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+ENCODER_BACKEND = os.environ.get("ENCODER_BACKEND", "torch")
+# 0 = let ONNX Runtime decide
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", "0"))
+
+# min cosine vs the torch vectors in embeddings.npy
+TOLERANCE = {"torch": 0.9999, "onnx": 0.9999, "onnx-int8": 0.98}
+
+class OnnxEncoder:
+    """
+    all-MiniLM-L6-v2 via ONNX Runtime: tokenizer -> transformer -> mean pooling -> L2 norm
+    (the same pipeline SentenceTransformer runs). Only needs onnxruntime + tokenizers, no torch.
+    """
+
+    def __init__(self, model_dir: Path = ONNX_DIR, int8: bool = False):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        config = json.loads((model_dir / "encoder_config.json").read_text(encoding="utf-8"))
+        model_file = model_dir / ("model.int8.onnx" if int8 else "model.onnx")
+        if not model_file.exists():
+            raise FileNotFoundError(f"{model_file} not found (run: python -m index.encoder export{' --int8' if int8 else ''})")
+
+        self.dim = config["dim"]
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=config["pad_id"], pad_token=config["pad_token"])
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            opts.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(str(model_file), opts, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts, batch_size: int = 64, show_progress_bar: bool = False):
+        # same call shape as SentenceTransformer.encode -> float32 (N, D), already normalized
+        texts = list(texts)
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            encs = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            feeds = {
+                "input_ids": np.array([e.ids for e in encs], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encs], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encs], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+
+            mask = feeds["attention_mask"][:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            out[start:start + len(encs)] = pooled
+        return out
+
+def load_encoder(backend: str = None, model_name: str = MODEL_NAME):
+    """SentenceTransformer or OnnxEncoder; both expose encode() and get_sentence_embedding_dimension()."""
+    backend = backend or ENCODER_BACKEND
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEncoder(ONNX_DIR, int8=backend == "onnx-int8")
+    raise ValueError(f"Unknown encoder backend: {backend} (choose from {BACKENDS})")
+
+def export_onnx(model_name: str = MODEL_NAME, out_dir: Path = ONNX_DIR, int8: bool = False):
+    "Export the transformer of a SentenceTransformer to ONNX (+ optional dynamic int8 quantization)"
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0]
+    hf_model = transformer.auto_model.eval()
+    hf_tokenizer = transformer.tokenizer
+
+    class _LastHidden(torch.nn.Module):
+        # pooling + normalization stay in numpy, so the graph is just the transformer
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids).last_hidden_state
+
+    dummy = hf_tokenizer(["export"], return_tensors="pt")
+    dynamic = {"batch": 0, "seq": 1}
+    with torch.inference_mode():
+        torch.onnx.export(
+            _LastHidden(hf_model),
+            (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+            str(out_dir / "model.onnx"),
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": dynamic,
+                "attention_mask": dynamic,
+                "token_type_ids": dynamic,
+                "last_hidden_state": dynamic,
+            },
+            opset_version=14,
+        )
+
+    hf_tokenizer.save_pretrained(str(out_dir))  # writes tokenizer.json (fast tokenizer)
+    config = {
+        "model_name": model_name,
+        "dim": st.get_sentence_embedding_dimension(),
+        "max_seq_length": st.max_seq_length,
+        "pad_id": hf_tokenizer.pad_token_id,
+        "pad_token": hf_tokenizer.pad_token,
+    }
+    (out_dir / "encoder_config.json").write_text(json.dumps(config, indent=2), encoding="utf-8")
+    print("Saved ONNX model to:", out_dir / "model.onnx")
+
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(out_dir / "model.onnx"), str(out_dir / "model.int8.onnx"), weight_type=QuantType.QInt8)
+        print("Saved int8 model to:", out_dir / "model.int8.onnx")
+
+def check_tolerance(backend: str, n: int = 512, k: int = 5):
+    """
+    Compare a backend against the vectors already in embeddings.npy (torch-encoded):
+    - per-chunk cosine on a sample of n chunks
+    - top-k overlap when the sampled chunk texts are used as queries against the stored vectors
+    """
+    import faiss
+
+    stored = np.asarray(np.load(EMB_NPY, mmap_mode="r"), dtype=np.float32)
+    faiss.normalize_L2(stored)
+    metas = [json.loads(line) for line in META_JSONL.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+    rows = np.sort(np.random.default_rng(0).choice(len(metas), size=min(n, len(metas)), replace=False))
+    vecs = load_encoder(backend).encode([metas[r]["text"] for r in rows], batch_size=64)
+    vecs = np.asarray(vecs, dtype=np.float32)
+    faiss.normalize_L2(vecs)
+
+    cos = (vecs * stored[rows]).sum(axis=1)
+    tolerance = TOLERANCE[backend]
+
+    flat = faiss.IndexFlatIP(stored.shape[1])
+    flat.add(stored)
+    _, ref = flat.search(stored[rows], k)
+    _, got = flat.search(vecs, k)
+    overlap = np.mean([len(set(a).intersection(b)) / k for a, b in zip(ref.tolist(), got.tolist())])
+
+    return {
+        "backend": backend,
+        "n": len(rows),
+        "cosine_min": float(cos.min()),
+        "cosine_mean": float(cos.mean()),
+        "topk_overlap": float(overlap),
+        "tolerance": tolerance,
+        "ok": bool(cos.min() >= tolerance),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Query encoder backends (ONNX export / tolerance check)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("export", help="export all-MiniLM-L6-v2 to ONNX under data/models/")
+    p.add_argument("--int8", action="store_true", help="also write a dynamically int8-quantized model")
+
+    p = sub.add_parser("check", help="compare a backend's embeddings with embeddings.npy")
+    p.add_argument("--backend", choices=BACKENDS, default="onnx")
+    p.add_argument("--n", type=int, default=512)
+    args = parser.parse_args()
+
+    if args.cmd == "export":
+        t0 = time.perf_counter()
+        export_onnx(int8=args.int8)
+        print(f"Export time: {time.perf_counter() - t0:.1f}s")
+    else:
+        result = check_tolerance(args.backend, n=args.n)
+        print(json.dumps(result, indent=2))
+        if not result["ok"]:
+            raise SystemExit(f"{args.backend} embeddings are outside tolerance ({result['cosine_min']:.5f} < {result['tolerance']})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# Streaming build: raw HTML -> extract -> chunk -> embed -> FAISS, in fixed-size batches
+#
+# Nothing is materialized per stage (no separate docs.jsonl / chunks.jsonl pass); memory is one batch.
+# Every batch is committed to append-only files in WORK_DIR and a checkpoint, so a crashed build
+# resumes from the last committed batch instead of re-embedding. The publish step leaves the same
+# artifacts as extract -> chunk -> embed -> build_faiss (docs.jsonl and chunks.jsonl included), so a
+# later `index.embed --incremental` diffs against this build.
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from index import build_faiss
+from index.chunk_ids import text_hash, vec_id
+from index.chunk_store import STORE_FILE, iter_meta, write_chunk_store
+from index.embed import CHUNKS_FILE, EMB_NPY, META_JSONL, MODEL_NAME, STORAGE_DTYPES
+from index.encoder import BACKENDS, ENCODER_BACKEND, load_encoder
+from ingest.chunk import split_into_chunks
+from ingest.extract import OUT_FILE as DOCS_FILE, RAW_DIR, extract_file
+
+ROOT = Path(__file__).resolve().parents[1]
+WORK_DIR = ROOT / "data" / "processed" / "stream_build"
+
+BATCH_SIZE = 256
+LOAD_BLOCK = 65_536  # rows per block when copying committed vectors to .npy
+
+def iter_chunks(html_files, docs_out=None):
+    # one document at a time -> chunk meta dicts (same fields as index/embed.py writes);
+    # docs_out: optional binary file that gets each doc record (docs.jsonl line)
+    for path in html_files:
+        _, doc = extract_file(path)
+        if docs_out is not None:
+            docs_out.write((json.dumps(doc, ensure_ascii=False) + "\n").encode("utf-8"))
+        for i, chunk_text in enumerate(split_into_chunks(doc["text"], max_chars=1200, overlap_chars=200)):
+            chunk_id = f"{doc['doc_id']}::chunk_{i}"  # stable id
+            yield {
+                "chunk_id": chunk_id,
+                "doc_id": doc["doc_id"],
+                "title": doc["title"],
+                "chunk_index": i,
+                "vec_id": vec_id(chunk_id),
+                "text_hash": text_hash(chunk_text),
+                "text": chunk_text,
+            }
+
+def batched(items, n: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def sources_fingerprint(html_files) -> str:
+    # a resume is only valid if the input files are the ones the checkpoint was made from
+    h = hashlib.sha256()
+    for path in html_files:
+        st = path.stat()
+        h.update(f"{path.name}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+class BuildState:
+    "Append-only vectors + meta in WORK_DIR, plus a checkpoint of what has been committed"
+
+    def __init__(self, work_dir: Path):
+        self.work_dir = Path(work_dir)
+        self.vec_file = self.work_dir / "vectors.f32"
+        self.meta_file = self.work_dir / "chunk_meta.jsonl"
+        self.ckpt_file = self.work_dir / "checkpoint.json"
+        self.docs_file = self.work_dir / "docs.jsonl"  # rewritten every run (all docs are re-extracted)
+
+    def load(self):
+        if not self.ckpt_file.exists():
+            return None
+        return json.loads(self.ckpt_file.read_text(encoding="utf-8"))
+
+    def reset(self, fingerprint: str, backend: str = ENCODER_BACKEND, dtype: str = "float32"):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        self.work_dir.mkdir(parents=True)
+        self.vec_file.touch()
+        self.meta_file.touch()
+        ckpt = {"fingerprint": fingerprint, "model": MODEL_NAME, "backend": backend, "dtype": dtype,
+                "dim": None, "chunks": 0, "vec_bytes": 0, "meta_bytes": 0}
+        self.save(ckpt)
+        return ckpt
+
+    def truncate(self, ckpt):
+        # drop anything written after the last checkpoint (a batch that crashed mid-commit)
+        with self.vec_file.open("r+b") as f:
+            f.truncate(ckpt["vec_bytes"])
+        with self.meta_file.open("r+b") as f:
+            f.truncate(ckpt["meta_bytes"])
+
+    def commit(self, ckpt, vectors, metas):
+        with self.vec_file.open("ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with self.meta_file.open("ab") as f:
+            for m in metas:
+                f.write((json.dumps(m, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+        ckpt = dict(ckpt)
+        ckpt["dim"] = int(vectors.shape[1])
+        ckpt["chunks"] += len(metas)
+        ckpt["vec_bytes"] = self.vec_file.stat().st_size
+        ckpt["meta_bytes"] = self.meta_file.stat().st_size
+        self.save(ckpt)
+        return ckpt
+
+    def save(self, ckpt):
+        tmp = self.ckpt_file.with_name(self.ckpt_file.name + ".tmp")
+        tmp.write_text(json.dumps(ckpt), encoding="utf-8")
+        os.replace(tmp, self.ckpt_file)
+
+    def vectors(self, ckpt):
+        if not ckpt["chunks"]:
+            return np.empty((0, ckpt["dim"] or 0), dtype=np.float32)
+        return np.memmap(self.vec_file, dtype=np.float32, mode="r", shape=(ckpt["chunks"], ckpt["dim"]))
+
+def _publish_copy(src: Path, dst: Path):
+    tmp = dst.with_name(dst.name + ".tmp")
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+def _write_chunks_jsonl(meta_file: Path, out_file: Path):
+    # chunks.jsonl rows as ingest/chunk.py writes them
+    tmp = out_file.with_name(out_file.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        for m in iter_meta(meta_file):
+            rec = {name: m[name] for name in ("chunk_id", "doc_id", "title", "chunk_index", "text")}
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    os.replace(tmp, out_file)
+
+def finalize(state: BuildState, ckpt):
+    """
+    Publish docs.jsonl, chunks.jsonl, embeddings.npy (in the checkpoint's storage dtype),
+    chunk_meta.jsonl and the chunk store, then build faiss.index + faiss_params.json (with its
+    recall/latency report) through build_faiss.main, like the staged pipeline.
+    """
+    DOCS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    _publish_copy(state.docs_file, DOCS_FILE)
+    _write_chunks_jsonl(state.meta_file, CHUNKS_FILE)
+
+    vectors = state.vectors(ckpt)
+
+    tmp_npy = EMB_NPY.with_name("embeddings.tmp.npy")
+    out = np.lib.format.open_memmap(tmp_npy, mode="w+", dtype=ckpt["dtype"], shape=vectors.shape)
+    for start in range(0, len(vectors), LOAD_BLOCK):
+        out[start:start + LOAD_BLOCK] = vectors[start:start + LOAD_BLOCK]
+    out.flush()
+    del out
+    os.replace(tmp_npy, EMB_NPY)
+
+    _publish_copy(state.meta_file, META_JSONL)
+
+    write_chunk_store(iter_meta(META_JSONL), STORE_FILE)
+
+    # last saved index config; ANN types need training on the full set anyway
+    build_faiss.main([])
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming extract -> chunk -> embed -> index build")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--fresh", action="store_true", help="ignore any checkpoint and start over")
+    parser.add_argument("--backend", choices=BACKENDS, default=ENCODER_BACKEND,
+                        help="encoder backend (onnx backends need: python -m index.encoder export)")
+    parser.add_argument("--dtype", choices=STORAGE_DTYPES, default="float32",
+                        help="storage dtype of embeddings.npy (float16 = half the size)")
+    args = parser.parse_args()
+
+    html_files = sorted(RAW_DIR.glob("*.html"))
+    if not html_files:
+        print("No HTML files found in data/raw/")
+        return
+
+    fingerprint = sources_fingerprint(html_files)
+    state = BuildState(WORK_DIR)
+    ckpt = None if args.fresh else state.load()
+
+    identity = {"fingerprint": fingerprint, "model": MODEL_NAME, "backend": args.backend, "dtype": args.dtype}
+    if ckpt and any(ckpt.get(k) != v for k, v in identity.items()):
+        print("Checkpoint is for different inputs/model/backend/dtype -> starting over")
+        ckpt = None
+    if ckpt is None:
+        ckpt = state.reset(fingerprint, args.backend, args.dtype)
+    else:
+        state.truncate(ckpt)
+        print("Resuming after committed chunks:", ckpt["chunks"])
+
+    model = load_encoder(args.backend, MODEL_NAME)
+
+    with state.docs_file.open("wb") as docs_out:
+        chunks = iter_chunks(html_files, docs_out)
+        # skip what is already committed (re-chunked, not re-embedded)
+        for _ in range(ckpt["chunks"]):
+            next(chunks)
+
+        for batch in batched(chunks, args.batch_size):
+            vectors = np.array(model.encode([m["text"] for m in batch], batch_size=args.batch_size), dtype=np.float32)
+            ckpt = state.commit(ckpt, vectors, batch)
+            print(f"Committed chunks: {ckpt['chunks']}")
+
+    finalize(state, ckpt)
+    shutil.rmtree(state.work_dir, ignore_errors=True)
+
+    print("Saved docs to:", DOCS_FILE)
+    print("Saved chunks to:", CHUNKS_FILE)
+    print("Saved embeddings to:", EMB_NPY)
+    print("Saved metadata to:", META_JSONL)
+    print("Saved chunk store to:", STORE_FILE)
+    print("Saved FAISS index to:", build_faiss.INDEX_FILE)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,16 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from pathlib import Path
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -11,9 +20,15 @@ RAW_DIR = ROOT / "data" / "raw"
 # source list file (id|url per line)
 SOURCES_FILE = ROOT / "ingest" / "sources.txt"
 
-def read_sources():
+# per-page ETag / Last-Modified / content hash from previous runs (later stages use the hashes to skip work)
+MANIFEST_NAME = "manifest.json"
+
+WORKERS = 8
+PER_HOST_INTERVAL = 0.5  # seconds between requests to the same host
+
+def read_sources(path: Path = None):
     "Read sources.txt and return a list of (id, url)"
-    lines = SOURCES_FILE.read_text(encoding="utf-8").splitlines()
+    lines = Path(path or SOURCES_FILE).read_text(encoding="utf-8").splitlines()
     results = []
     for line in lines:
         line = line.strip()
@@ -24,28 +39,144 @@ def read_sources():
         results.append((doc_id.strip(), url.strip()))
     return results
 
-def download_html(doc_id, url):
-    "Download one page and save it as data/raw/<doc_id>.html"
-    RAW_DIR.mkdir(parents=True, exist_ok=True) # Check folder exists
-    out_path = RAW_DIR / f"{doc_id}.html"
+def load_manifest(raw_dir: Path = None):
+    path = Path(raw_dir or RAW_DIR) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def save_manifest(manifest: dict, raw_dir: Path = None):
+    path = Path(raw_dir or RAW_DIR) / MANIFEST_NAME
+    _atomic_write(path, json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+
+def _atomic_write(path: Path, data: bytes):
+    # write a temp file in the same folder, then rename over the target
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+class HostRateLimiter:
+    "Minimum interval between requests to the same host (different hosts don't wait on each other)"
+
+    def __init__(self, interval: float = PER_HOST_INTERVAL):
+        self.interval = interval
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def make_session(workers: int = WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def download_html(doc_id, url, session=None, limiter=None, prev=None, raw_dir: Path = None, force: bool = False):
+    """
+    Download one page to <raw_dir>/<doc_id>.html (conditional on the previous manifest entry).
+    Returns the new manifest entry; entry["status"] is "new", "updated" or "unchanged".
+    """
+    raw_dir = Path(raw_dir or RAW_DIR)
+    raw_dir.mkdir(parents=True, exist_ok=True) # Check folder exists
+    out_path = raw_dir / f"{doc_id}.html"
+    prev = prev or {}
+    session = session or make_session(1)
+
+    # only ask for a 304 if we still have the file it would refer to
+    headers = {}
+    if not force and out_path.exists() and prev.get("url") == url:
+        if prev.get("etag"):
+            headers["If-None-Match"] = prev["etag"]
+        if prev.get("last_modified"):
+            headers["If-Modified-Since"] = prev["last_modified"]
 
-    r = requests.get(url, timeout=30)
+    if limiter is not None:
+        limiter.wait(url)
+    r = session.get(url, headers=headers, timeout=30)
+
+    entry = {
+        "url": url,
+        "path": out_path.name,
+        "etag": r.headers.get("ETag", prev.get("etag")),
+        "last_modified": r.headers.get("Last-Modified", prev.get("last_modified")),
+        "fetched_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+    if r.status_code == 304:
+        entry.update({"sha256": prev.get("sha256"), "bytes": prev.get("bytes"), "status": "unchanged"})
+        return entry
 
     # if server returns error, stop here
     r.raise_for_status()
 
+    data = r.text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    entry.update({"sha256": digest, "bytes": len(data)})
+
+    if digest == prev.get("sha256") and out_path.exists():
+        # server ignored the conditional headers but the page is the same
+        entry["status"] = "unchanged"
+        return entry
+
     # save HTML content
-    out_path.write_text(r.text, encoding="utf-8")
-    return out_path
+    _atomic_write(out_path, data)
+    entry["status"] = "updated" if prev else "new"
+    return entry
+
+def download_all(sources, raw_dir: Path = None, workers: int = WORKERS,
+                 per_host_interval: float = PER_HOST_INTERVAL, force: bool = False):
+    "Fetch all sources concurrently; returns the updated manifest"
+    raw_dir = Path(raw_dir or RAW_DIR)
+    manifest = load_manifest(raw_dir)
+    session = make_session(workers)
+    limiter = HostRateLimiter(per_host_interval)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(download_html, doc_id, url, session, limiter, manifest.get(doc_id), raw_dir, force): doc_id
+            for doc_id, url in sources
+        }
+        for fut in tqdm(as_completed(futures), total=len(futures)):
+            doc_id = futures[fut]
+            try:
+                manifest[doc_id] = fut.result()
+            except requests.RequestException as e:
+                # keep the previous entry (and file); one bad page shouldn't fail the run
+                print(f"Failed: {doc_id}: {e}")
+                if doc_id in manifest:
+                    manifest[doc_id] = dict(manifest[doc_id], status="failed")
+
+    save_manifest(manifest, raw_dir)
+    return manifest
 
 def main():
-    sources = read_sources()
+    parser = argparse.ArgumentParser(description="Download source pages into data/raw/")
+    parser.add_argument("--sources", default=str(SOURCES_FILE))
+    parser.add_argument("--out", default=str(RAW_DIR))
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--per-host-interval", type=float, default=PER_HOST_INTERVAL)
+    parser.add_argument("--force", action="store_true", help="ignore ETag/Last-Modified and refetch everything")
+    args = parser.parse_args()
+
+    sources = read_sources(args.sources)
     print("How many sources?", len(sources))
 
-    for doc_id, url in tqdm(sources):
-        saved = download_html(doc_id, url)
-        print("Saved:", saved)
-        time.sleep(0.5)
+    manifest = download_all(sources, args.out, args.workers, args.per_host_interval, args.force)
+
+    counts = {}
+    for doc_id, _ in sources:
+        status = manifest.get(doc_id, {}).get("status", "failed")
+        counts[status] = counts.get(status, 0) + 1
+    print("Results:", counts)
+    print("Saved manifest:", Path(args.out) / MANIFEST_NAME)
 
 if __name__ == "__main__":
     main()
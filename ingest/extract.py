@@ -1,15 +1,23 @@
+import argparse
+import hashlib
 import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from bs4 import BeautifulSoup
 
+from ingest.download import load_manifest
+
 ROOT = Path(__file__).resolve().parents[1]
 RAW_DIR = ROOT / "data" / "raw"
 OUT_FILE = ROOT / "data" / "processed" / "docs.jsonl"
 
-def html_to_text(html_str: str) -> str:
-    # HTML string to plain text using BeautifulSoup and lxml parser
-    soup = BeautifulSoup(html_str, "lxml")
+def _soup_title(soup) -> str:
+    if soup.title and soup.title.text: # use <title> tag if present
+        return soup.title.text.strip()
+    return "Unknown Title"
 
+def _soup_text(soup) -> str:
     for tag in soup(["script", "style", "noscript", "header", "footer", "nav"]):
         tag.decompose()
 
@@ -24,14 +32,79 @@ def html_to_text(html_str: str) -> str:
     lines = [ln for ln in lines if ln]  # remove empty lines
     return "\n".join(lines)
 
+def parse_html(html_str: str):
+    # one BeautifulSoup/lxml parse -> (title, plain text)
+    soup = BeautifulSoup(html_str, "lxml")
+    title = _soup_title(soup)  # before decompose() touches the tree
+    return title, _soup_text(soup)
+
+def html_to_text(html_str: str) -> str:
+    # HTML string to plain text using BeautifulSoup and lxml parser
+    return _soup_text(BeautifulSoup(html_str, "lxml"))
+
 def extract_title(html_str: str) -> str:
     # Try to pull good title from HTML
-    soup = BeautifulSoup(html_str, "lxml")
-    if soup.title and soup.title.text: # use <title> tag if present
-        return soup.title.text.strip()
-    return "Unknown Title"
+    return _soup_title(BeautifulSoup(html_str, "lxml"))
+
+def extract_file(path: Path, prev_hash: str = None, known_hash: str = None):
+    """
+    Worker: (doc_id, record) for one HTML file.
+    record is None when the file's sha256 equals prev_hash (caller reuses the old record).
+    known_hash: sha256 already recorded by download.py; if it equals prev_hash the file is not even read.
+    """
+    path = Path(path)
+    doc_id = path.stem  # filename without .html
+    if prev_hash is not None and known_hash == prev_hash:
+        return doc_id, None
+    data = path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == prev_hash:
+        return doc_id, None
+
+    title, text = parse_html(data.decode("utf-8"))
+    return doc_id, {
+        "doc_id": doc_id,
+        "title": title,
+        "source": "NIH ODS",
+        "raw_path": str(path),
+        "content_sha256": digest,
+        "text": text,
+    }
+
+def _extract_job(job):
+    return extract_file(*job)
+
+def load_previous(out_file: Path):
+    # doc_id -> (content hash, original JSON line) from the last run
+    prev = {}
+    if not out_file.exists():
+        return prev
+    with out_file.open("r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            obj = json.loads(line)
+            prev[obj["doc_id"]] = (obj.get("content_sha256"), line.rstrip("\n"))
+    return prev
+
+def manifest_hashes(raw_dir: Path):
+    """
+    doc_id -> sha256 from download.py's manifest.json.
+    Only entries whose file still has the recorded size are trusted (a hand-edited file gets hashed).
+    """
+    hashes = {}
+    for doc_id, entry in load_manifest(raw_dir).items():
+        path = Path(raw_dir) / entry.get("path", f"{doc_id}.html")
+        if entry.get("sha256") and path.exists() and path.stat().st_size == entry.get("bytes"):
+            hashes[path.stem] = entry["sha256"]
+    return hashes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract plain text from data/raw/*.html into docs.jsonl")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--force", action="store_true", help="re-extract files even if their hash is unchanged")
+    args = parser.parse_args(argv)
 
-def main():
     OUT_FILE.parent.mkdir(parents=True, exist_ok=True)
 
     html_files = sorted(RAW_DIR.glob("*.html"))
@@ -39,27 +112,26 @@ def main():
         print("No HTML files found in data/raw/")
         return
 
+    prev = {} if args.force else load_previous(OUT_FILE)
+    known = manifest_hashes(RAW_DIR)
+    jobs = [(path, prev.get(path.stem, (None, None))[0], known.get(path.stem)) for path in html_files]
+
     count = 0
-    with OUT_FILE.open("w", encoding="utf-8") as f:
-        for path in html_files:
-            doc_id = path.stem  # filename without .html
-            html = path.read_text(encoding="utf-8")
-
-            title = extract_title(html)
-            text = html_to_text(html)
-
-            record = {
-                "doc_id": doc_id,
-                "title": title,
-                "source": "NIH ODS",
-                "raw_path": str(path),
-                "text": text,
-            }
-
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")  # JSONL format
+    skipped = 0
+    tmp_file = OUT_FILE.with_name(OUT_FILE.name + ".tmp")
+    with tmp_file.open("w", encoding="utf-8") as f, ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # map() yields in input order as results arrive -> streamed, deterministic output
+        chunksize = max(1, len(jobs) // (args.workers * 4))
+        for doc_id, record in pool.map(_extract_job, jobs, chunksize=chunksize):
+            if record is None:
+                f.write(prev[doc_id][1] + "\n")  # unchanged file -> previous record as-is
+                skipped += 1
+            else:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")  # JSONL format
             count += 1
+    os.replace(tmp_file, OUT_FILE)
 
-    print(f"Saved {count} docs to: {OUT_FILE}")
+    print(f"Saved {count} docs to: {OUT_FILE} ({skipped} unchanged)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,310 @@
+# Bulk claim checking: JSONL in -> verdict JSONL out, as overlapping pipeline stages
+#
+#   python -m pipeline.batch --input claims.jsonl --output verdicts.jsonl
+#
+# input lines:  {"id": "...", "claim": "..."}  or  {"id": "...", "image": "label.jpg"}
+# output lines: {"id", "input_mode", "claim", verdict fields..., "flags", "evidence": [{rank, score, chunk_id, doc_id}]}
+#
+# reader -> OCR -> batched retrieval -> concurrent judge -> writer (+ telemetry)
+# Stages are threads joined by bounded queues: while the judge works on one batch the next one is
+# already being embedded, and a slow stage back-pressures the ones before it instead of piling up memory.
+# Rerunning with the same --output skips ids that already have a verdict (errors are retried), keeping one
+# output line per id.
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from agents.judge import JudgeExecutor, OLLAMA_NUM_PARALLEL
+from agents.retriever import get_engine
+from pipeline.checkpoint import read_complete_lines
+from telemetry.db import CLOSE_TIMEOUT, get_sink, log_run
+from telemetry.spans import SpanRecorder
+
+BATCH_SIZE = 32         # claims per encoder pass / FAISS search
+BATCH_WAIT = 0.05       # seconds the retrieval stage waits to fill a batch
+QUEUE_SIZE = 256        # items buffered between stages
+PROGRESS_EVERY = 5.0    # seconds between progress lines
+
+_DONE = object()  # end-of-stream marker passed down the stages
+
+class _Stopped(Exception):
+    pass
+
+def item_id(obj: dict, line_no: int) -> str:
+    # explicit id if given (needed for a resume that survives edits to the input), else the line number
+    return str(obj.get("id", f"line_{line_no}"))
+
+def read_input(path: Path):
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if line.strip():
+                obj = json.loads(line)
+                yield item_id(obj, line_no), obj
+
+def load_done(path: Path):
+    """
+    ids that already have a verdict in the output file.
+    - one line per id is kept, the last one written; error lines are dropped since they are retried
+    - a partial last line (killed mid-write) is cut off so appends start on a clean line
+    """
+    path = Path(path)
+    lines = read_complete_lines(path)
+    latest = {}
+    for line in lines:
+        rec = json.loads(line)
+        latest[rec["id"]] = (line, "error" not in rec)
+    kept = [line for line, ok in latest.values() if ok]
+
+    if len(kept) != len(lines):
+        # rewrite in place of the old file, so a crash here leaves one or the other
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text("".join(line + "\n" for line in kept), encoding="utf-8")
+        os.replace(tmp, path)
+    return {json.loads(line)["id"] for line in kept}
+
+class _Pipeline:
+    "Stage threads + bounded queues; the first stage error stops every stage"
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.stop = threading.Event()
+        self.errors = []
+        self._threads = []
+
+    def queue(self):
+        return queue.Queue(maxsize=self.queue_size)
+
+    def put(self, q, item):
+        # blocking put that gives up when another stage has failed
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self.stop.is_set():
+                    raise _Stopped()
+
+    def get(self, q, timeout: float = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = 0.1 if deadline is None else min(0.1, deadline - time.monotonic())
+            if wait <= 0:
+                raise queue.Empty()
+            try:
+                return q.get(timeout=wait)
+            except queue.Empty:
+                if self.stop.is_set():
+                    raise _Stopped()
+
+    def stage(self, name: str, fn, *args):
+        def run():
+            try:
+                fn(*args)
+            except _Stopped:
+                pass
+            except BaseException as e:
+                self.errors.append((name, e))
+                self.stop.set()
+
+        t = threading.Thread(target=run, name=f"batch-{name}", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def join(self):
+        for t in self._threads:
+            t.join()
+        if self.errors:
+            name, e = self.errors[0]
+            raise RuntimeError(f"batch stage {name!r} failed: {e}") from e
+
+def _read_stage(p: _Pipeline, items, out_q):
+    for item in items:
+        p.put(out_q, item)
+    p.put(out_q, _DONE)
+
+def _ocr_stage(p: _Pipeline, in_q, out_q):
+    # single thread: the OCR model is CPU-heavy and loaded once; text items pass straight through
+    while True:
+        item = p.get(in_q)
+        if item is _DONE:
+            p.put(out_q, _DONE)
+            return
+
+        if item.get("image") and "error" not in item:
+            # only batches that contain images pay for PIL + transformers
+            from agents.vision_extractor import extract_label_text
+
+            try:
+                with item["spans"].span("ocr"):
+                    item["claim"] = extract_label_text(item["image"])
+            except Exception as e:
+                item["error"] = f"ocr: {e}"
+        p.put(out_q, item)
+
+def _retrieve_stage(p: _Pipeline, in_q, out_q, executor: JudgeExecutor, k: int, batch_size: int, variant: str):
+    # micro-batches -> one retrieve_batch per batch, then every claim goes to the judge pool right away
+    engine = get_engine()
+    finished = False
+    while not finished:
+        batch = [p.get(in_q)]
+        deadline = time.monotonic() + BATCH_WAIT
+        while batch[-1] is not _DONE and len(batch) < batch_size:
+            try:
+                batch.append(p.get(in_q, timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        if batch[-1] is _DONE:
+            batch.pop()
+            finished = True
+
+        todo = []
+        for it in batch:
+            if "error" in it:
+                continue
+            if not (it.get("claim") or "").strip():
+                it["error"] = "empty claim"
+                continue
+            todo.append(it)
+
+        if todo:
+            batch_spans = SpanRecorder()
+            evidences, vecs = engine.retrieve_batch([it["claim"] for it in todo], k=k, batch_size=batch_size,
+                                                    spans=batch_spans, return_vectors=True)
+            corpus = engine.corpus_fingerprint()
+            for it, evidence, vec in zip(todo, evidences, vecs):
+                it["spans"].extend(batch_spans, batch=len(todo))
+                it["evidence"] = evidence
+                it["future"] = executor.submit(it["claim"], evidence, variant=variant, spans=it["spans"],
+                                               query_vec=vec, corpus=corpus)
+
+        # in input order; the bounded queue caps how far retrieval runs ahead of the writer
+        for it in batch:
+            p.put(out_q, it)
+    p.put(out_q, _DONE)
+
+def _output_record(item, judge_obj=None, flags=None):
+    rec = {"id": item["id"], "input_mode": item["input_mode"], "claim": item.get("claim", "")}
+    if judge_obj is not None:
+        rec.update(judge_obj)
+        rec["flags"] = flags
+    rec["evidence"] = [
+        {"rank": e["rank"], "score": e["score"], "chunk_id": e["chunk_id"], "doc_id": e["doc_id"]}
+        for e in item.get("evidence", [])
+    ]
+    if "error" in item:
+        rec["error"] = item["error"]
+    return rec
+
+def _write_stage(p: _Pipeline, in_q, out_file: Path, k: int, stats: dict, progress_every: float):
+    t0 = time.perf_counter()
+    last_report = t0
+    with Path(out_file).open("a", encoding="utf-8") as f:
+        while True:
+            item = p.get(in_q)
+            if item is _DONE:
+                break
+
+            judge_obj = flags = None
+            if "future" in item:
+                try:
+                    judge_obj, flags = item["future"].result()
+                except Exception as e:
+                    item["error"] = f"judge: {e}"
+
+            rec = _output_record(item, judge_obj, flags)
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()  # a crash loses at most the line being written
+
+            if judge_obj is not None:
+                log_run(
+                    input_mode=item["input_mode"],
+                    claim=item["claim"],
+                    topk=k,
+                    evidence=item["evidence"],
+                    judge_obj=judge_obj,
+                    flags=flags,
+                    spans=item["spans"].spans,
+                )
+                stats["verdicts"][judge_obj.get("verdict", "Unknown")] += 1
+            else:
+                stats["errors"] += 1
+            stats["done"] += 1
+
+            now = time.perf_counter()
+            if now - last_report >= progress_every:
+                last_report = now
+                rate = stats["done"] / (now - t0)
+                left = stats["pending"] - stats["done"]
+                print(f"[batch] {stats['done']}/{stats['pending']}  {rate:.1f} claims/sec  "
+                      f"eta {left / max(rate, 1e-9):.0f}s  errors={stats['errors']}")
+
+def run_batch(input_file: Path, output_file: Path, k: int = 5, variant: str = "A", batch_size: int = BATCH_SIZE,
+              max_in_flight: int = None, queue_size: int = QUEUE_SIZE, progress_every: float = PROGRESS_EVERY):
+    """
+    Check every claim in input_file, appending verdicts to output_file.
+    Returns a summary dict (counts, seconds, claims/sec).
+    """
+    done = load_done(output_file)
+    pending = [(cid, obj) for cid, obj in read_input(input_file) if cid not in done]
+    print(f"[batch] input={input_file}  already done={len(done)}  pending={len(pending)}")
+
+    def items():
+        for cid, obj in pending:
+            yield {
+                "id": cid,
+                "input_mode": "image" if obj.get("image") else "text",
+                "claim": obj.get("claim", ""),
+                "image": obj.get("image"),
+                "spans": SpanRecorder(),
+            }
+
+    stats = {"pending": len(pending), "done": 0, "errors": 0, "verdicts": Counter()}
+    t0 = time.perf_counter()
+
+    p = _Pipeline(queue_size)
+    q_ocr, q_retrieve, q_write = p.queue(), p.queue(), p.queue()
+    with JudgeExecutor(max_in_flight=max_in_flight) as executor:
+        p.stage("read", _read_stage, p, items(), q_ocr)
+        p.stage("ocr", _ocr_stage, p, q_ocr, q_retrieve)
+        p.stage("retrieve", _retrieve_stage, p, q_retrieve, q_write, executor, k, batch_size, variant)
+        p.stage("write", _write_stage, p, q_write, output_file, k, stats, progress_every)
+        p.join()
+
+    if not get_sink().flush(timeout=CLOSE_TIMEOUT):
+        print("[telemetry] not all runs committed yet; continuing", file=sys.stderr)
+    elapsed = time.perf_counter() - t0
+    return {
+        "checked": stats["done"],
+        "skipped_already_done": len(done),
+        "errors": stats["errors"],
+        "verdicts": dict(stats["verdicts"]),
+        "seconds": elapsed,
+        "claims_per_sec": stats["done"] / max(elapsed, 1e-9),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Check claims from a JSONL file (resumable)")
+    parser.add_argument("--input", required=True, help='JSONL with {"id", "claim"} or {"id", "image"} per line')
+    parser.add_argument("--output", required=True, help="verdict JSONL (appended; rerun to resume)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--variant", choices=["A", "B"], default="A")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="claims per retrieval batch")
+    parser.add_argument("--max-in-flight", type=int, default=OLLAMA_NUM_PARALLEL, help="concurrent judge requests")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="items buffered between stages")
+    parser.add_argument("--progress-every", type=float, default=PROGRESS_EVERY, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    os.makedirs(Path(args.output).resolve().parent, exist_ok=True)
+    summary = run_batch(args.input, args.output, k=args.k, variant=args.variant, batch_size=args.batch_size,
+                        max_in_flight=args.max_in_flight, queue_size=args.queue_size,
+                        progress_every=args.progress_every)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
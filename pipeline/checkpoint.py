@@ -0,0 +1,19 @@
+# Append-only JSONL checkpoints (batch verdicts, eval grid cells): one record per line, flushed as written
+from pathlib import Path
+
+def read_complete_lines(path: Path):
+    """
+    Non-empty lines of a checkpoint file ([] if it does not exist).
+    A partial last line (killed mid-write) is cut off so later appends start on a clean line.
+    """
+    path = Path(path)
+    if not path.exists():
+        return []
+
+    with path.open("r+b") as f:
+        data = f.read()
+        keep = data.rfind(b"\n") + 1
+        if keep != len(data):
+            f.truncate(keep)
+
+    return [line for line in data[:keep].decode("utf-8").splitlines() if line.strip()]
@@ -1,55 +1,88 @@
 # Input -> (optional OCR) -> Retrieval -> Judge => telemetry logging
+#
+#   python -m pipeline.run --claim "Omega-3 lowers triglycerides" [--k 5] [--variant A] [--json]
+#   python -m pipeline.run --image label.jpg
+#   python -m pipeline.run                      (interactive prompts)
+#
+# Heavy dependencies load on demand: the OCR stack only for --image, faiss / the encoder on first retrieval.
+import argparse
 import json
+import sys
 
-from telemetry.db import log_run
-from agents.retriever import retrieve
+from telemetry.db import CLOSE_TIMEOUT, get_sink, log_run
+from telemetry.spans import SpanRecorder
+from agents.retriever import get_engine, retrieve_batch
 from agents.judge import judge
-from agents.vision_extractor import extract_label_text
 
-def main():
+def read_interactive():
+    # the original prompt flow, used when neither --claim nor --image is given
     print("Choose input type:")
     print("1) text (paste claim/label text)")
     print("2) image (OCR label image)")
     mode = input("Enter 1 or 2: ").strip()
 
-    claim = ""
+    if mode == "2":
+        return None, input("Image path: ").strip()
+    return input("Enter supplement label text / ad text: ").strip(), None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check one supplement claim (text or label image)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--claim", help="claim / label text")
+    source.add_argument("--image", help="label image path (OCR)")
+    parser.add_argument("--k", type=int, default=5, help="top-k evidence chunks")
+    parser.add_argument("--variant", choices=["A", "B"], default="A", help="judge prompt variant")
+    parser.add_argument("--json", action="store_true", help="print one JSON object instead of the text report")
+    args = parser.parse_args(argv)
+
+    claim, image_path = args.claim, args.image
+    if claim is None and image_path is None:
+        claim, image_path = read_interactive()
+
     input_mode = "text"
+    spans = SpanRecorder()
 
     # input collection (text or image)
-    if mode == "2":
+    if image_path:
         input_mode = "image"
-        image_path = input("Image path: ").strip()
+        # only image input pays for PIL + transformers
+        from agents.vision_extractor import extract_label_text
 
         # image -> label text (HF OCR)
-        claim = extract_label_text(image_path)
+        with spans.span("ocr"):
+            claim = extract_label_text(image_path)
 
-        print("\n[OCR extracted text]")
-        print(claim)
-
-    else:
-        # normal text input
-        claim = input("Enter supplement label text / ad text: ").strip()
+        if not args.json:
+            print("\n[OCR extracted text]")
+            print(claim)
 
+    claim = (claim or "").strip()
     if not claim:
         print("Empty input. Exit.")
         return
 
     # Retrieval (Agent 1)
-    k = 5 # top-k
-    evidence = retrieve(claim, k=k)
+    k = args.k # top-k
+    evidences, vecs = retrieve_batch([claim], k=k, spans=spans, return_vectors=True)
+    evidence = evidences[0]
 
-    print("\n[Top evidence]")
-    for e in evidence:
-        print(f"- score={e['score']:.4f}  {e['chunk_id']}  ({e['doc_id']})")
+    if not args.json:
+        print("\n[Top evidence]")
+        for e in evidence:
+            print(f"- score={e['score']:.4f}  {e['chunk_id']}  ({e['doc_id']})")
 
     # Evidence Judge + Guardrail (Agent 2)
-    result_obj, flags = judge(claim, evidence)
-    print("\n[Judge output JSON]")
-    print(json.dumps(result_obj, indent=2, ensure_ascii=False))
+    # query vector -> near-duplicate claims with the same evidence reuse a cached verdict
+    result_obj, flags = judge(claim, evidence, variant=args.variant, spans=spans, query_vec=vecs[0],
+                              corpus=get_engine().corpus_fingerprint())
+
+    if not args.json:
+        print("\n[Judge output JSON]")
+        print(json.dumps(result_obj, indent=2, ensure_ascii=False))
+
+        if flags:
+            print("\n[Guardrail flags detected]", flags)
 
-    if flags:
-        print("\n[Guardrail flags detected]", flags)
-    
     log_run(
         input_mode=input_mode,
         claim=claim,
@@ -57,9 +90,23 @@ def main():
         evidence=evidence,
         judge_obj=result_obj,
         flags=flags,
+        spans=spans.spans,
     )
 
-    print("\n[Telemetry] Saved to telemetry/telemetry.db")
+    # background writer; make sure the run is committed before we report it (bounded: telemetry never hangs a run)
+    if not get_sink().flush(timeout=CLOSE_TIMEOUT):
+        print("[telemetry] run not committed yet; continuing", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps({
+            "input_mode": input_mode,
+            "claim": claim,
+            **result_obj,
+            "flags": flags,
+            "evidence": evidence,
+        }, ensure_ascii=False))
+    else:
+        print("\n[Telemetry] Saved to telemetry/telemetry.db")
 
 if __name__ == "__main__":
     main()
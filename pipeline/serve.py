@@ -0,0 +1,342 @@
+# Long-running claim-check service: model, index and OCR stay warm between requests
+#
+#   python -m pipeline.serve --port 8080
+#   curl -s localhost:8080/check/text -d '{"claim": "Omega-3 lowers triglycerides", "k": 5}'
+#   curl -s localhost:8080/check/image --data-binary @label.jpg -H 'Content-Type: image/jpeg'
+#
+# POST /check/text    {"claim", "k"?, "variant"?}
+# POST /check/image   image bytes (?k=&variant= in the query string)
+# GET  /healthz       process is up
+# GET  /readyz        model + index loaded (503 until then)
+#
+# Response: the judge() JSON ({verdict, short_reason, citations, confidence}) + "flags" + "evidence" + "claim".
+# Concurrent requests are collected for up to --batch-wait-ms into one encoder pass + FAISS search.
+import argparse
+import json
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from agents.judge import JudgeExecutor, OLLAMA_NUM_PARALLEL
+from agents.retriever import get_engine
+from telemetry.db import log_run
+from telemetry.spans import SpanRecorder
+
+MAX_BATCH = 32
+BATCH_WAIT_MS = 10       # how long the first request of a batch waits for company
+MAX_PENDING = 64         # requests admitted at once; more get 503 + Retry-After
+REQUEST_TIMEOUT = 120.0  # seconds per request (OCR + retrieval + judge)
+MAX_K = 50               # evidence chunks a request may ask for
+MAX_BODY = 20 * 1024 * 1024
+
+class Overloaded(Exception):
+    pass
+
+class MicroBatcher:
+    """
+    Collects concurrent retrieval requests into one retrieve_batch call.
+    - the first request opens a window of max_wait seconds (or until max_batch requests)
+    - mixed k values are searched at the largest k and trimmed per request
+    - submit() raises Overloaded when max_queue requests are already waiting
+    - futures resolve to (evidence, query_vec)
+    """
+
+    def __init__(self, engine, max_batch: int = MAX_BATCH, max_wait: float = BATCH_WAIT_MS / 1000,
+                 max_queue: int = MAX_PENDING):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._q = queue.Queue(maxsize=max_queue)
+        self.n_batches = 0
+        self.n_requests = 0
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, claim: str, k: int, spans: SpanRecorder) -> Future:
+        fut = Future()
+        try:
+            self._q.put_nowait((claim, k, spans, fut))
+        except queue.Full:
+            raise Overloaded("retrieval queue is full")
+        return fut
+
+    def close(self):
+        self._q.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        first = self._q.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._q.put(None)  # finish this batch, stop on the next collect
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            # requests that timed out (and were cancelled) while queued are dropped here
+            live = [b for b in batch if b[3].set_running_or_notify_cancel()]
+            if not live:
+                continue
+
+            rec = SpanRecorder()
+            try:
+                evidences, vecs = self.engine.retrieve_batch([b[0] for b in live], k=max(b[1] for b in live),
+                                                             batch_size=len(live), spans=rec, return_vectors=True)
+            except Exception as e:
+                for b in live:
+                    b[3].set_exception(e)
+                continue
+
+            self.n_batches += 1
+            self.n_requests += len(live)
+            for (_, k, spans, fut), evidence, vec in zip(live, evidences, vecs):
+                spans.extend(rec, batch=len(live))
+                fut.set_result((evidence[:k], vec))
+
+class ClaimService:
+    "Warm retriever + batcher + judge pool + OCR, shared by all handler threads"
+
+    def __init__(self, max_batch: int = MAX_BATCH, batch_wait_ms: float = BATCH_WAIT_MS,
+                 max_pending: int = MAX_PENDING, max_in_flight: int = None, timeout: float = REQUEST_TIMEOUT,
+                 engine=None):
+        self.engine = engine or get_engine()
+        self.batcher = MicroBatcher(self.engine, max_batch, batch_wait_ms / 1000, max_pending)
+        self.executor = JudgeExecutor(max_in_flight=max_in_flight)
+        self.timeout = timeout
+        self._admit = threading.BoundedSemaphore(max_pending)
+        # one OCR generate at a time (CPU-bound, shared model); requests wait on it with their deadline
+        self._ocr = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr")
+        self.ready = threading.Event()
+        self.load_error = None
+
+    def warm_up(self, ocr: bool = False):
+        # model + index (+ OCR) before /readyz says yes
+        try:
+            self.engine.load()
+            self.engine.encode(["warm up"])
+            if ocr:
+                from agents.vision_extractor import _load_model
+                _load_model()
+        except Exception as e:
+            self.load_error = f"{type(e).__name__}: {e}"
+            raise
+        self.ready.set()
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready.is_set(),
+            "error": self.load_error,
+            "batches": self.batcher.n_batches,
+            "avg_batch_size": self.batcher.n_requests / max(1, self.batcher.n_batches),
+        }
+
+    def check(self, claim: str = None, image_path: str = None, k: int = 5, variant: str = "A"):
+        """
+        (OCR ->) retrieve -> judge for one request; raises Overloaded / TimeoutError / ValueError.
+        On timeout, work that has not started is cancelled; a judge call already sent to Ollama
+        still runs to completion (bounded by the judge's own HTTP timeout) and keeps its executor slot.
+        """
+        if not 1 <= k <= MAX_K:
+            raise ValueError(f"k must be between 1 and {MAX_K}")
+        if not isinstance(variant, str) or variant.upper() not in ("A", "B"):
+            raise ValueError("variant must be A or B")
+        if not self._admit.acquire(blocking=False):
+            raise Overloaded("too many requests in flight")
+        try:
+            deadline = time.monotonic() + self.timeout
+            spans = SpanRecorder()
+            input_mode = "text"
+
+            if image_path is not None:
+                input_mode = "image"
+                from agents.vision_extractor import extract_label_text
+
+                with spans.span("ocr"):
+                    claim = self._wait(self._ocr.submit(extract_label_text, image_path), deadline)
+
+            claim = (claim or "").strip()
+            if not claim:
+                raise ValueError("empty claim")
+
+            evidence, vec = self._wait(self.batcher.submit(claim, k, spans), deadline)
+            judge_obj, flags = self._wait(
+                self.executor.submit(claim, evidence, variant=variant, spans=spans, query_vec=vec,
+                                     corpus=self.engine.corpus_fingerprint()), deadline
+            )
+        finally:
+            self._admit.release()
+
+        log_run(input_mode=input_mode, claim=claim, topk=k, evidence=evidence, judge_obj=judge_obj,
+                flags=flags, spans=spans.spans)
+        return {**judge_obj, "flags": flags, "evidence": evidence, "claim": claim}
+
+    def _wait(self, fut: Future, deadline: float):
+        try:
+            return fut.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            fut.cancel()  # not started yet -> never runs
+            raise TimeoutError("request timed out")
+
+    def close(self):
+        self.batcher.close()
+        self.executor.close()
+        self._ocr.shutdown(wait=True)
+
+def _int_param(value, name: str) -> int:
+    # 3 / "3" -> 3; null, lists, 2.5 and true are client errors (int("x") raises ValueError itself)
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"{name} must be an integer")
+    return int(value)
+
+class ClaimHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):
+        if not self.server.quiet:
+            super().log_message(fmt, *args)
+
+    def _send_json(self, status: int, obj: dict, headers: dict = None):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/healthz":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/readyz":
+            status = service.status()
+            self._send_json(200 if status["ready"] else 503, status)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_BODY:
+            self._send_json(413, {"error": "request body too large"})
+            self.close_connection = True
+            return
+        body = self.rfile.read(length)
+
+        service = self.server.service
+        if not service.ready.is_set():
+            self._send_json(503, {"error": "not ready"}, {"Retry-After": "1"})
+            return
+
+        path = urlsplit(self.path).path
+        try:
+            if path == "/check/text":
+                req = json.loads(body or b"{}")
+                if not isinstance(req, dict):
+                    raise ValueError("request body must be a JSON object")
+                claim = req.get("claim")
+                if not isinstance(claim, (str, type(None))):
+                    raise ValueError("claim must be a string")
+                result = service.check(claim=claim, k=_int_param(req.get("k", 5), "k"),
+                                       variant=req.get("variant", "A"))
+            elif path == "/check/image":
+                result = self._check_image(service, body)
+            else:
+                self._send_json(404, {"error": "not found"})
+                return
+        except Overloaded as e:
+            self._send_json(503, {"error": str(e)}, {"Retry-After": "1"})
+        except TimeoutError as e:
+            self._send_json(504, {"error": str(e)})
+        except requests.RequestException as e:
+            # Ollama unreachable / failing after retries
+            self._send_json(502, {"error": f"judge backend: {e}"})
+        except (ValueError, KeyError, OSError) as e:
+            # bad JSON / empty claim / unreadable image
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+        else:
+            self._send_json(200, result)
+
+    def _check_image(self, service, body: bytes):
+        # raw upload only (never a server-side path) -> temp file for the OCR agent
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            raise ValueError("send the image bytes as the request body (server-side paths are not accepted)")
+        query = parse_qs(urlsplit(self.path).query)
+        with tempfile.NamedTemporaryFile(suffix=".img") as f:
+            f.write(body)
+            f.flush()
+            return service.check(image_path=f.name, k=_int_param(query.get("k", ["5"])[0], "k"),
+                                 variant=query.get("variant", ["A"])[0])
+
+class ClaimServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # listen backlog; admission control happens in ClaimService
+
+def start_server(host: str = "127.0.0.1", port: int = 0, quiet: bool = True, warm_ocr: bool = False, **service_args):
+    """
+    Start the service in a daemon thread (warm-up runs in the background; poll /readyz).
+    - port=0 picks a free port
+    - service_args: ClaimService options (max_batch, batch_wait_ms, max_pending, max_in_flight, timeout)
+    Returns (server, base_url); call server.shutdown() and server.service.close() when done.
+    """
+    server = ClaimServer((host, port), ClaimHandler)
+    server.quiet = quiet
+    server.service = ClaimService(**service_args)
+
+    threading.Thread(target=server.service.warm_up, args=(warm_ocr,), daemon=True).start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP claim-check service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="claims per batched embed + search")
+    parser.add_argument("--batch-wait-ms", type=float, default=BATCH_WAIT_MS, help="batching window")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING, help="admitted requests before 503")
+    parser.add_argument("--max-in-flight", type=int, default=OLLAMA_NUM_PARALLEL, help="concurrent judge requests")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="seconds per request")
+    parser.add_argument("--warm-ocr", action="store_true", help="load the OCR model at startup too")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    server, url = start_server(args.host, args.port, quiet=not args.verbose, warm_ocr=args.warm_ocr,
+                               max_batch=args.max_batch, batch_wait_ms=args.batch_wait_ms,
+                               max_pending=args.max_pending, max_in_flight=args.max_in_flight,
+                               timeout=args.timeout)
+    print("Claim service listening on:", url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        server.service.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,213 @@
 # SQLite telemetry logger
+import atexit
 import json
+import os
+import queue
 import sqlite3
+import sys
+import threading
+import time
 from pathlib import Path
 from datetime import datetime, timezone
 
 ROOT = Path(__file__).resolve().parents[1]
-DB_PATH = ROOT / "telemetry" / "telemetry.db"
+DB_PATH = Path(os.environ.get("TELEMETRY_DB", ROOT / "telemetry" / "telemetry.db"))
 SCHEMA_PATH = ROOT / "telemetry" / "schema.sql"
 
-def get_conn():
+# background sink settings (env overrides for deployments)
+QUEUE_SIZE = int(os.environ.get("TELEMETRY_QUEUE_SIZE", "10000"))
+QUEUE_POLICY = os.environ.get("TELEMETRY_QUEUE_POLICY", "block")  # "block" or "drop" when the queue is full
+BATCH_SIZE = 256
+FLUSH_INTERVAL = 0.5  # seconds the writer waits to fill a batch
+CLOSE_TIMEOUT = 10.0  # seconds flush()/close() callers wait for the writer at exit
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+def get_conn(db_path: Path = DB_PATH):
     # sqlite connection
-    return sqlite3.connect(DB_PATH)
-
-def init_db():
-    conn = get_conn()
-    try:
-        schema = SCHEMA_PATH.read_text(encoding="utf-8")
-        conn.executescript(schema) # run CREATE TABLE statements
-        conn.commit()
-    finally:
+    return sqlite3.connect(db_path)
+
+def init_db(db_path: Path = DB_PATH):
+    # once per process (per db file): CREATE TABLE statements + WAL mode
+    with _schema_lock:
+        if db_path in _schema_ready:
+            return
+
+        conn = get_conn(db_path)
+        try:
+            schema = SCHEMA_PATH.read_text(encoding="utf-8")
+            conn.executescript(schema) # run CREATE TABLE statements
+            conn.execute("PRAGMA journal_mode=WAL")  # persistent: readers don't block the writer
+            conn.commit()
+        finally:
+            conn.close()
+        _schema_ready.add(db_path)
+
+def _write_record(conn, record: dict):
+    t0 = time.perf_counter()
+    cur = conn.execute(
+        """
+        INSERT INTO runs (created_at, input_mode, claim, topk, evidence_json, judge_json, flags_json)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        record["run"],
+    )
+    run_id = cur.lastrowid
+
+    spans = list(record.get("spans") or [])
+    if spans:
+        conn.executemany(
+            "INSERT INTO spans (run_id, stage, start_ms, duration_ms, attrs_json) VALUES (?, ?, ?, ?, ?)",
+            [
+                (run_id, sp["stage"], sp["start_ms"], sp["duration_ms"], json.dumps(sp["attrs"], ensure_ascii=False))
+                for sp in spans
+            ],
+        )
+        # the write itself is a stage too (measured here, on the writer thread): runs + spans inserts.
+        # The batch commit is shared by many records and not included.
+        last = spans[-1]
+        conn.execute(
+            "INSERT INTO spans (run_id, stage, start_ms, duration_ms, attrs_json) VALUES (?, ?, ?, ?, ?)",
+            (run_id, "telemetry_write", last["start_ms"] + last["duration_ms"], (time.perf_counter() - t0) * 1000,
+             "{}"),
+        )
+
+class TelemetrySink:
+    """
+    Asynchronous telemetry writer.
+    - submit() puts a record on a bounded queue (block or drop when full)
+    - one writer thread with one long-lived WAL connection commits records in batches
+    - flush() waits until everything submitted so far is committed; close() runs at exit
+    """
+
+    def __init__(self, db_path: Path = DB_PATH, maxsize: int = QUEUE_SIZE, policy: str = QUEUE_POLICY,
+                 batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        if policy not in ("block", "drop"):
+            raise ValueError(f"Unknown queue policy: {policy} (use 'block' or 'drop')")
+
+        self.db_path = Path(db_path)
+        self.policy = policy
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+
+        init_db(self.db_path)
+
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, record: dict) -> bool:
+        """Queue one record; False if it was dropped."""
+        if self._closed:
+            self.dropped += 1
+            return False
+
+        if self.policy == "drop":
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        else:
+            self._queue.put(record)
+        return True
+
+    def flush(self, timeout: float = None) -> bool:
+        """Block until records submitted before this call are committed."""
+        if self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = CLOSE_TIMEOUT):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)  # stop marker, after everything already queued
+        self._thread.join(timeout)
+
+    def _write_batch(self, conn, records):
+        # one transaction per batch, one savepoint per record: a bad record is dropped alone,
+        # and no exception may escape (a dead writer thread would drop everything after it)
+        good = 0
+        try:
+            conn.execute("BEGIN")
+            for r in records:
+                conn.execute("SAVEPOINT record")
+                try:
+                    _write_record(conn, r)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO record")
+                    self.errors += 1
+                    print(f"[telemetry] dropped 1 record: {type(e).__name__}: {e}", file=sys.stderr)
+                else:
+                    good += 1
+                conn.execute("RELEASE record")
+            conn.commit()
+            self.written += good
+        except Exception as e:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            self.errors += good
+            print(f"[telemetry] dropped {good} records: {type(e).__name__}: {e}", file=sys.stderr)
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA synchronous=NORMAL")  # safe with WAL, one fsync per checkpoint instead of per commit
+
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            # fill the batch, but don't hold records longer than flush_interval
+            while len(batch) < self.batch_size and isinstance(batch[-1], dict):
+                try:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+                except queue.Empty:
+                    break
+
+            records = [r for r in batch if isinstance(r, dict)]
+            if records:
+                self._write_batch(conn, records)
+
+            for item in batch:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    item.set()
+
         conn.close()
 
+_sink = None
+_sink_lock = threading.Lock()
+
+def get_sink() -> TelemetrySink:
+    """Process-wide shared sink."""
+    global _sink
+
+    with _sink_lock:
+        if _sink is None:
+            _sink = TelemetrySink()
+    return _sink
 
-def log_run(input_mode: str, claim: str, topk: int, evidence: list, judge_obj: dict, flags: list[str]):
-    # Insert one pipeline run into sqlite
-    init_db()  # ensure DB exists and tables created
+def log_run(input_mode: str, claim: str, topk: int, evidence: list, judge_obj: dict, flags: list[str],
+            spans: list = None):
+    # Queue one pipeline run (+ its timing spans) for the background writer
     created_at = datetime.now(timezone.utc).isoformat()
 
     evidence_json = json.dumps(evidence, ensure_ascii=False)
     judge_json = json.dumps(judge_obj, ensure_ascii=False)
     flags_json = json.dumps(flags, ensure_ascii=False)
 
-    conn = get_conn()
-    try:
-        conn.execute(
-            """
-            INSERT INTO runs (created_at, input_mode, claim, topk, evidence_json, judge_json, flags_json)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (created_at, input_mode, claim, topk, evidence_json, judge_json, flags_json),
-        )
-        conn.commit()
-    finally:
-        conn.close()
+    return get_sink().submit({
+        "run": (created_at, input_mode, claim, topk, evidence_json, judge_json, flags_json),
+        "spans": spans or [],
+    })
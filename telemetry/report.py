@@ -0,0 +1,165 @@
+# Latency report: per-stage percentiles + Ollama tokens/sec over a time window
+import argparse
+import json
+import re
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from telemetry.db import DB_PATH, init_db
+from telemetry.spans import summarize_ms
+
+WINDOW_RE = re.compile(r"^(\d+)([mhd])$")
+WINDOW_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+def parse_window(window: str) -> timedelta:
+    """'30m' / '24h' / '7d' -> timedelta"""
+    m = WINDOW_RE.match(window.strip())
+    if not m:
+        raise argparse.ArgumentTypeError(f"Bad window {window!r} (use e.g. 30m, 24h, 7d)")
+    return timedelta(**{WINDOW_UNITS[m.group(2)]: int(m.group(1))})
+
+def _rate(count, duration_ns):
+    return count / (duration_ns / 1e9) if count and duration_ns else None
+
+def build_report(conn, since: datetime) -> dict:
+    rows = conn.execute(
+        """
+        SELECT s.stage, s.duration_ms, s.attrs_json
+        FROM spans s JOIN runs r ON r.id = s.run_id
+        WHERE r.created_at >= ?
+        """,
+        (since.isoformat(),),
+    ).fetchall()
+
+    by_stage = {}
+    gen_tps, prompt_tps = [], []
+    verdict_tokens, ttft = [], []
+    generations = early_stops = parse_retries = 0
+    sem_lookups = sem_hits = 0
+    gate_checks = gate_fired = 0
+    pack_prompts = pack_raw = pack_packed = 0
+    for stage, duration_ms, attrs_json in rows:
+        by_stage.setdefault(stage, []).append(duration_ms)
+
+        if stage == "semantic_cache":
+            sem_lookups += 1
+            sem_hits += 1 if json.loads(attrs_json).get("hit") else 0
+        elif stage == "gate":
+            gate_checks += 1
+            gate_fired += 1 if json.loads(attrs_json).get("fired") else 0
+        elif stage == "prompt_build":
+            attrs = json.loads(attrs_json)
+            if "est_tokens_raw" in attrs:
+                pack_prompts += 1
+                pack_raw += attrs["est_tokens_raw"]
+                pack_packed += attrs["est_tokens_packed"]
+
+        if stage == "ollama":
+            attrs = json.loads(attrs_json)
+            if not attrs.get("cached"):
+                generations += 1
+                early_stops += 1 if attrs.get("early_stop") else 0
+                parse_retries += 1 if attrs.get("retry") else 0
+                if attrs.get("eval_count") is not None:
+                    verdict_tokens.append(attrs["eval_count"])
+                if attrs.get("ttft_ms") is not None:
+                    ttft.append(attrs["ttft_ms"])
+            tps = _rate(attrs.get("eval_count"), attrs.get("eval_duration"))
+            if tps is not None:
+                gen_tps.append(tps)
+            tps = _rate(attrs.get("prompt_eval_count"), attrs.get("prompt_eval_duration"))
+            if tps is not None:
+                prompt_tps.append(tps)
+
+    n_runs = conn.execute("SELECT COUNT(*) FROM runs WHERE created_at >= ?", (since.isoformat(),)).fetchone()[0]
+    stages = {stage: summarize_ms(v) for stage, v in by_stage.items()}
+    # slowest stage first -> the bottleneck is at the top
+    stages = dict(sorted(stages.items(), key=lambda kv: -kv[1].get("p50", 0)))
+
+    return {
+        "since": since.isoformat(),
+        "n_runs": n_runs,
+        "stages_ms": stages,
+        # summarize_ms is unit-agnostic; these are tokens/sec, not ms
+        "ollama_eval_tokens_per_sec": summarize_ms(gen_tps),
+        "ollama_prompt_tokens_per_sec": summarize_ms(prompt_tps),
+        "judge_generation": {
+            "generations": generations,
+            "tokens_per_verdict": summarize_ms(verdict_tokens),
+            "ttft_ms": summarize_ms(ttft),
+            "early_stop_rate": early_stops / generations if generations else 0.0,
+            "parse_retries": parse_retries,
+        },
+        "semantic_cache": {
+            "lookups": sem_lookups,
+            "hits": sem_hits,
+            "hit_rate": sem_hits / sem_lookups if sem_lookups else 0.0,
+        },
+        "gate": {
+            "checks": gate_checks,
+            "fired": gate_fired,
+            "fire_rate": gate_fired / gate_checks if gate_checks else 0.0,
+        },
+        # estimated evidence tokens (agents/evidence_pack.py), before vs after packing
+        "evidence_pack": {
+            "prompts": pack_prompts,
+            "est_tokens_raw": pack_raw,
+            "est_tokens_packed": pack_packed,
+            "saved": 1 - pack_packed / pack_raw if pack_raw else 0.0,
+        },
+    }
+
+def print_report(report: dict):
+    print(f"Runs since {report['since']}: {report['n_runs']}\n")
+    print(f"{'stage':<18}{'n':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+    for stage, s in report["stages_ms"].items():
+        print(f"{stage:<18}{s['n']:>7}{s['p50']:>11.1f}{s['p95']:>11.1f}{s['p99']:>11.1f}")
+
+    for name in ("ollama_eval_tokens_per_sec", "ollama_prompt_tokens_per_sec"):
+        s = report[name]
+        if s["n"]:
+            print(f"\n{name}: p50={s['p50']:.1f}  p95={s['p95']:.1f}  mean={s['mean']:.1f}")
+
+    s = report["judge_generation"]
+    if s["generations"]:
+        line = f"\njudge_generation: {s['generations']} generations"
+        if s["tokens_per_verdict"]["n"]:
+            line += f", tokens/verdict p50={s['tokens_per_verdict']['p50']:.0f} p95={s['tokens_per_verdict']['p95']:.0f}"
+        if s["ttft_ms"]["n"]:
+            line += f", ttft p50={s['ttft_ms']['p50']:.1f}ms p95={s['ttft_ms']['p95']:.1f}ms"
+        print(line + f", early_stop={s['early_stop_rate']:.1%}, parse_retries={s['parse_retries']}")
+
+    s = report["semantic_cache"]
+    if s["lookups"]:
+        print(f"\nsemantic_cache: {s['hits']}/{s['lookups']} hits (hit_rate={s['hit_rate']:.1%})")
+
+    s = report["gate"]
+    if s["checks"]:
+        print(f"gate: {s['fired']}/{s['checks']} claims answered Unknown without the LLM ({s['fire_rate']:.1%})")
+
+    s = report["evidence_pack"]
+    if s["prompts"]:
+        print(f"evidence_pack: ~{s['est_tokens_raw']} -> ~{s['est_tokens_packed']} evidence tokens "
+              f"over {s['prompts']} prompts ({s['saved']:.1%} saved)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency report from telemetry spans")
+    parser.add_argument("--since", type=parse_window, default="24h", help="time window, e.g. 30m, 24h, 7d")
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    init_db(args.db)  # older databases may not have the spans table yet
+    conn = sqlite3.connect(args.db)
+    try:
+        report = build_report(conn, datetime.now(timezone.utc) - args.since)
+    finally:
+        conn.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -18,3 +18,22 @@ CREATE TABLE IF NOT EXISTS runs (
   -- guardrail flags
   flags_json TEXT NOT NULL
 );
+
+CREATE INDEX IF NOT EXISTS idx_runs_created_at ON runs(created_at);
+
+-- per-stage timing spans of a run (OCR, embed, search, prompt build, ollama, parse, telemetry write)
+
+CREATE TABLE IF NOT EXISTS spans (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  run_id INTEGER NOT NULL REFERENCES runs(id),
+
+  stage TEXT NOT NULL,
+  start_ms REAL NOT NULL,     -- offset from the start of the run
+  duration_ms REAL NOT NULL,
+
+  -- stage extras, e.g. Ollama eval_count / eval_duration / prompt_eval_duration
+  attrs_json TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_spans_run_id ON spans(run_id);
+CREATE INDEX IF NOT EXISTS idx_spans_stage ON spans(stage);
@@ -0,0 +1,60 @@
+# Per-stage timing spans for one pipeline run
+import time
+from contextlib import contextmanager, nullcontext
+
+class SpanRecorder:
+    """
+    Collects (stage, start_ms, duration_ms, attrs) for one run.
+    - with spans.span("search") as attrs: ...   (attrs dict can be filled inside the block)
+    - start_ms is relative to when the recorder was created
+    """
+
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self.spans = []
+
+    def add(self, stage: str, start_ms: float, duration_ms: float, **attrs):
+        self.spans.append({
+            "stage": stage,
+            "start_ms": start_ms,
+            "duration_ms": duration_ms,
+            "attrs": attrs,
+        })
+
+    def extend(self, other: "SpanRecorder", **attrs):
+        # copy spans recorded elsewhere (e.g. one batched search shared by many runs) onto this timeline
+        shift = (other._t0 - self._t0) * 1000
+        for s in other.spans:
+            self.add(s["stage"], s["start_ms"] + shift, s["duration_ms"], **{**s["attrs"], **attrs})
+
+    @contextmanager
+    def span(self, stage: str, **attrs):
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            end = time.perf_counter()
+            self.add(stage, (start - self._t0) * 1000, (end - start) * 1000, **attrs)
+
+def maybe_span(spans, stage: str, **attrs):
+    """spans.span(...) when a recorder is passed, otherwise a no-op context (yields a throwaway dict)."""
+    if spans is None:
+        return nullcontext(attrs)
+    return spans.span(stage, **attrs)
+
+def summarize_ms(values):
+    """p50/p95/p99 (+ mean) of a list of millisecond timings."""
+    if not values:
+        return {"n": 0}
+    v = sorted(values)
+
+    def pct(p):
+        return v[min(len(v) - 1, int(round(p / 100 * (len(v) - 1))))]
+
+    return {
+        "n": len(v),
+        "mean": sum(v) / len(v),
+        "p50": pct(50),
+        "p95": pct(95),
+        "p99": pct(99),
+    }
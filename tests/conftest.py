@@ -0,0 +1,104 @@
+# Shared pytest fixtures: run from the repo root with `python -m pytest -q`
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+@pytest.fixture(autouse=True)
+def telemetry_tmp(tmp_path, monkeypatch):
+    # never write the tracked telemetry/telemetry.db from tests
+    import telemetry.db as tdb
+
+    sink = tdb.TelemetrySink(db_path=tmp_path / "telemetry.db")
+    monkeypatch.setattr(tdb, "_sink", sink)
+    yield sink
+    sink.close()
+
+@pytest.fixture
+def no_caches(monkeypatch):
+    # every judge call reaches the (mock) model; retries don't wait
+    import agents.judge as judge_mod
+
+    for name in ("JUDGE_CACHE", "SEMANTIC_CACHE", "GATE"):
+        monkeypatch.setenv(name, "0")
+    monkeypatch.setattr(judge_mod, "BACKOFF_SECONDS", 0.001)
+
+@pytest.fixture
+def ollama(request, monkeypatch):
+    # mock Ollama on a free port; indirect params go to start_mock_server (delay, fail_every, ...)
+    import agents.judge as judge_mod
+    from eval.mock_ollama import start_mock_server
+
+    server, url = start_mock_server(**getattr(request, "param", {}))
+    monkeypatch.setattr(judge_mod, "OLLAMA_URL", url)
+    yield server
+    server.shutdown()
+
+class FakeEngine:
+    # stand-in retriever: k evidence chunks per claim, records every batched call
+    def __init__(self):
+        self.calls = []
+
+    def load(self):
+        pass
+
+    def encode(self, texts):
+        return np.ones((len(texts), 4), dtype=np.float32) / 2
+
+    def corpus_fingerprint(self):
+        return "fake-corpus"
+
+    def retrieve_batch(self, claims, k=5, batch_size=64, spans=None, return_vectors=False):
+        self.calls.append((list(claims), k))
+        evidences = [
+            [{"rank": r + 1, "score": 0.9, "chunk_id": f"doc::chunk_{r}", "doc_id": "doc", "chunk_index": r,
+              "text": f"evidence {r} for {claim}"} for r in range(k)]
+            for claim in claims
+        ]
+        return (evidences, self.encode(claims)) if return_vectors else evidences
+
+EMB_DIM = 32
+
+class FakeEncoder:
+    # deterministic vector per text; remembers its backend and how many texts it encoded
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.n_encoded = 0
+
+    def encode(self, texts, **kwargs):
+        self.n_encoded += len(texts)
+        return np.stack([np.random.default_rng(abs(hash(t)) % 2**32).normal(size=EMB_DIM) for t in texts])
+
+    def get_sentence_embedding_dimension(self):
+        return EMB_DIM
+
+@pytest.fixture
+def index_files(tmp_path, monkeypatch):
+    """
+    Every index build output under tmp_path, every encoder a FakeEncoder.
+    Returns (tmp_path, encoders): encoders lists the FakeEncoders loaded, in order.
+    """
+    from index import build_faiss, embed, stream_build
+
+    files = {"CHUNKS_FILE": "chunks.jsonl", "EMB_NPY": "embeddings.npy", "META_JSONL": "chunk_meta.jsonl",
+             "STORE_FILE": "chunk_store.bin", "INDEX_FILE": "faiss.index", "PARAMS_FILE": "faiss_params.json",
+             "DOCS_FILE": "docs.jsonl", "WORK_DIR": "stream_build"}
+    for module in (embed, build_faiss, stream_build):
+        for name, filename in files.items():
+            if hasattr(module, name):
+                monkeypatch.setattr(module, name, tmp_path / filename)
+
+    encoders = []
+
+    def load_encoder(backend, model_name):
+        encoders.append(FakeEncoder(backend))
+        return encoders[-1]
+
+    monkeypatch.setattr(embed, "load_encoder", load_encoder)
+    monkeypatch.setattr(stream_build, "load_encoder", load_encoder)
+    return tmp_path, encoders
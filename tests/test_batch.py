@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from conftest import FakeEngine
+from pipeline import batch
+
+pytestmark = pytest.mark.usefixtures("no_caches")
+
+@pytest.fixture
+def claims(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "get_engine", FakeEngine)
+    path = tmp_path / "claims.jsonl"
+    rows = [{"id": f"c{i}", "claim": f"claim {i}"} for i in range(6)] + [{"id": "blank", "claim": " "}]
+    path.write_text("".join(json.dumps(r) + "\n" for r in rows), encoding="utf-8")
+    return path
+
+def read_output(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+def test_every_claim_gets_one_line_in_order(ollama, claims, tmp_path):
+    out = tmp_path / "verdicts.jsonl"
+    summary = batch.run_batch(claims, out, k=1, batch_size=4, max_in_flight=2, progress_every=60)
+
+    recs = read_output(out)
+    assert [r["id"] for r in recs] == [f"c{i}" for i in range(6)] + ["blank"]
+    assert all(r["verdict"] == "Supported" for r in recs[:6])
+    assert recs[6]["error"] == "empty claim"
+    assert summary["checked"] == 7 and summary["errors"] == 1
+    assert ollama.n_requests == 6
+
+def test_resume_keeps_one_line_per_id(ollama, claims, tmp_path):
+    out = tmp_path / "verdicts.jsonl"
+    batch.run_batch(claims, out, k=1, progress_every=60)
+    lines = out.read_text(encoding="utf-8").splitlines()
+
+    # c1 failed earlier and then succeeded, c2 only failed, c3 was cut off mid-write
+    failed = lambda cid: json.dumps({"id": cid, "input_mode": "text", "claim": "x", "evidence": [],
+                                     "error": "judge: timeout"})
+    out.write_text("\n".join([failed("c1"), lines[0], lines[1], failed("c2"), lines[4], lines[5]])
+                   + "\n" + lines[3][:20], encoding="utf-8")
+
+    ollama.n_requests = 0
+    summary = batch.run_batch(claims, out, k=1, progress_every=60)
+    assert summary["skipped_already_done"] == 4  # c0, c1, c4, c5
+    assert ollama.n_requests == 2                # c2, c3; "blank" fails again without a judge call
+
+    recs = read_output(out)
+    ids = [r["id"] for r in recs]
+    assert sorted(ids) == sorted([f"c{i}" for i in range(6)] + ["blank"])
+    assert all("error" not in r for r in recs if r["id"] != "blank")
@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+import pytest
+
+from index import build_faiss
+
+N_CHUNKS = 286  # size of the repo's own corpus
+DIM = 384
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # embeddings.npy + chunk_meta.jsonl + outputs, all under tmp_path
+    meta = tmp_path / "chunk_meta.jsonl"
+    meta.write_text("".join(json.dumps({"chunk_id": f"doc::chunk_{i}"}) + "\n" for i in range(N_CHUNKS)),
+                    encoding="utf-8")
+    for name, filename in (("EMB_NPY", "embeddings.npy"), ("META_JSONL", "chunk_meta.jsonl"),
+                           ("INDEX_FILE", "faiss.index"), ("PARAMS_FILE", "faiss_params.json"),
+                           ("COMPARE_FILE", "faiss_compare.json")):
+        monkeypatch.setattr(build_faiss, name, tmp_path / filename)
+    return tmp_path
+
+def write_embeddings(path, dtype="float32", n=N_CHUNKS):
+    vectors = np.random.default_rng(0).normal(size=(n, DIM)).astype(dtype)
+    np.save(path / "embeddings.npy", vectors)
+    return vectors
+
+@pytest.mark.parametrize("kind", ["ivf", "ivfpq", "pq"])
+def test_trained_types_build_on_small_corpus(store, kind):
+    write_embeddings(store, "float16")
+    build_faiss.main(["--type", kind])
+
+    params = json.loads((store / "faiss_params.json").read_text(encoding="utf-8"))
+    assert params["type"] == kind
+    assert params["report"]["n_queries"] <= N_CHUNKS // 10
+    assert (store / "faiss.index").exists()
+
+def test_too_few_vectors_for_pq_is_a_clear_error():
+    vectors = np.random.default_rng(0).normal(size=(12, DIM)).astype(np.float32)
+    config = dict(build_faiss.DEFAULT_CONFIG, type="ivfpq")
+    with pytest.raises(ValueError, match="at least 16 training vectors"):
+        build_faiss.build_index(vectors, np.arange(12, dtype=np.int64), config)
+
+def test_flat_build_from_float32_npy(store):
+    # np.save float32 -> mmap load must not hand a read-only array to normalize_L2
+    write_embeddings(store, "float32")
+    build_faiss.main(["--type", "flat"])
+
+    index = build_faiss.faiss.read_index(str(store / "faiss.index"))
+    assert index.ntotal == N_CHUNKS
+    params = json.loads((store / "faiss_params.json").read_text(encoding="utf-8"))
+    assert params["report"]["recall_at_k"] == 1.0
+
+def test_compare_completes_on_small_corpus(store):
+    write_embeddings(store, "float32")
+    build_faiss.main(["--compare"])
+
+    result = json.loads((store / "faiss_compare.json").read_text(encoding="utf-8"))
+    assert {r["type"] for r in result["indexes"]} == set(build_faiss.COMPARE_TYPES)
+    assert result["skipped"] == []
+
+def test_compare_records_types_that_cannot_train(store):
+    write_embeddings(store, "float32", n=12)
+    meta = store / "chunk_meta.jsonl"
+    meta.write_text("".join(meta.read_text(encoding="utf-8").splitlines(keepends=True)[:12]), encoding="utf-8")
+    build_faiss.main(["--compare"])
+
+    result = json.loads((store / "faiss_compare.json").read_text(encoding="utf-8"))
+    assert {r["type"] for r in result["skipped"]} == {"pq", "ivfpq"}
+    assert {r["type"] for r in result["indexes"]} == {"flat", "sq8"}
@@ -0,0 +1,60 @@
+import json
+
+from agents.gate import DEFAULT_THRESHOLDS
+from eval import calibrate_gate
+from eval.calibrate_gate import calibrate, split_samples
+
+def _samples(n_claims: int, variants=("A", "B")):
+    # odd claims: weak evidence, the answer is Unknown; even claims: strong evidence, judged right
+    samples = []
+    for i in range(n_claims):
+        weak = i % 2
+        for _ in variants:
+            samples.append({
+                "id": f"t{i}",
+                "expected": "Unknown" if weak else "Supported",
+                "pred": "Unknown" if weak else "Supported",
+                "evidence": [{"doc_id": f"d{i % 3}", "score": 0.2 if weak else 0.8}],
+            })
+    return samples
+
+def test_too_few_claims_keep_the_gate_off():
+    thresholds, report = calibrate(_samples(12))
+    assert thresholds["default"] == DEFAULT_THRESHOLDS["default"]
+    assert thresholds["per_doc"] == {}
+    assert report["n_claims"] == 12
+
+def test_enough_claims_fit_a_default():
+    thresholds, report = calibrate(_samples(60))
+    assert 0.2 < thresholds["default"] <= 0.8
+    assert report["llm_calls_skipped"] == 0.5
+    assert report["correct_verdicts_lost"] == 0.0
+
+def test_split_keeps_a_claim_on_one_side():
+    fit, held_out = split_samples(_samples(40), 0.25)
+    fit_ids = {s["id"] for s in fit}
+    held_ids = {s["id"] for s in held_out}
+    assert len(held_ids) == 10
+    assert not fit_ids & held_ids
+
+def _write_results(path, samples):
+    results = [{"id": s["id"], "claim": "", "expected": s["expected"], "pred": s["pred"],
+                "top_evidence": s["evidence"]} for s in samples]
+    path.write_text(json.dumps({"summary": {"gate": False}, "results": results}), encoding="utf-8")
+
+def test_main_refuses_to_write_below_min_claims(tmp_path, monkeypatch):
+    results = tmp_path / "eval_A_run.json"
+    _write_results(results, _samples(12, variants=("A",)))
+    gate_file = tmp_path / "gate_thresholds.json"
+    monkeypatch.setattr(calibrate_gate, "GATE_FILE", gate_file)
+
+    monkeypatch.setattr("sys.argv", ["calibrate_gate", "--results", str(results)])
+    calibrate_gate.main()
+    assert not gate_file.exists()
+
+    _write_results(results, _samples(80, variants=("A",)))
+    calibrate_gate.main()
+    saved = json.loads(gate_file.read_text(encoding="utf-8"))
+    assert saved["default"] > DEFAULT_THRESHOLDS["default"]
+    assert saved["report"]["held_out"]["n_claims"] == 20
+    assert saved["report"]["held_out"]["correct_verdicts_lost"] == 0.0
@@ -0,0 +1,71 @@
+import pytest
+
+from index.chunk_ids import vec_id
+from index.chunk_store import ChunkStore, write_chunk_store
+
+def _records(n: int):
+    return [
+        {"chunk_id": f"doc_{i % 3}::chunk_{i}", "doc_id": f"doc_{i % 3}", "title": f"Title {i % 3} – ü",
+         "chunk_index": i, "text": f"text of chunk {i} " * (i % 5), "vec_id": vec_id(f"doc_{i % 3}::chunk_{i}")}
+        for i in range(n)
+    ]
+
+def test_round_trip(tmp_path):
+    records = _records(50)
+    assert write_chunk_store(records, tmp_path / "store.bin") == 50
+
+    store = ChunkStore(tmp_path / "store.bin")
+    try:
+        assert len(store) == 50
+        for i, rec in enumerate(records):
+            assert store.row(i) == rec
+            assert store.find(rec["vec_id"]) == i
+            assert store.get(rec["vec_id"]) == rec
+        with pytest.raises(IndexError):
+            store.row(50)
+    finally:
+        store.close()
+
+def test_missing_id(tmp_path):
+    records = _records(10)
+    write_chunk_store(records, tmp_path / "store.bin")
+    store = ChunkStore(tmp_path / "store.bin")
+    try:
+        assert store.find(vec_id("doc_9::chunk_999")) == -1
+        assert store.get(12345) is None
+    finally:
+        store.close()
+
+def test_colliding_ids(tmp_path):
+    # 8 rows -> 16 slots: ids equal mod 16 share a home slot and probe past each other
+    records = [{"chunk_id": f"c{i}", "doc_id": "d", "vec_id": 7 + 16 * i, "chunk_index": i} for i in range(7)]
+    records.append({"chunk_id": "neg", "doc_id": "d", "vec_id": -9, "chunk_index": 7})  # -9 & 15 == 7 too
+    write_chunk_store(records, tmp_path / "store.bin")
+
+    store = ChunkStore(tmp_path / "store.bin")
+    try:
+        assert store.n_slots == 16
+        for i, rec in enumerate(records):
+            assert store.find(rec["vec_id"]) == i
+            assert store.get(rec["vec_id"])["chunk_id"] == rec["chunk_id"]
+        # same home slot, not stored: the probe ends at the first empty slot
+        assert store.find(7 + 16 * 100) == -1
+    finally:
+        store.close()
+
+def test_empty_store(tmp_path):
+    assert write_chunk_store([], tmp_path / "store.bin") == 0
+
+    store = ChunkStore(tmp_path / "store.bin")
+    try:
+        assert len(store) == 0
+        assert store.find(1) == -1
+        assert store.get(1) is None
+    finally:
+        store.close()
+
+def test_not_a_store(tmp_path):
+    path = tmp_path / "store.bin"
+    path.write_bytes(b"x" * 64)
+    with pytest.raises(ValueError):
+        ChunkStore(path)
@@ -0,0 +1,85 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ingest import download
+
+class PageHandler(BaseHTTPRequestHandler):
+    # one page with an ETag; honours If-None-Match unless the server is told to ignore it
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if server.status != 200:
+            self.send_response(server.status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = '"%s"' % hashlib.md5(server.body).hexdigest()
+        if server.honour_conditional and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(server.body)))
+        self.end_headers()
+        self.wfile.write(server.body)
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    server.body = b"<html>v1</html>"
+    server.status = 200
+    server.honour_conditional = True
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}/page"
+    server.shutdown()
+
+def test_conditional_get_and_update(site, tmp_path):
+    server, url = site
+    sources = [("page", url)]
+
+    assert download.download_all(sources, tmp_path, workers=1, per_host_interval=0)["page"]["status"] == "new"
+    assert (tmp_path / "page.html").read_bytes() == b"<html>v1</html>"
+
+    manifest = download.download_all(sources, tmp_path, workers=1, per_host_interval=0)
+    assert manifest["page"]["status"] == "unchanged"
+    assert server.requests[-1].get("If-None-Match") == manifest["page"]["etag"]
+
+    server.body = b"<html>v2</html>"
+    assert download.download_all(sources, tmp_path, workers=1, per_host_interval=0)["page"]["status"] == "updated"
+    assert (tmp_path / "page.html").read_bytes() == b"<html>v2</html>"
+    assert not list(tmp_path.glob("*.tmp"))  # atomic writes leave no temp files
+
+def test_same_content_without_304_is_unchanged(site, tmp_path):
+    server, url = site
+    server.honour_conditional = False
+    download.download_all([("page", url)], tmp_path, workers=1, per_host_interval=0)
+    mtime = (tmp_path / "page.html").stat().st_mtime_ns
+
+    manifest = download.download_all([("page", url)], tmp_path, workers=1, per_host_interval=0)
+    assert manifest["page"]["status"] == "unchanged"
+    assert (tmp_path / "page.html").stat().st_mtime_ns == mtime
+
+def test_failed_fetch_keeps_previous_file(site, tmp_path):
+    server, url = site
+    download.download_all([("page", url)], tmp_path, workers=1, per_host_interval=0)
+    server.status = 500
+
+    manifest = download.download_all([("page", url)], tmp_path, workers=1, per_host_interval=0, force=True)
+    assert manifest["page"]["status"] == "failed"
+    assert (tmp_path / "page.html").read_bytes() == b"<html>v1</html>"
+
+def test_force_skips_conditional_headers(site, tmp_path):
+    server, url = site
+    download.download_all([("page", url)], tmp_path, workers=1, per_host_interval=0)
+    download.download_all([("page", url)], tmp_path, workers=1, per_host_interval=0, force=True)
+    assert "If-None-Match" not in server.requests[-1]
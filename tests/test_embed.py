@@ -0,0 +1,59 @@
+import json
+import sys
+
+import numpy as np
+import pytest
+
+from conftest import EMB_DIM
+from index import build_faiss, embed
+
+@pytest.fixture
+def corpus(index_files):
+    return index_files[0]
+
+def write_chunks(path, texts):
+    path.joinpath("chunks.jsonl").write_text(
+        "".join(json.dumps({"chunk_id": f"doc::chunk_{i}", "doc_id": "doc", "text": t}) + "\n"
+                for i, t in enumerate(texts)),
+        encoding="utf-8",
+    )
+
+def run_embed(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["embed", *args])
+    embed.main()
+
+def test_incremental_keeps_stored_dtype(corpus, monkeypatch):
+    write_chunks(corpus, [f"text {i}" for i in range(60)])
+    run_embed(monkeypatch, "--dtype", "float16")
+    build_faiss.main(["--type", "flat"])
+
+    write_chunks(corpus, [f"text {i}" for i in range(59)] + ["changed", "new"])
+    run_embed(monkeypatch, "--incremental")
+
+    vectors = np.load(corpus / "embeddings.npy")
+    assert vectors.dtype == np.float16
+    assert vectors.shape == (61, EMB_DIM)
+    assert build_faiss.faiss.read_index(str(corpus / "faiss.index")).ntotal == 61
+
+@pytest.mark.parametrize("kind", ["flat", "ivf"])
+def test_reapplied_delta_does_not_duplicate(corpus, monkeypatch, kind):
+    write_chunks(corpus, [f"text {i}" for i in range(60)])
+    run_embed(monkeypatch)
+    build_faiss.main(["--type", kind])
+
+    # a crash after the index update but before embeddings/meta were replaced -> same delta again
+    write_chunks(corpus, [f"text {i}" for i in range(60)] + ["new"])
+    save_outputs = embed.save_outputs
+    monkeypatch.setattr(embed, "save_outputs", lambda *a, **kw: None)
+    run_embed(monkeypatch, "--incremental")
+    monkeypatch.setattr(embed, "save_outputs", save_outputs)
+    run_embed(monkeypatch, "--incremental")
+
+    # a changed chunk on top: re-added once, not twice
+    write_chunks(corpus, [f"text {i}" for i in range(59)] + ["changed", "new"])
+    run_embed(monkeypatch, "--incremental")
+
+    index = build_faiss.faiss.read_index(str(corpus / "faiss.index"))
+    assert index.ntotal == 61
+    if kind == "flat":
+        assert len(set(build_faiss.faiss.vector_to_array(index.id_map).tolist())) == 61
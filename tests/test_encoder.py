@@ -0,0 +1,19 @@
+import pytest
+
+from index import encoder
+
+MODEL_FILES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_within_tolerance_of_torch(backend):
+    # the stored embeddings.npy is the torch reference; needs: python -m index.encoder export --int8
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("tokenizers")
+    if not (encoder.ONNX_DIR / MODEL_FILES[backend]).exists():
+        pytest.skip(f"{MODEL_FILES[backend]} not exported")
+    if not (encoder.EMB_NPY.exists() and encoder.META_JSONL.exists()):
+        pytest.skip("no embeddings.npy / chunk_meta.jsonl to compare against")
+
+    result = encoder.check_tolerance(backend, n=128)
+    assert result["cosine_min"] >= encoder.TOLERANCE[backend], result
+    assert result["topk_overlap"] >= 0.8, result
@@ -0,0 +1,34 @@
+from agents.evidence_pack import MIN_BLOCK_TOKENS, estimate_tokens, merge_chunks, pack_evidence
+
+DOC = "".join(f"Sentence {i} about magnesium and sleep quality. " for i in range(80))
+
+def _chunk(doc_id: str, i: int, rank: int, text: str = None):
+    # ingest/chunk.py windows: 1200 chars, 200 overlap
+    return {"rank": rank, "score": 1 - rank / 10, "chunk_id": f"{doc_id}::chunk_{i}", "doc_id": doc_id,
+            "chunk_index": i, "text": text if text is not None else DOC[i * 1000:i * 1000 + 1200]}
+
+def test_neighbours_merge_with_overlap_written_once():
+    blocks = merge_chunks([_chunk("mg", 1, 1), _chunk("mg", 0, 2), _chunk("other", 0, 3, "unrelated text")])
+
+    assert [b["chunk_ids"] for b in blocks] == [["mg::chunk_0", "mg::chunk_1"], ["other::chunk_0"]]
+    assert blocks[0]["text"] == DOC[:2200]
+    assert blocks[0]["rank"] == 1
+
+def test_repeated_chunk_is_listed_once():
+    blocks = merge_chunks([_chunk("mg", 29, 1, "chunk 29 text"), _chunk("mg", 29, 2, "chunk 29 text"),
+                           _chunk("mg", 40, 3, "chunk 29 text")])
+
+    assert blocks == [{"chunk_ids": ["mg::chunk_29", "mg::chunk_40"], "doc_id": "mg", "text": "chunk 29 text",
+                       "rank": 1}]
+
+def test_budget_trims_lower_ranked_blocks_first():
+    evidence = [_chunk(f"d{i}", 0, i + 1, DOC[i * 100:i * 100 + 1200]) for i in range(5)]
+    blocks, stats = pack_evidence(evidence, token_budget=600)
+
+    tokens = [estimate_tokens(b["text"]) for b in blocks]
+    assert sum(tokens) <= 600
+    assert stats["est_tokens_packed"] == sum(tokens)
+    assert blocks[0]["text"] == DOC[:1200]  # best-ranked block is kept whole
+    assert len(blocks) == 5  # trimmed, never dropped
+    assert tokens[-1] <= MIN_BLOCK_TOKENS + 1
+    assert blocks[-1]["text"].endswith(" ...")
@@ -0,0 +1,81 @@
+import hashlib
+import json
+
+import pytest
+
+from ingest import download, extract
+
+PAGE = """<html><head><title> Magnesium - Fact Sheet </title><style>p {color: red}</style></head>
+<body><nav>Home | About</nav><header>NIH ODS</header>
+<main><h1>Magnesium</h1><p>Magnesium is needed for
+  muscle function.</p><script>track()</script><p></p></main>
+<footer>Contact us</footer></body></html>"""
+
+def test_parse_html():
+    title, text = extract.parse_html(PAGE)
+    assert title == "Magnesium - Fact Sheet"
+    assert text == "Magnesium\nMagnesium is needed for\nmuscle function."
+
+def test_parse_html_without_title_or_main():
+    title, text = extract.parse_html("<html><body><p>Zinc</p><nav>menu</nav></body></html>")
+    assert title == "Unknown Title"
+    assert text == "Zinc"
+
+def test_unchanged_hash_is_skipped(tmp_path):
+    path = tmp_path / "mg.html"
+    path.write_text(PAGE, encoding="utf-8")
+    doc_id, rec = extract.extract_file(path)
+    assert doc_id == "mg" and rec["content_sha256"] == hashlib.sha256(PAGE.encode("utf-8")).hexdigest()
+    assert extract.extract_file(path, prev_hash=rec["content_sha256"]) == ("mg", None)
+    assert extract.extract_file(path, prev_hash="stale")[1] == rec
+
+@pytest.fixture
+def raw(tmp_path, monkeypatch):
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    monkeypatch.setattr(extract, "RAW_DIR", raw_dir)
+    monkeypatch.setattr(extract, "OUT_FILE", tmp_path / "docs.jsonl")
+    return raw_dir
+
+def write_page(raw_dir, doc_id, html, manifest):
+    data = html.encode("utf-8")
+    (raw_dir / f"{doc_id}.html").write_bytes(data)
+    manifest[doc_id] = {"path": f"{doc_id}.html", "sha256": hashlib.sha256(data).hexdigest(), "bytes": len(data)}
+    download.save_manifest(manifest, raw_dir)
+
+def read_docs(path):
+    return {d["doc_id"]: d for d in map(json.loads, path.read_text(encoding="utf-8").splitlines())}
+
+def test_manifest_hash_skips_reading(raw):
+    manifest = {}
+    write_page(raw, "mg", PAGE, manifest)
+    write_page(raw, "zn", PAGE.replace("Magnesium", "Zinc"), manifest)
+    extract.main(["--workers", "1"])
+    first = read_docs(extract.OUT_FILE)
+    assert first["zn"]["title"] == "Zinc - Fact Sheet"
+
+    # same size, same manifest entry: trusted as downloaded, the old record is kept without reading the file
+    (raw / "mg.html").write_text(PAGE.replace("muscle", "MUSCLE"), encoding="utf-8")
+    # a new download updates the manifest -> re-extracted
+    write_page(raw, "zn", PAGE.replace("Magnesium", "Zinc!"), manifest)
+    extract.main(["--workers", "1"])
+    second = read_docs(extract.OUT_FILE)
+    assert second["mg"] == first["mg"]
+    assert second["zn"]["title"] == "Zinc! - Fact Sheet"
+
+def test_size_mismatch_is_rehashed(raw):
+    manifest = {}
+    write_page(raw, "mg", PAGE, manifest)
+    extract.main(["--workers", "1"])
+
+    # edited by hand after the download: the manifest entry no longer describes the file
+    (raw / "mg.html").write_text(PAGE.replace("muscle", "nerve and muscle"), encoding="utf-8")
+    extract.main(["--workers", "1"])
+    assert "nerve and muscle" in read_docs(extract.OUT_FILE)["mg"]["text"]
+
+def test_without_manifest_files_are_hashed(raw):
+    (raw / "mg.html").write_text(PAGE, encoding="utf-8")
+    extract.main(["--workers", "1"])
+    (raw / "mg.html").write_text(PAGE.replace("muscle", "MUSCLE"), encoding="utf-8")
+    extract.main(["--workers", "1"])
+    assert "MUSCLE" in read_docs(extract.OUT_FILE)["mg"]["text"]
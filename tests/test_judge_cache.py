@@ -0,0 +1,82 @@
+import sqlite3
+import time
+
+import agents.judge as judge_mod
+from agents import judge_cache
+from agents.judge_cache import JudgeCache, make_key
+
+def _rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM judge_cache").fetchone()[0]
+
+def test_hits_and_misses(tmp_path):
+    cache = JudgeCache(tmp_path / "judge.sqlite")
+    assert cache.get("k") is None
+    cache.put("k", "response")
+    assert cache.get("k") == "response"
+    assert cache.get("other") is None
+
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 2, "hit_rate": 1 / 3}
+
+def test_expired_entries_miss_and_are_evicted(tmp_path):
+    path = tmp_path / "judge.sqlite"
+    cache = JudgeCache(path, max_age_seconds=60)
+    cache.put("old", "a")
+    cache.put("new", "b")
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE judge_cache SET created_at = ? WHERE key = 'old'", (time.time() - 120,))
+
+    assert cache.get("old") is None
+    cache.evict()
+    assert _rows(path) == 1
+    assert cache.get("new") == "b"
+
+def test_lru_beyond_max_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(judge_cache, "EVICT_EVERY", 5)
+    path = tmp_path / "judge.sqlite"
+    cache = JudgeCache(path, max_entries=3)
+    for i in range(4):
+        cache.put(f"k{i}", str(i))
+        time.sleep(0.002)  # distinct accessed_at
+    cache.get("k0")  # recently used -> survives
+
+    cache.put("k4", "4")  # 5th put runs eviction
+    assert _rows(path) == 3
+    assert cache.get("k0") == "0"
+    assert cache.get("k4") == "4"
+    assert cache.get("k1") is None
+
+def test_key_covers_the_generation():
+    base = make_key("m", "A", "prompt", {"temperature": 0.2})
+    assert make_key("m", "a", "prompt", {"temperature": 0.2}) == base
+    assert make_key("m2", "A", "prompt", {"temperature": 0.2}) != base
+    assert make_key("m", "B", "prompt", {"temperature": 0.2}) != base
+    assert make_key("m", "A", "prompt!", {"temperature": 0.2}) != base
+    assert make_key("m", "A", "prompt", {"temperature": 0.0}) != base
+
+def test_env_bypass(tmp_path, monkeypatch):
+    # JUDGE_CACHE=0: every judge call reaches the model, nothing is read or written
+    from eval.mock_ollama import start_mock_server
+
+    monkeypatch.setenv("GATE", "0")
+    monkeypatch.setenv("SEMANTIC_CACHE", "0")
+    cache = JudgeCache(tmp_path / "judge.sqlite")
+    monkeypatch.setattr(judge_cache, "_cache", cache)
+    server, url = start_mock_server()
+    monkeypatch.setattr(judge_mod, "OLLAMA_URL", url)
+    evidence = [{"rank": 1, "score": 0.9, "chunk_id": "d::chunk_0", "doc_id": "d", "text": "t"}]
+    try:
+        monkeypatch.setenv("JUDGE_CACHE", "0")
+        assert not judge_cache.cache_enabled()
+        judge_mod.judge("c", evidence)
+        judge_mod.judge("c", evidence)
+        assert server.n_requests == 2
+        assert cache.stats()["entries"] == 0
+
+        monkeypatch.setenv("JUDGE_CACHE", "1")
+        judge_mod.judge("c", evidence)
+        judge_mod.judge("c", evidence)
+        assert server.n_requests == 3
+        assert cache.stats()["hits"] == 1
+    finally:
+        server.shutdown()
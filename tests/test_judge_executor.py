@@ -0,0 +1,94 @@
+import pytest
+import requests
+
+import agents.judge as judge_mod
+from telemetry.spans import SpanRecorder
+
+pytestmark = pytest.mark.usefixtures("no_caches")
+
+def _evidence(i: int):
+    return [{"rank": 1, "score": 0.9, "chunk_id": f"doc{i}::chunk_0", "doc_id": f"doc{i}", "text": f"text {i}"}]
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_judge_many_keeps_input_order(ollama, monkeypatch, stream):
+    monkeypatch.setattr(judge_mod, "JUDGE_STREAM", stream)
+    claims = [f"claim {i}" for i in range(20)]
+    results = judge_mod.judge_many(claims, [_evidence(i) for i in range(20)], max_in_flight=4)
+
+    # the mock cites the prompt's own evidence -> each result must belong to its own claim
+    assert [obj["citations"] for obj, _ in results] == [[f"doc{i}::chunk_0"] for i in range(20)]
+
+@pytest.mark.parametrize("ollama", [{"fail_every": 2, "delay": 0.01}], indirect=True)
+@pytest.mark.parametrize("stream", [True, False])
+def test_5xx_is_retried(ollama, monkeypatch, stream):
+    monkeypatch.setattr(judge_mod, "JUDGE_STREAM", stream)
+    results = judge_mod.judge_many([f"c{i}" for i in range(6)], [_evidence(i) for i in range(6)], max_in_flight=2)
+
+    assert all(obj["verdict"] == "Supported" for obj, _ in results)
+    assert ollama.n_requests > 6  # every other request got a 503 and was retried
+
+@pytest.mark.parametrize("ollama", [{"fail_every": 1}], indirect=True)
+def test_gives_up_after_max_retries(ollama):
+    with pytest.raises(requests.HTTPError):
+        judge_mod.judge("c", _evidence(0), use_cache=False)
+    assert ollama.n_requests == judge_mod.MAX_RETRIES + 1
+
+@pytest.mark.parametrize("ollama", [{"ramble": 100}], indirect=True)
+def test_stream_stops_after_the_verdict(ollama, monkeypatch):
+    monkeypatch.setattr(judge_mod, "JUDGE_STREAM", True)
+    monkeypatch.setattr(judge_mod, "GENERATION_OPTIONS", {"temperature": 0.2, "num_predict": -1})
+    spans = SpanRecorder()
+    obj, _ = judge_mod.judge("c", _evidence(0), spans=spans)
+
+    assert obj["citations"] == ["doc0::chunk_0"]
+    (ollama_span,) = [s for s in spans.spans if s["stage"] == "ollama"]
+    assert ollama_span["attrs"]["early_stop"] is True
+    # the prose after the JSON (~400 tokens) was never read
+    assert ollama_span["attrs"]["eval_count"] < 50
+
+@pytest.mark.parametrize("ollama", [{"garble": 1}], indirect=True)
+@pytest.mark.parametrize("stream", [True, False])
+def test_unparseable_answer_is_retried_once(ollama, monkeypatch, stream):
+    monkeypatch.setattr(judge_mod, "JUDGE_STREAM", stream)
+    spans = SpanRecorder()
+    obj, _ = judge_mod.judge("c", _evidence(0), spans=spans)
+
+    assert obj["verdict"] == "Supported"
+    assert ollama.n_requests == 2
+    assert [s["attrs"].get("retry", False) for s in spans.spans if s["stage"] == "ollama"] == [False, True]
+
+@pytest.mark.parametrize("ollama", [{"garble": 2}], indirect=True)
+def test_second_unparseable_answer_fails(ollama):
+    with pytest.raises(ValueError):
+        judge_mod.judge("c", _evidence(0))
+    assert ollama.n_requests == 2
+
+def test_stalled_stream_is_retried(ollama, monkeypatch):
+    # a read timeout mid-stream comes out of iter_lines as ConnectionError
+    monkeypatch.setattr(judge_mod, "JUDGE_STREAM", True)
+    read_stream = judge_mod._read_stream
+    calls = []
+
+    def flaky(r, t0):
+        calls.append(1)
+        if len(calls) == 1:
+            raise requests.ConnectionError("Read timed out.")
+        return read_stream(r, t0)
+
+    monkeypatch.setattr(judge_mod, "_read_stream", flaky)
+    obj, _ = judge_mod.judge("c", _evidence(0))
+    assert obj["verdict"] == "Supported"
+    assert ollama.n_requests == 2
+
+def test_scanner_keeps_text_after_a_bad_object():
+    scanner = judge_mod._ObjectScanner()
+    assert scanner.feed('{oops} {"verdict": "Supported"} tail') == "{oops}"
+    assert scanner.feed("") == '{"verdict": "Supported"}'
+    assert scanner.feed("") is None
+
+def test_cache_key_covers_schema_and_num_predict():
+    from agents.judge_cache import make_key
+
+    base = make_key("m", "A", "p", {"num_predict": 256}, judge_mod.VERDICT_SCHEMA)
+    assert make_key("m", "A", "p", {"num_predict": 128}, judge_mod.VERDICT_SCHEMA) != base
+    assert make_key("m", "A", "p", {"num_predict": 256}, None) != base
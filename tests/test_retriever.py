@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pytest
+
+import agents.retriever as retriever
+from index import build_faiss
+from index.chunk_ids import vec_id
+from index.chunk_store import write_chunk_store
+
+DIM = 64
+
+class WordEncoder:
+    # bag of hashed words: texts sharing words are close, stable across processes
+    def encode(self, texts, **kwargs):
+        out = np.zeros((len(texts), DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                out[row, sum(word.encode("utf-8")) % DIM] += 1.0
+        return out
+
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+TEXTS = [
+    "magnesium supports normal muscle function",
+    "vitamin d helps calcium absorption in bone",
+    "omega three fatty acids lower triglycerides",
+    "zinc contributes to immune function",
+    "iron deficiency causes anemia and fatigue",
+]
+
+def write_corpus(path, texts):
+    metas = [{"chunk_id": f"doc::chunk_{i}", "doc_id": "doc", "title": "", "chunk_index": i, "text": t,
+              "vec_id": vec_id(f"doc::chunk_{i}")} for i, t in enumerate(texts)]
+    ids = np.array([m["vec_id"] for m in metas], dtype=np.int64)
+    index = build_faiss.build_index(WordEncoder().encode(texts), ids)
+    build_faiss.faiss.write_index(index, str(path / "faiss.index"))
+    write_chunk_store(metas, path / "chunk_store.bin")
+
+def bump_mtime(path):
+    # a rewrite within the same mtime tick still has to be noticed
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(retriever, "load_encoder", lambda backend, name: WordEncoder())
+    write_corpus(tmp_path, TEXTS)
+    return retriever.RetrieverEngine(
+        index_file=tmp_path / "faiss.index", meta_file=tmp_path / "chunk_meta.jsonl",
+        params_file=tmp_path / "faiss_params.json", store_file=tmp_path / "chunk_store.bin",
+        emb_file=tmp_path / "embeddings.npy",
+    )
+
+def test_batch_matches_single(engine):
+    claims = ["magnesium and muscle", "does vitamin d help bone", "zinc immune", "anemia from iron"]
+    batch = engine.retrieve_batch(claims, k=3)
+    assert batch == [engine.retrieve(c, k=3) for c in claims]
+    assert batch[0][0]["chunk_id"] == "doc::chunk_0"
+    assert batch[3][0]["chunk_id"] == "doc::chunk_4"
+
+def test_reload_when_files_change(engine, tmp_path):
+    assert engine.retrieve("selenium thyroid", k=1)[0]["text"] != "selenium supports thyroid health"
+    before = engine.corpus_fingerprint()
+
+    write_corpus(tmp_path, TEXTS + ["selenium supports thyroid health"])
+    bump_mtime(tmp_path / "faiss.index")
+    assert engine.retrieve("selenium thyroid", k=1)[0]["text"] == "selenium supports thyroid health"
+    assert engine.corpus_fingerprint() != before
+
+def test_mismatch_keeps_previous_corpus(engine, tmp_path):
+    engine.load()
+    before = engine.corpus_fingerprint()
+
+    # new index written, chunk store not yet -> keep serving the old pair
+    chunks = tmp_path / "chunk_store.bin"
+    saved = chunks.read_bytes()
+    write_corpus(tmp_path, TEXTS + ["selenium supports thyroid health"])
+    chunks.write_bytes(saved)
+    bump_mtime(tmp_path / "faiss.index")
+
+    assert engine.retrieve("magnesium", k=1)[0]["chunk_id"] == "doc::chunk_0"
+    assert engine.corpus_fingerprint() == before
+
+    # a fresh engine has nothing to fall back on
+    fresh = retriever.RetrieverEngine(
+        index_file=engine.index_file, meta_file=engine.meta_file, params_file=engine.params_file,
+        store_file=engine.store_file, emb_file=engine.emb_file,
+    )
+    with pytest.raises(RuntimeError, match="mismatch"):
+        fresh.load()
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+import agents.judge as judge_mod
+from eval import run_eval_ab
+from eval.mock_ollama import start_mock_server
+
+@pytest.fixture
+def grid(tmp_path, monkeypatch, no_caches):
+    server, url = start_mock_server(delay=0.05)
+    monkeypatch.setattr(judge_mod, "OLLAMA_URL", url)
+    monkeypatch.setattr(run_eval_ab, "retrieve_batch", lambda claims, k: [
+        [{"rank": 1, "score": 0.9, "chunk_id": f"doc{i}::chunk_0", "doc_id": f"doc{i}", "text": c}]
+        for i, c in enumerate(claims)
+    ])
+    tests = [{"id": f"t{i}", "claim": f"claim {i}", "expected": "Supported"} for i in range(4)]
+    yield tests, tmp_path / "eval_run.jsonl"
+    server.shutdown()
+
+def test_resumed_run_keeps_wall_clock(grid):
+    tests, checkpoint = grid
+    _, first, _ = run_eval_ab.run_grid(tests, ["A"], ["m"], checkpoint, max_in_flight=1)
+    wall = first[("m", "A")]["wall_clock_seconds"]
+    assert wall >= 4 * 0.05
+    assert first[("m", "A")]["resumed"] is False
+
+    # fully resumed pair: same wall clock as the session that judged it; a new pair only counts this session
+    cells, second, _ = run_eval_ab.run_grid(tests, ["A", "B"], ["m"], checkpoint, max_in_flight=1)
+    assert second[("m", "A")] == {**first[("m", "A")], "resumed": True}
+    assert second[("m", "B")]["resumed"] is False
+    assert 0 < second[("m", "B")]["wall_clock_seconds"]
+    assert len(cells[("m", "B")]) == 4
+
+def test_checkpoint_without_timings_reports_none(grid):
+    tests, checkpoint = grid
+    run_eval_ab.run_grid(tests, ["A"], ["m"], checkpoint)
+    lines = checkpoint.read_text(encoding="utf-8").splitlines()
+    recs = [json.loads(line) for line in lines[1:]]
+    for r in recs:
+        del r["session"], r["wall_seconds"]
+    checkpoint.write_text("\n".join([lines[0]] + [json.dumps(r) for r in recs]) + "\n", encoding="utf-8")
+
+    _, timing, _ = run_eval_ab.run_grid(tests, ["A"], ["m"], checkpoint)
+    assert timing[("m", "A")]["wall_clock_seconds"] is None
+    assert timing[("m", "A")]["resumed"] is True
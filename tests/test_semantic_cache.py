@@ -0,0 +1,71 @@
+import sqlite3
+import time
+
+import numpy as np
+
+from agents import semantic_cache
+from agents.semantic_cache import SemanticCache
+
+VERDICT = {"verdict": "Supported", "short_reason": "r", "citations": ["c1"], "confidence": 0.9}
+
+def _vec(seed: int, dim: int = 16):
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+def _rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM semantic_cache").fetchone()[0]
+
+def test_repeat_put_replaces_row(tmp_path):
+    path = tmp_path / "sem.sqlite"
+    cache = SemanticCache(path)
+    for _ in range(5):
+        cache.put(_vec(0), "claim", ["c1", "c2"], "m", "A", "corpus", VERDICT, [], settings="s")
+
+    assert _rows(path) == 1
+    assert cache.stats()["entries"] == 1
+    assert cache._index.ntotal == 1
+    assert cache.lookup(_vec(0), ["c2", "c1"], "m", "A", "corpus", "s")[0] == VERDICT
+
+def test_settings_are_part_of_the_key(tmp_path):
+    cache = SemanticCache(tmp_path / "sem.sqlite")
+    cache.put(_vec(0), "claim", ["c1"], "m", "A", "corpus", VERDICT, [], settings="pack-on")
+
+    assert cache.lookup(_vec(0), ["c1"], "m", "A", "corpus", "pack-off") is None
+    assert cache.lookup(_vec(0), ["c1"], "m", "A", "corpus", "pack-on") is not None
+
+def test_entry_cap(tmp_path, monkeypatch):
+    monkeypatch.setattr(semantic_cache, "EVICT_EVERY", 10)
+    path = tmp_path / "sem.sqlite"
+    cache = SemanticCache(path, max_entries=5)
+    for i in range(30):
+        cache.put(_vec(i), f"claim {i}", ["c1"], "m", "A", "corpus", VERDICT, [], settings="s")
+
+    assert _rows(path) == 5
+    assert cache._index.ntotal == len(cache._entries) == 5
+    # the most recent claims survive
+    assert cache.lookup(_vec(29), ["c1"], "m", "A", "corpus", "s") is not None
+    assert cache.lookup(_vec(0), ["c1"], "m", "A", "corpus", "s") is None
+
+def test_expired_entries_miss(tmp_path):
+    path = tmp_path / "sem.sqlite"
+    cache = SemanticCache(path, max_age_seconds=60)
+    cache.put(_vec(0), "claim", ["c1"], "m", "A", "corpus", VERDICT, [], settings="s")
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE semantic_cache SET created_at = ?", (time.time() - 120,))
+    cache._entries = {i: e[:-1] + (time.time() - 120,) for i, e in cache._entries.items()}
+
+    assert cache.lookup(_vec(0), ["c1"], "m", "A", "corpus", "s") is None
+    # a fresh process drops it on load
+    assert SemanticCache(path, max_age_seconds=60).lookup(_vec(0), ["c1"], "m", "A", "corpus", "s") is None
+    assert _rows(path) == 0
+
+def test_old_table_is_replaced(tmp_path):
+    path = tmp_path / "sem.sqlite"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE semantic_cache (id INTEGER PRIMARY KEY, corpus TEXT, claim TEXT)")
+        conn.execute("INSERT INTO semantic_cache (corpus, claim) VALUES ('corpus', 'old')")
+
+    cache = SemanticCache(path)
+    cache.put(_vec(0), "claim", ["c1"], "m", "A", "corpus", VERDICT, [], settings="s")
+    assert _rows(path) == 1
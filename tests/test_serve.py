@@ -0,0 +1,146 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+import agents.judge as judge_mod
+from conftest import FakeEngine
+from pipeline import serve
+from telemetry.spans import SpanRecorder
+
+pytestmark = pytest.mark.usefixtures("no_caches")
+
+@pytest.fixture
+def service(request):
+    opts = getattr(request, "param", {})
+    server, url = serve.start_server(port=0, engine=FakeEngine(), **opts)
+    assert server.service.ready.wait(5)
+    yield server, url
+    server.shutdown()
+    server.service.close()
+
+def test_check_text_ok(ollama, service):
+    server, url = service
+    r = requests.post(f"{url}/check/text", json={"claim": "Omega-3 lowers triglycerides", "k": 3})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["verdict"] == "Supported"
+    assert len(body["evidence"]) == 3
+    assert set(body["citations"]) <= {e["chunk_id"] for e in body["evidence"]}
+
+@pytest.mark.parametrize("payload", [b"not json", json.dumps({"claim": "  "}).encode(),
+                                     json.dumps({"claim": "x", "k": 0}).encode(),
+                                     json.dumps({"claim": "x", "k": -3}).encode(),
+                                     json.dumps({"claim": "x", "k": serve.MAX_K + 1}).encode(),
+                                     b"[1]", b'"x"', b"null", json.dumps({"claim": 5}).encode(),
+                                     json.dumps({"claim": "x", "k": None}).encode(),
+                                     json.dumps({"claim": "x", "k": [3]}).encode(),
+                                     json.dumps({"claim": "x", "variant": "C"}).encode()])
+def test_bad_input_is_400(ollama, service, payload):
+    _, url = service
+    assert requests.post(f"{url}/check/text", data=payload).status_code == 400
+
+def test_image_path_json_is_not_accepted(ollama, service):
+    # the server never opens a client-named local file
+    _, url = service
+    r = requests.post(f"{url}/check/image", json={"image_path": "/etc/passwd"})
+    assert r.status_code == 400
+
+@pytest.fixture
+def gate(monkeypatch):
+    # judge calls block until the test opens the gate; `entered` is set once one is running
+    gate, entered = threading.Event(), threading.Event()
+
+    def judge(claim, evidence, *args):
+        entered.set()
+        assert gate.wait(10)
+        return {"verdict": "Supported", "rationale": "gated", "citations": [evidence[0]["chunk_id"]]}, []
+
+    monkeypatch.setattr(judge_mod, "judge", judge)
+    gate.entered = entered
+    yield gate
+    gate.set()
+
+@pytest.mark.parametrize("service", [{"max_pending": 1}], indirect=True)
+def test_overload_is_503(gate, service):
+    _, url = service
+    codes = []
+
+    def call():
+        codes.append(requests.post(f"{url}/check/text", json={"claim": "slow claim"}).status_code)
+
+    first = threading.Thread(target=call)
+    first.start()
+    assert gate.entered.wait(5)  # the one admitted request is inside the judge
+    call()
+    call()
+    gate.set()
+    first.join()
+    assert codes == [503, 503, 200]
+
+@pytest.mark.parametrize("service", [{"timeout": 0.2}], indirect=True)
+def test_timeout_is_504(gate, service):
+    _, url = service
+    assert requests.post(f"{url}/check/text", json={"claim": "slow claim"}).status_code == 504
+    assert gate.entered.is_set()
+    gate.set()  # let the stuck judge call finish before the service closes
+
+def test_judge_down_is_502(monkeypatch, service):
+    # nothing listens on the judge URL
+    monkeypatch.setattr(judge_mod, "OLLAMA_URL", "http://127.0.0.1:9/api/generate")
+    _, url = service
+    assert requests.post(f"{url}/check/text", json={"claim": "x"}).status_code == 502
+
+def test_micro_batcher_trims_mixed_k():
+    engine = FakeEngine()
+    batcher = serve.MicroBatcher(engine, max_batch=8, max_wait=0.2)
+    try:
+        futures = [batcher.submit(f"claim {k}", k, SpanRecorder()) for k in (1, 4, 2)]
+        results = [f.result(timeout=5) for f in futures]
+    finally:
+        batcher.close()
+
+    # one batched search at the largest k, each request trimmed to its own k
+    assert engine.calls == [(["claim 1", "claim 4", "claim 2"], 4)]
+    assert [len(evidence) for evidence, _ in results] == [1, 4, 2]
+
+@pytest.mark.parametrize("service", [{"timeout": 0.3}], indirect=True)
+def test_slow_ocr_times_out_every_waiting_image(ollama, service, monkeypatch):
+    ocr_gate = threading.Event()
+    import agents.vision_extractor as vision
+
+    monkeypatch.setattr(vision, "extract_label_text", lambda path: ocr_gate.wait(10) and "label text")
+    _, url = service
+    codes = []
+
+    def call():
+        codes.append(requests.post(f"{url}/check/image", data=b"\x89PNG fake").status_code)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # the second image waits behind the first OCR but still answers at its own deadline
+    assert codes == [504, 504]
+    assert time.perf_counter() - t0 < 0.9
+    ocr_gate.set()  # free the OCR thread before the service closes
+
+def test_semantic_cache_uses_the_served_engine(ollama, service, monkeypatch, tmp_path):
+    import agents.retriever as retriever
+    import agents.semantic_cache as semantic_cache
+
+    # the global engine (another corpus) must never be loaded for the cache key
+    monkeypatch.setattr(retriever, "get_engine", lambda: pytest.fail("global engine loaded"))
+    monkeypatch.setenv("SEMANTIC_CACHE", "1")
+    cache = semantic_cache.SemanticCache(tmp_path / "sem.sqlite")
+    monkeypatch.setattr(semantic_cache, "_cache", cache)
+    _, url = service
+
+    for _ in range(2):
+        assert requests.post(f"{url}/check/text", json={"claim": "same claim"}).status_code == 200
+    assert ollama.n_requests == 1
+    assert cache._corpus == "fake-corpus"
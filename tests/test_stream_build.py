@@ -0,0 +1,77 @@
+import json
+import sys
+
+import numpy as np
+import pytest
+
+from conftest import FakeEncoder
+from index import build_faiss, stream_build
+
+@pytest.fixture
+def raw(index_files, monkeypatch):
+    tmp_path, encoders = index_files
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    for i in range(3):
+        body = " ".join(f"Paragraph {i}.{j} about vitamin {i} and its daily intake." for j in range(60))
+        (raw_dir / f"doc_{i}.html").write_text(f"<html><title>Doc {i}</title><body><p>{body}</p></body></html>",
+                                               encoding="utf-8")
+    monkeypatch.setattr(stream_build, "RAW_DIR", raw_dir)
+    return tmp_path, encoders
+
+def run(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["stream_build", "--batch-size", "4", *args])
+    stream_build.main()
+
+def test_publishes_requested_dtype(raw, monkeypatch):
+    tmp_path, encoders = raw
+    run(monkeypatch, "--dtype", "float16", "--backend", "onnx")
+
+    vectors = np.load(tmp_path / "embeddings.npy")
+    assert vectors.dtype == np.float16
+    assert len(vectors) == encoders[0].n_encoded
+    assert encoders[0].backend == "onnx"
+
+def _interrupted_checkpoint(tmp_path, **kwargs):
+    # commit one batch as a crashed build would have left it
+    state = stream_build.BuildState(tmp_path / "stream_build")
+    html_files = sorted(stream_build.RAW_DIR.glob("*.html"))
+    ckpt = state.reset(stream_build.sources_fingerprint(html_files), **kwargs)
+    batch = next(stream_build.batched(stream_build.iter_chunks(html_files), 4))
+    return state.commit(ckpt, FakeEncoder().encode([m["text"] for m in batch]), batch)
+
+@pytest.mark.parametrize("args, resumed", [
+    (["--backend", "torch", "--dtype", "float32"], True),
+    (["--backend", "onnx", "--dtype", "float32"], False),
+    (["--backend", "torch", "--dtype", "float16"], False),
+])
+def test_checkpoint_identity_includes_backend_and_dtype(raw, monkeypatch, args, resumed):
+    tmp_path, encoders = raw
+    ckpt = _interrupted_checkpoint(tmp_path, backend="torch", dtype="float32")
+    run(monkeypatch, *args)
+
+    total = len(np.load(tmp_path / "embeddings.npy"))
+    assert encoders[0].n_encoded == (total - ckpt["chunks"] if resumed else total)
+
+def test_publishes_the_staged_pipeline_artifacts(raw, monkeypatch):
+    from index import embed
+
+    tmp_path, encoders = raw
+    run(monkeypatch)
+
+    docs = [json.loads(line) for line in (tmp_path / "docs.jsonl").read_text(encoding="utf-8").splitlines()]
+    chunks = [json.loads(line) for line in (tmp_path / "chunks.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [d["doc_id"] for d in docs] == ["doc_0", "doc_1", "doc_2"]
+    assert len(chunks) == len(np.load(tmp_path / "embeddings.npy"))
+    params = json.loads((tmp_path / "faiss_params.json").read_text(encoding="utf-8"))
+    assert "recall_at_k" in params["report"]
+
+    # a following incremental embed sees nothing to do
+    for name in ("CHUNKS_FILE", "EMB_NPY", "META_JSONL", "STORE_FILE"):
+        monkeypatch.setattr(embed, name, getattr(stream_build, name))
+    monkeypatch.setattr(embed, "load_encoder", lambda backend, name: encoders[0])
+    before = encoders[0].n_encoded
+    monkeypatch.setattr(sys, "argv", ["embed", "--incremental"])
+    embed.main()
+    assert encoders[0].n_encoded == before
+    assert build_faiss.faiss.read_index(str(tmp_path / "faiss.index")).ntotal == len(chunks)
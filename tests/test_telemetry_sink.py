@@ -0,0 +1,63 @@
+import sqlite3
+
+import numpy as np
+
+import telemetry.db as tdb
+
+def _record(claim: str, attrs: dict = None):
+    return {
+        "run": ("2026-01-01T00:00:00+00:00", "text", claim, 5, "[]", "{}", "[]"),
+        "spans": [{"stage": "embed", "start_ms": 0.0, "duration_ms": 1.0, "attrs": attrs or {}}],
+    }
+
+def _claims(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return [r[0] for r in conn.execute("SELECT claim FROM runs ORDER BY id")]
+    finally:
+        conn.close()
+
+def test_bad_record_is_dropped_alone_and_writer_survives(tmp_path):
+    sink = tdb.TelemetrySink(db_path=tmp_path / "t.db", flush_interval=0.05)
+    try:
+        sink.submit(_record("good-1"))
+        # numpy float32 is not JSON serializable -> TypeError inside the writer
+        sink.submit(_record("bad", {"score": np.float32(0.5)}))
+        sink.submit(_record("good-2"))
+        assert sink.flush(timeout=5)
+
+        sink.submit(_record("after"))
+        assert sink.flush(timeout=5)
+    finally:
+        sink.close()
+
+    assert _claims(tmp_path / "t.db") == ["good-1", "good-2", "after"]
+    assert sink.written == 3
+    assert sink.errors == 1
+
+def test_close_is_bounded(tmp_path):
+    sink = tdb.TelemetrySink(db_path=tmp_path / "t.db")
+    sink.submit(_record("x"))
+    sink.close(timeout=5)
+    assert not sink._thread.is_alive()
+    assert _claims(tmp_path / "t.db") == ["x"]
+
+def test_telemetry_write_span_covers_span_inserts(tmp_path, monkeypatch):
+    # a slow spans insert must show up in the telemetry_write duration
+    import time as time_mod
+
+    conn = sqlite3.connect(tmp_path / "t.db")
+    tdb.init_db(tmp_path / "t.db")
+    real_dumps = tdb.json.dumps
+
+    def slow_dumps(*args, **kwargs):
+        time_mod.sleep(0.02)
+        return real_dumps(*args, **kwargs)
+
+    monkeypatch.setattr(tdb.json, "dumps", slow_dumps)
+    tdb._write_record(conn, _record("x"))
+    conn.commit()
+
+    (duration,) = conn.execute("SELECT duration_ms FROM spans WHERE stage = 'telemetry_write'").fetchone()
+    conn.close()
+    assert duration >= 20
@@ -0,0 +1,74 @@
+import sqlite3
+import time
+
+import pytest
+
+from agents import vision_extractor as vx
+
+def _rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+
+def test_cache_round_trip(tmp_path):
+    cache = vx._OcrCache(tmp_path / "ocr.sqlite")
+    assert cache.get("k") is None
+    cache.put("k", "MAGNESIUM 100 mg")
+    assert cache.get("k") == "MAGNESIUM 100 mg"
+
+def test_cache_expired_entries_miss_and_are_evicted(tmp_path):
+    path = tmp_path / "ocr.sqlite"
+    cache = vx._OcrCache(path, max_age_seconds=60)
+    cache.put("old", "a")
+    cache.put("new", "b")
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE ocr_cache SET created_at = ? WHERE key = 'old'", (time.time() - 120,))
+
+    assert cache.get("old") is None
+    cache.evict()
+    assert _rows(path) == 1
+    assert cache.get("new") == "b"
+
+def test_cache_lru_beyond_max_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(vx, "EVICT_EVERY", 5)
+    cache = vx._OcrCache(tmp_path / "ocr.sqlite", max_entries=3)
+    for i in range(4):
+        cache.put(f"k{i}", str(i))
+        time.sleep(0.002)  # distinct accessed_at
+    cache.get("k0")  # recently used -> survives
+
+    cache.put("k4", "4")  # 5th put runs eviction
+    assert len(cache) == 3
+    assert cache.get("k0") == "0"
+    assert cache.get("k1") is None
+
+def test_cache_without_accessed_at_is_upgraded(tmp_path):
+    path = tmp_path / "ocr.sqlite"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE ocr_cache (key TEXT PRIMARY KEY, text TEXT NOT NULL, created_at REAL NOT NULL)")
+        conn.execute("INSERT INTO ocr_cache VALUES ('k', 'text', ?)", (time.time(),))
+
+    cache = vx._OcrCache(path)
+    assert cache.get("k") == "text"
+    cache.put("k2", "more")
+    assert len(cache) == 2
+
+def _label(lines):
+    # white page with one black bar per (top, bottom) text line
+    Image = pytest.importorskip("PIL.Image")
+    ImageDraw = pytest.importorskip("PIL.ImageDraw")
+
+    img = Image.new("RGB", (240, 100), "white")
+    draw = ImageDraw.Draw(img)
+    for top, bottom in lines:
+        draw.rectangle([20, top, 200, bottom], fill="black")
+    return img
+
+def test_segment_two_lines():
+    boxes = vx.segment_lines(_label([(15, 30), (55, 72)]))
+    assert len(boxes) == 2
+    (l1, t1, r1, b1), (l2, t2, r2, b2) = boxes
+    assert t1 <= 15 and 30 < b1 <= t2 and t2 <= 55 and b2 > 72
+    assert l1 == 20 - vx.LINE_PAD and r1 == 201 + vx.LINE_PAD
+
+def test_segment_blank_image():
+    assert vx.segment_lines(_label([])) == []